@@ -1,16 +1,23 @@
 import datetime
 import math
-from typing import Dict, Any, List, Tuple
+import time
+from typing import Dict, Any, Iterator, List, Tuple
 
 import numpy as np
 import requests
 import pandas as pd
 import json
+import re
+from functools import lru_cache
 
 from dateutil import parser
 from datetime import datetime as dt
 from datetime import timedelta
 
+from api.cassette import Cassette
+from core.metrics import REGISTRY
+from core.rate_limiter import RateLimiter
+from core.tracing import TRACER
 from models.api_price import ApiPrice
 from models.open_trade import OpenTrade
 
@@ -32,11 +39,42 @@ def get_trailing_sl(limit_gap, instrument):
     return dict(distance=str(distance))
 
 
+REQUEST_SECONDS = REGISTRY.histogram("oanda_request_seconds", "Time to send a request and read its response",
+                                     ["endpoint", "verb"])
+REQUEST_ERRORS = REGISTRY.counter("oanda_request_errors_total", "Requests that failed or returned an unexpected code",
+                                  ["endpoint", "verb"])
+RATE_LIMIT_WAIT_SECONDS = REGISTRY.histogram("oanda_rate_limit_wait_seconds", "Time spent waiting for a request token")
+
+_INSTRUMENT_SEGMENT = re.compile(r"^[A-Z0-9]+_[A-Z0-9]+$")
+
+
+@lru_cache(maxsize=1024)
+def endpoint_label(url: str, account_id: str) -> str:
+    """``url`` with the account, instruments and ids replaced, to keep the metric labels few."""
+    segments = []
+    for segment in url.split("/"):
+        if segment == account_id:
+            segment = ":account"
+        elif _INSTRUMENT_SEGMENT.match(segment):
+            segment = ":instrument"
+        elif segment.isdigit():
+            segment = ":id"
+        segments.append(segment)
+    return "/".join(segments)
+
+
 class OandaApi:
-    def __init__(self, account_id, api_key, url):
+    def __init__(self, account_id, api_key, url, cassette: Cassette = None, rate_limiter: RateLimiter = None,
+                 stream_url: str = None):
         self.account_id = account_id
         self.url = url
+        # streaming endpoints live on a separate host, e.g. stream-fxpractice.oanda.com for api-fxpractice.oanda.com
+        self.stream_url = stream_url or url.replace("://api-", "://stream-")
         self.api_key = api_key
+        # records every exchange, or serves them back offline when replaying
+        self.cassette = cassette
+        # every request waits for a token when set
+        self.rate_limiter = rate_limiter
 
         self.session = requests.Session()
         self.session.headers.update({
@@ -45,6 +83,27 @@ class OandaApi:
         })
 
     def make_request(self, url, verb='get', code=200, params=None, data=None, headers=None):
+        if self.cassette is not None and self.cassette.is_replaying:
+            return self.cassette.play(verb, url, params, data)
+
+        if self.rate_limiter is not None:
+            waited = time.perf_counter()
+            self.rate_limiter.acquire()
+            RATE_LIMIT_WAIT_SECONDS.observe(time.perf_counter() - waited)
+
+        endpoint = endpoint_label(url, self.account_id)
+        started = time.perf_counter()
+        with TRACER.span(f"oanda {verb.upper()} {endpoint}", url=url):
+            ok, payload = self._send_request(url, verb, code, params, data, headers)
+        REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint, verb=verb)
+        if not ok:
+            REQUEST_ERRORS.inc(endpoint=endpoint, verb=verb)
+
+        if self.cassette is not None:
+            self.cassette.record(verb, url, params, data, ok, payload, time.perf_counter() - started)
+        return ok, payload
+
+    def _send_request(self, url, verb, code, params, data, headers):
         full_url = f"{self.url}/{url}"
 
         if data is not None:
@@ -112,6 +171,61 @@ class OandaApi:
                 print("ERROR get_instrument_position()", data, instrument)
                 return None, None
 
+    def get_open_positions(self) -> Dict[str, Tuple[float, float]] | None:
+        """Net units and unrealized P/L of every instrument with an open position, in one request."""
+        url = f"accounts/{self.account_id}/openPositions"
+        ok, data = self.make_request(url)
+
+        if ok and 'positions' in data:
+            positions = {}
+            for position in data['positions']:
+                long_units = float(position.get('long', {}).get('units', '0'))
+                short_units = float(position.get('short', {}).get('units', '0'))
+                positions[position['instrument']] = (long_units + short_units,
+                                                     float(position.get('unrealizedPL', '0')))
+            return positions
+        print("ERROR get_open_positions()", data)
+        return None
+
+    def get_transactions_since(self, transaction_id: str) -> Tuple[List[Dict[str, Any]], str] | Tuple[None, None]:
+        url = f"accounts/{self.account_id}/transactions/sinceid"
+        ok, data = self.make_request(url, params=dict(id=transaction_id))
+
+        if ok and 'transactions' in data:
+            return data['transactions'], data.get('lastTransactionID', transaction_id)
+        print("ERROR get_transactions_since()", data)
+        return None, None
+
+    def stream_transactions(self, timeout: float = 30) -> Iterator[Dict[str, Any]]:
+        """
+        Yield transactions and heartbeats from the account transaction stream until it closes.
+
+        The stream sends a heartbeat every 5 seconds, so ``timeout`` bounds how long a dead
+        connection goes unnoticed. Not recorded or replayed by the cassette.
+        """
+        full_url = f"{self.stream_url}/accounts/{self.account_id}/transactions/stream"
+        with self.session.get(full_url, stream=True, timeout=timeout) as response:
+            response.raise_for_status()
+            # chunk_size=None hands over each chunk as it arrives instead of waiting to fill a buffer
+            for line in response.iter_lines(chunk_size=None):
+                if line:
+                    yield json.loads(line)
+
+    def stream_prices(self, instruments: List[str], timeout: float = 30) -> Iterator[Dict[str, Any]]:
+        """
+        Yield prices and heartbeats from the pricing stream of ``instruments`` until it closes.
+
+        Heartbeats come every 5 seconds, as on the transaction stream. Not
+        recorded or replayed by the cassette.
+        """
+        full_url = f"{self.stream_url}/accounts/{self.account_id}/pricing/stream"
+        with self.session.get(full_url, params=dict(instruments=",".join(instruments)), stream=True,
+                              timeout=timeout) as response:
+            response.raise_for_status()
+            for line in response.iter_lines(chunk_size=None):
+                if line:
+                    yield json.loads(line)
+
     def fetch_candles(self, pair_name, count=10, granularity="H1",
                       price="MBA", date_f=None, date_t=None):
         url = f"instruments/{pair_name}/candles"
@@ -348,7 +462,7 @@ class OandaApi:
 
         return ok, response
 
-    def get_prices(self, instruments_list):
+    def fetch_prices(self, instruments_list) -> Dict[str, Any] | None:
         url = f"accounts/{self.account_id}/pricing"
 
         params = dict(
@@ -359,6 +473,14 @@ class OandaApi:
         ok, response = self.make_request(url, params=params)
 
         if ok and 'prices' in response and 'homeConversions' in response:
+            return response
+
+        return None
+
+    def get_prices(self, instruments_list):
+        response = self.fetch_prices(instruments_list)
+
+        if response is not None:
             return [ApiPrice(x, response['homeConversions']) for x in response['prices']]
 
         return None
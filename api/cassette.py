@@ -0,0 +1,162 @@
+import gzip
+import json
+import os
+import threading
+import time
+import zlib
+from collections import defaultdict, deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+RECORD = "record"
+REPLAY = "replay"
+
+# request fields that change on every run and must not be part of the match key
+VOLATILE_FIELDS = {"gtdTime"}
+
+
+def _strip_volatile(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {k: _strip_volatile(v) for k, v in value.items() if k not in VOLATILE_FIELDS}
+    if isinstance(value, list):
+        return [_strip_volatile(v) for v in value]
+    return value
+
+
+def _json_safe(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {k: _json_safe(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_json_safe(v) for v in value]
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    return str(value)
+
+
+class Cassette:
+    """
+    Records ``OandaApi.make_request`` exchanges to disk and serves them back.
+
+    A cassette is a gzip-compressed JSON-lines file, one line per exchange:
+    the verb, url, params and body of the request, the ``(ok, payload)``
+    pair ``make_request`` returned and the latency of the original call.
+
+    In replay mode requests are matched on verb, url, params and body (minus
+    volatile fields such as order expiry times). Identical requests are served
+    in the order they were recorded, so a bot polling the same endpoint sees
+    the same sequence of answers on every run; once a request's recording is
+    used up its last answer is repeated and :attr:`exhausted` is set. Nothing
+    goes to the network while replaying.
+
+    Every exchange is flushed to disk as it is recorded, so a recording cut
+    short by a kill is still readable up to its last complete line; such a
+    file is rewritten complete before more is appended to it.
+
+    Example:
+        >>> cassette = Cassette("./cassettes/2024-05-01.jsonl.gz", mode=RECORD)
+        >>> api = OandaApi(account_id, api_key, url, cassette=cassette)
+        >>> ...  # run the bot, then
+        >>> cassette.close()
+        >>> # later, offline
+        >>> api = OandaApi(account_id, api_key, url,
+        ...                cassette=Cassette("./cassettes/2024-05-01.jsonl.gz", mode=REPLAY))
+    """
+
+    def __init__(self, path: str, mode: str = REPLAY, replay_latency: bool = False) -> None:
+        """
+        Args:
+            path: Cassette file
+            mode: ``"record"`` to append every exchange, ``"replay"`` to serve them back
+            replay_latency: Sleep for the original latency of each exchange when replaying
+        """
+        if mode not in (RECORD, REPLAY):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+
+        self.path = path
+        self.mode = mode
+        self.replay_latency = replay_latency
+        self.exhausted = False
+
+        self._lock = threading.Lock()
+        self._file = None
+        self._entries: Dict[str, Deque[Dict[str, Any]]] = defaultdict(deque)
+        self._last: Dict[str, Dict[str, Any]] = {}
+
+        if mode == RECORD:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._repair()
+            self._file = gzip.open(path, "at", encoding="utf-8")
+        else:
+            self._load()
+
+    @property
+    def is_replaying(self) -> bool:
+        return self.mode == REPLAY
+
+    @staticmethod
+    def get_key(verb: str, url: str, params: Optional[Dict], data: Optional[Dict]) -> str:
+        return json.dumps([verb, url, _strip_volatile(params), _strip_volatile(data)],
+                          sort_keys=True, default=str)
+
+    def _read_lines(self) -> Tuple[List[str], bool]:
+        """The complete lines of the file, and whether it ended cleanly."""
+        lines: List[str] = []
+        try:
+            with gzip.open(self.path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    lines.append(line)
+        except (EOFError, gzip.BadGzipFile, zlib.error):
+            # cut short: the stream has no trailer, and maybe half a line
+            if lines and not lines[-1].endswith("\n"):
+                lines.pop()
+            return lines, False
+        return lines, True
+
+    def _repair(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        lines, complete = self._read_lines()
+        if complete:
+            return
+        with gzip.open(self.path, "wt", encoding="utf-8") as f:
+            f.writelines(lines)
+
+    def _load(self) -> None:
+        lines, _ = self._read_lines()
+        for line in lines:
+            entry = json.loads(line)
+            self._entries[self.get_key(entry["verb"], entry["url"], entry["params"], entry["data"])].append(entry)
+
+    def record(self, verb: str, url: str, params: Optional[Dict], data: Optional[Dict],
+               ok: bool, payload: Any, latency: float) -> None:
+        line = json.dumps(dict(
+            verb=verb, url=url, params=_json_safe(params), data=_json_safe(data),
+            ok=ok, payload=_json_safe(payload), latency=round(latency, 6),
+        ), separators=(",", ":"))
+        with self._lock:
+            self._file.write(line + "\n")
+            # a sync flush makes everything so far decompressible without the trailer written by close()
+            self._file.flush()
+
+    def play(self, verb: str, url: str, params: Optional[Dict], data: Optional[Dict]) -> Tuple[bool, Any]:
+        key = self.get_key(verb, url, _json_safe(params), _json_safe(data))
+        with self._lock:
+            queue = self._entries.get(key)
+            if queue:
+                entry = queue.popleft()
+                self._last[key] = entry
+            elif key in self._last:
+                entry = self._last[key]
+                self.exhausted = True
+            else:
+                self.exhausted = True
+                return False, {'errorMessage': f"not in cassette: {verb} {url} {params}"}
+
+        if self.replay_latency:
+            time.sleep(entry["latency"])
+        return entry["ok"], entry["payload"]
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
@@ -0,0 +1,159 @@
+import json
+import queue
+import re
+import threading
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+
+class LocalStreamServer:
+    """
+    Stand-in for the OANDA account and transaction stream endpoints, for offline runs.
+
+    Serves, under ``{url}``:
+
+    - ``GET accounts/{id}``: the account snapshot set with :meth:`set_account`
+    - ``GET accounts/{id}/transactions/sinceid?id=N``: pushed transactions after ``N``
+    - ``GET accounts/{id}/transactions/stream``: pushed transactions as JSON lines, with heartbeats
+
+    Transactions given to :meth:`push` get consecutive ids and go to every open
+    stream. Point both ``url`` and ``stream_url`` of an ``OandaApi`` at :attr:`url`.
+
+    Example:
+        >>> server = LocalStreamServer("001-001-1", account={"balance": "1000", "trades": [], "orders": []})
+        >>> server.start()
+        >>> api = OandaApi("001-001-1", "token", server.url, stream_url=server.url)
+        >>> server.push({"type": "ORDER_FILL", "instrument": "EUR_USD",
+        ...              "tradeOpened": {"tradeID": "1", "units": "100", "price": "1.1"}})
+    """
+
+    def __init__(self, account_id: str, account: Optional[Dict[str, Any]] = None,
+                 host: str = "127.0.0.1", port: int = 0, heartbeat_interval: float = 5.0) -> None:
+        self.account_id = account_id
+        self.heartbeat_interval = heartbeat_interval
+        self.transactions: List[Dict[str, Any]] = []
+        self._account: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._streams: List[queue.Queue] = []
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+        self.set_account(account or {})
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v3"
+
+    @property
+    def last_transaction_id(self) -> int:
+        return int(self.transactions[-1]["id"]) if self.transactions else int(self._account["lastTransactionID"])
+
+    def set_account(self, account: Dict[str, Any]) -> None:
+        with self._lock:
+            self._account = {"id": self.account_id, "lastTransactionID": "0", **account}
+
+    def push(self, transaction: Dict[str, Any]) -> Dict[str, Any]:
+        """Record a transaction, numbering it after the last one, and send it to every open stream."""
+        with self._lock:
+            transaction = {**transaction, "id": str(self.last_transaction_id + 1),
+                           "time": transaction.get("time", _now()), "accountID": self.account_id}
+            self.transactions.append(transaction)
+            for stream in self._streams:
+                stream.put(transaction)
+        return transaction
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._server.serve_forever, name="local-stream-server", daemon=True)
+        self._thread.start()
+
+    def drop_streams(self) -> None:
+        """End every open stream, as a dropped connection would; transactions pushed meanwhile reach no stream."""
+        with self._lock:
+            for stream in self._streams:
+                stream.put(None)
+
+    def stop(self) -> None:
+        self.drop_streams()
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _since(self, transaction_id: int) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [t for t in self.transactions if int(t["id"]) > transaction_id]
+
+    def _make_handler(self):
+        server = self
+        account_path = re.compile(rf"^/v3/accounts/{re.escape(server.account_id)}/?$")
+        since_path = re.compile(rf"^/v3/accounts/{re.escape(server.account_id)}/transactions/sinceid$")
+        stream_path = re.compile(rf"^/v3/accounts/{re.escape(server.account_id)}/transactions/stream$")
+
+        class Handler(BaseHTTPRequestHandler):
+            # chunked transfer encoding for the stream, as the real endpoint uses
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, payload: Dict[str, Any], code: int = 200) -> None:
+                body = json.dumps(payload).encode()
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                path, _, query = self.path.partition("?")
+                params = dict(p.split("=", 1) for p in query.split("&") if "=" in p)
+
+                if account_path.match(path):
+                    with server._lock:
+                        account = {**server._account, "lastTransactionID": str(server.last_transaction_id)}
+                    self._send_json({"account": account, "lastTransactionID": account["lastTransactionID"]})
+                elif since_path.match(path):
+                    self._send_json({"transactions": server._since(int(params.get("id", 0))),
+                                     "lastTransactionID": str(server.last_transaction_id)})
+                elif stream_path.match(path):
+                    self._stream()
+                else:
+                    self._send_json({"errorMessage": f"Not found: {path}"}, code=404)
+
+            def _stream(self) -> None:
+                stream: queue.Queue = queue.Queue()
+                with server._lock:
+                    server._streams.append(stream)
+                self.send_response(200)
+                self.send_header("Content-Type", "application/octet-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                self.close_connection = True
+                try:
+                    # heartbeat straight away so clients know the stream is up
+                    stream.put({"type": "HEARTBEAT", "lastTransactionID": str(server.last_transaction_id),
+                                "time": _now()})
+                    while True:
+                        try:
+                            message = stream.get(timeout=server.heartbeat_interval)
+                        except queue.Empty:
+                            message = {"type": "HEARTBEAT", "lastTransactionID": str(server.last_transaction_id),
+                                       "time": _now()}
+                        if message is None:
+                            self.wfile.write(b"0\r\n\r\n")
+                            break
+                        line = json.dumps(message).encode() + b"\n"
+                        self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+                        self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+                finally:
+                    with server._lock:
+                        server._streams.remove(stream)
+
+        return Handler
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
@@ -0,0 +1,91 @@
+import json
+import socket
+import threading
+from typing import Any, Dict, Optional
+
+from api.OandaApi import OandaApi
+from api.market_data_service import DEFAULT_SOCKET_PATH
+
+_UNAVAILABLE = object()
+
+
+class MarketDataClient(OandaApi):
+    """
+    ``OandaApi`` whose candle and pricing requests go to a local :class:`MarketDataService`.
+
+    Everything built on ``fetch_candles`` and ``fetch_prices`` (``get_candles_df``,
+    ``last_complete_candle``, ``get_price``, ...) is served by the daemon; orders,
+    trades and account requests still go to the broker directly. Each thread
+    keeps its own connection to the socket. When the daemon cannot be reached,
+    or does not answer within ``timeout`` seconds, the request goes to the
+    broker directly, unless ``fallback`` is off.
+    """
+
+    def __init__(self, account_id, api_key, url, socket_path: str = DEFAULT_SOCKET_PATH,
+                 fallback: bool = True, timeout: float = 10.0, **kwargs):
+        super().__init__(account_id, api_key, url, **kwargs)
+        self.socket_path = socket_path
+        self.fallback = fallback
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        self._local.sock = sock
+        self._local.file = sock.makefile("rwb")
+        return self._local.file
+
+    def _disconnect(self) -> None:
+        for name in ("file", "sock"):
+            handle = getattr(self._local, name, None)
+            if handle is not None:
+                try:
+                    handle.close()
+                except OSError:
+                    pass
+                setattr(self._local, name, None)
+
+    def _call(self, method: str, **kwargs) -> Any:
+        request = json.dumps(dict(method=method, kwargs=kwargs), default=str).encode() + b"\n"
+        # a connection dropped by a restarted daemon is retried once on a fresh one
+        for _ in range(2):
+            try:
+                f = getattr(self._local, "file", None) or self._connect()
+                f.write(request)
+                f.flush()
+                line = f.readline()
+                if not line:
+                    raise ConnectionError("market data service closed the connection")
+                response = json.loads(line)
+                if not response["ok"]:
+                    print(f"ERROR market data {method}", kwargs, response.get("error"))
+                    return None
+                return response["result"]
+            except socket.timeout:
+                # a hung daemon would hang the retry too; the answer may still arrive, so drop the connection
+                self._disconnect()
+                print(f"ERROR market data {method} timed out after {self.timeout}s")
+                return _UNAVAILABLE
+            except OSError:
+                self._disconnect()
+        return _UNAVAILABLE
+
+    def fetch_candles(self, pair_name, count=10, granularity="H1",
+                      price="MBA", date_f=None, date_t=None):
+        result = self._call("fetch_candles", pair_name=pair_name, count=count, granularity=granularity, price=price,
+                            date_f=date_f.isoformat() if date_f is not None else None,
+                            date_t=date_t.isoformat() if date_t is not None else None)
+        if result is _UNAVAILABLE:
+            if not self.fallback:
+                return None
+            return super().fetch_candles(pair_name, count=count, granularity=granularity, price=price,
+                                         date_f=date_f, date_t=date_t)
+        return result
+
+    def fetch_prices(self, instruments_list) -> Optional[Dict[str, Any]]:
+        result = self._call("fetch_prices", instruments_list=list(instruments_list))
+        if result is _UNAVAILABLE:
+            return super().fetch_prices(instruments_list) if self.fallback else None
+        return result
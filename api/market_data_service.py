@@ -0,0 +1,245 @@
+import concurrent.futures
+import json
+import os
+import socketserver
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from api.OandaApi import OandaApi
+from core.metrics import REGISTRY
+
+DEFAULT_SOCKET_PATH = "/tmp/oanda_market_data.sock"
+# candles of the request that checks for new complete candles and reads the forming one
+HEAD_COUNT = 3
+
+# result is hit, miss (fetched) or shared (waited on another request's fetch)
+CACHE_REQUESTS = REGISTRY.counter("cache_requests_total", "Cache lookups by result", ["cache", "result"])
+
+
+class CoalescingCache:
+    """
+    Time-to-live cache where concurrent misses on the same key share one fetch.
+
+    ``None`` results are treated as failures and not cached.
+    """
+
+    MAX_ENTRIES = 4096
+
+    def __init__(self, ttl: float, name: str = "default") -> None:
+        self.ttl = ttl
+        self.name = name
+        self._lock = threading.Lock()
+        self._entries: Dict[Hashable, Tuple[float, Any]] = {}
+        self._in_flight: Dict[Hashable, concurrent.futures.Future] = {}
+
+    def get(self, key: Hashable, fetch: Callable[[], Any]) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] < self.ttl:
+                CACHE_REQUESTS.inc(cache=self.name, result="hit")
+                return entry[1]
+            future = self._in_flight.get(key)
+            is_owner = future is None
+            if is_owner:
+                future = self._in_flight[key] = concurrent.futures.Future()
+
+        if not is_owner:
+            CACHE_REQUESTS.inc(cache=self.name, result="shared")
+            return future.result()
+        CACHE_REQUESTS.inc(cache=self.name, result="miss")
+
+        try:
+            value = fetch()
+        except Exception as e:
+            with self._lock:
+                self._in_flight.pop(key, None)
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            self._in_flight.pop(key, None)
+            if value is not None:
+                self._entries[key] = (time.monotonic(), value)
+                if len(self._entries) > self.MAX_ENTRIES:
+                    self._evict_expired()
+        future.set_result(value)
+        return value
+
+    def _evict_expired(self) -> None:
+        now = time.monotonic()
+        for key in [k for k, (at, _) in self._entries.items() if now - at >= self.ttl]:
+            del self._entries[key]
+
+
+class MarketDataService:
+    """
+    Local daemon owning the candle and pricing requests of every bot process on the host.
+
+    Bots connect through :class:`api.market_data_client.MarketDataClient` over a
+    Unix socket and send one JSON request per line. Complete candles are kept
+    per instrument, granularity and price, whatever the count asked for, until
+    a newer candle completes: a request is answered from them and the last
+    ``HEAD_COUNT`` candles, fetched at most every ``candle_ttl`` seconds for all
+    bots. A new complete candle in those is appended; the full history is only
+    fetched again when the head no longer joins it, or more candles are asked
+    for. Concurrent misses share a single broker request. Requests by date are
+    cached for ``candle_ttl`` seconds. Prices are cached per instrument for
+    ``price_ttl`` seconds, and the stale instruments of a request are fetched in
+    one pricing call. Broker traffic therefore depends on the set of instruments
+    and granularities in use, not on the number of bots.
+
+    Example:
+        >>> service = MarketDataService(OandaApi(account_id, api_key, url))
+        >>> service.serve_forever()
+        >>> # in each bot process
+        >>> api = MarketDataClient(account_id, api_key, url)
+    """
+
+    def __init__(self, api_client: OandaApi, socket_path: str = DEFAULT_SOCKET_PATH,
+                 candle_ttl: float = 1.0, price_ttl: float = 0.5) -> None:
+        self.api = api_client
+        self.socket_path = socket_path
+        self.candles = CoalescingCache(candle_ttl, name="candles")
+        self.price_flights = CoalescingCache(price_ttl, name="price_requests")
+        self.price_ttl = price_ttl
+
+        self._lock = threading.Lock()
+        # (instrument, granularity, price) -> complete candles, oldest first, and the count they were fetched with
+        self._histories: Dict[Tuple[str, str, str], Tuple[List[Dict[str, Any]], int]] = {}
+        self._prices: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+        self._home_conversions: Dict[str, Dict[str, Any]] = {}
+        self._server: Optional[socketserver.ThreadingUnixStreamServer] = None
+        self.requests_served = 0
+
+    def fetch_candles(self, pair_name: str, count: int = 10, granularity: str = "H1", price: str = "MBA",
+                      date_f: Optional[str] = None, date_t: Optional[str] = None) -> Optional[List[Dict[str, Any]]]:
+        if date_f or date_t:
+            key = ("candles", pair_name, count, granularity, price, date_f, date_t)
+            return self.candles.get(key, lambda: self.api.fetch_candles(
+                pair_name, count=count, granularity=granularity, price=price,
+                date_f=datetime.fromisoformat(date_f) if date_f else None,
+                date_t=datetime.fromisoformat(date_t) if date_t else None))
+
+        head = self.candles.get(("head", pair_name, granularity, price), lambda: self.api.fetch_candles(
+            pair_name, count=HEAD_COUNT, granularity=granularity, price=price))
+        if head is None:
+            return None
+        forming = [c for c in head if not c["complete"]][-1:]
+
+        history_key = (pair_name, granularity, price)
+        with self._lock:
+            history = self._histories.get(history_key)
+            if history is not None:
+                history = self._histories[history_key] = self._extend(history, head)
+        if history is not None:
+            complete, fetched_count = history
+            if len(complete) + len(forming) >= count or fetched_count >= count:
+                CACHE_REQUESTS.inc(cache="candle_history", result="hit")
+                return (complete + forming)[-count:]
+
+        CACHE_REQUESTS.inc(cache="candle_history", result="miss")
+        candles = self.candles.get(("candles", pair_name, count, granularity, price, None, None),
+                                   lambda: self.api.fetch_candles(pair_name, count=count, granularity=granularity,
+                                                                  price=price))
+        if candles is not None:
+            with self._lock:
+                current = self._histories.get(history_key)
+                if current is None or current[1] <= count:
+                    self._histories[history_key] = ([c for c in candles if c["complete"]], count)
+        return candles
+
+    @staticmethod
+    def _extend(history: Tuple[List[Dict[str, Any]], int],
+                head: List[Dict[str, Any]]) -> Optional[Tuple[List[Dict[str, Any]], int]]:
+        """``history`` with the complete candles of ``head`` newer than its last; None when they do not join."""
+        complete, fetched_count = history
+        head_complete = [c for c in head if c["complete"]]
+        if not complete or not head_complete:
+            return None if head_complete else history
+        last = complete[-1]["time"]
+        times = [c["time"] for c in head_complete]
+        if times[-1] == last:
+            return history
+        if last not in times:
+            return None
+        newer = head_complete[times.index(last) + 1:]
+        return (complete + newer)[-fetched_count:], fetched_count
+
+    def fetch_prices(self, instruments_list: List[str]) -> Optional[Dict[str, Any]]:
+        now = time.monotonic()
+        with self._lock:
+            stale = sorted({i for i in instruments_list
+                            if i not in self._prices or now - self._prices[i][0] >= self.price_ttl})
+        CACHE_REQUESTS.inc(len(stale), cache="prices", result="miss")
+        CACHE_REQUESTS.inc(len(instruments_list) - len(stale), cache="prices", result="hit")
+
+        if stale:
+            response = self.price_flights.get(("prices", tuple(stale)), lambda: self.api.fetch_prices(stale))
+            if response is None:
+                return None
+            with self._lock:
+                fetched_at = time.monotonic()
+                for p in response["prices"]:
+                    self._prices[p["instrument"]] = (fetched_at, p)
+                for hc in response["homeConversions"]:
+                    self._home_conversions[hc["currency"]] = hc
+
+        with self._lock:
+            prices = [self._prices[i][1] for i in instruments_list if i in self._prices]
+            home_conversions = list(self._home_conversions.values())
+        return dict(prices=prices, homeConversions=home_conversions)
+
+    def handle(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        method, kwargs = request.get("method"), request.get("kwargs", {})
+        self.requests_served += 1
+        try:
+            if method == "fetch_candles":
+                result = self.fetch_candles(**kwargs)
+            elif method == "fetch_prices":
+                result = self.fetch_prices(**kwargs)
+            else:
+                return dict(ok=False, error=f"unknown method {method}")
+        except Exception as e:
+            return dict(ok=False, error=str(e))
+        return dict(ok=result is not None, result=result)
+
+    def _make_handler(self):
+        service = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    try:
+                        response = service.handle(json.loads(line))
+                    except json.JSONDecodeError as e:
+                        response = dict(ok=False, error=f"bad request: {e}")
+                    self.wfile.write(json.dumps(response, separators=(",", ":")).encode() + b"\n")
+                    self.wfile.flush()
+
+        return Handler
+
+    def start(self) -> None:
+        """Listen on the socket from a background thread."""
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        self._server = socketserver.ThreadingUnixStreamServer(self.socket_path, self._make_handler())
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="market-data-service", daemon=True).start()
+
+    def serve_forever(self) -> None:
+        self.start()
+        try:
+            while True:
+                time.sleep(60)
+        finally:
+            self.stop()
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
@@ -20,4 +20,22 @@ PERIODS_IN_YEAR = {
 }
 
 HEIKEN_ASHI_STREAK = 100
-ATR_RISK_FILTER = 3
\ No newline at end of file
+ATR_RISK_FILTER = 3
+RSI_OVERBOUGHT = 70
+RSI_OVERSOLD = 30
+MAX_QTY_RATIO = 0.5
+
+GRANULARITY_SECONDS = {
+    "D": 24 * 60 * 60,
+    "H4": 4 * 60 * 60,
+    "H1": 60 * 60,
+    "M30": 30 * 60,
+    "M15": 15 * 60,
+    "M5": 5 * 60,
+    "M1": 60,
+}
+MAX_CANDLES_PER_REQUEST = 5000
+
+# OANDA's default candle alignment: the trading day starts at 17:00 New York time
+DAILY_ALIGNMENT = 17
+ALIGNMENT_TIMEZONE = "America/New_York"
@@ -1,96 +1,84 @@
-from typing import Tuple, Callable, Optional
+from typing import Callable, Dict, List, Optional, Tuple
 
 import numpy as np
 import pandas as pd
 
 from api.OandaApi import OandaApi
-from config.constants import HEIKEN_ASHI_STREAK, ATR_KEY, ATR_RISK_FILTER
 from core.base_api import BaseAPI
 from core.pair_config import PairConfig
+from core.strategy import STRATEGIES, Strategy, StrategyDecision, StrategyState, combine_decisions
 from models.TradeSettings import TradeSettings
-from models.instrument_data import InstrumentData
+from models.indicator_frame import IndicatorFrame
 from models.open_trade import OpenTrade
-from utils.stop_loss import get_probable_stop_loss
+from models.strategy_params import StrategyParams
 
 
 class StrategyManager:
-    def __init__(self, api_client: OandaApi, trade_settings: TradeSettings, base_api: BaseAPI) -> None:
+    def __init__(self, api_client: OandaApi, trade_settings: TradeSettings, base_api: BaseAPI,
+                 params: Optional[StrategyParams] = None) -> None:
         self.api_client = api_client
         self.trade_settings = trade_settings
         self.base_api = base_api
+        self.params: StrategyParams = params if params is not None else StrategyParams()
+        self._strategies: Dict[Tuple[str, StrategyParams], Strategy] = {}
 
-    def check_for_trigger(self, heikin_ashi: pd.DataFrame, logger: Callable[[str], None]) -> int:
-        last_ha_candle = heikin_ashi.iloc[-1]
-        streak: int = last_ha_candle.ha_streak
-        trigger: bool = np.abs(streak) <= HEIKEN_ASHI_STREAK and last_ha_candle.ha_open_at_extreme == 1
-        logger(f"streak: {streak}, trigger: {trigger}")
-        return np.sign(streak) if trigger else 0
+    def get_strategies(self, pair_config: PairConfig) -> List[Strategy]:
+        """The strategies of a pair, in priority order, created once per parameter set."""
+        strategies = []
+        for name in pair_config.strategies:
+            key = (name, self.params)
+            strategy = self._strategies.get(key)
+            if strategy is None:
+                factory = STRATEGIES.get(name)
+                if factory is None:
+                    raise ValueError(f"Unknown strategy {name} for {pair_config.pair}, expected one of {list(STRATEGIES)}")
+                strategy = self._strategies[key] = factory(self.params)
+            strategies.append(strategy)
+        return strategies
 
-    def _check_for_trading_condition(
-        self, 
-        candles: pd.DataFrame, 
-        signal: int, 
-        instrument: InstrumentData,
-        pair_logger: Callable[[str], None], 
-        rejected_logger: Callable[[str], None], 
-        pair_config: PairConfig, 
-        heikin_ashi: pd.DataFrame, 
-        sma_trend_30: int, 
-        rsi: float
-    ) -> Tuple[int, Optional[float], Optional[float]]:
-        sl_price, take_profit, sl_gap = get_probable_stop_loss(
-            np.sign(signal), 
-            candles,
-            instrument.pipLocationPrecision, 
-            pair_logger, 
-            heikin_ashi
-        )
+    def add_features(self, frame: pd.DataFrame, state: StrategyState) -> pd.DataFrame:
+        """``frame`` with the features of every strategy of the pair; a column two strategies share is kept once."""
+        for strategy in self.get_strategies(state.pair_config):
+            features = strategy.features(frame, state)
+            new_columns = [col for col in features.columns if col not in frame.columns]
+            if new_columns:
+                frame = pd.concat([frame, features[new_columns]], axis=1)
+        return frame
 
-        if signal == 1 and pair_config.short_only:
-            rejected_logger(f"short_only: {pair_config.short_only}, skipping trade")
-            return 0, None, None
-        elif signal == -1 and pair_config.long_only:
-            rejected_logger(f"long_only: {pair_config.long_only}, skipping trade")
-            return 0, None, None
-        elif np.sign(signal) != np.sign(sma_trend_30):
-            rejected_logger(f"sma_trend_30: {sma_trend_30} does not match signal: {signal}, skipping trade")
-            return 0, None, None
-        elif signal > 0 and rsi > 70:
-            rejected_logger(f"rsi: {rsi} is too high, skipping trade")
-            return 0, None, None
-        elif signal < 0 and rsi < 30:
-            rejected_logger(f"rsi: {rsi} is too low, skipping trade")
-            return 0, None, None
-        else:
-            return signal, sl_price, take_profit
+    def signals(self, frame: pd.DataFrame, state: StrategyState) -> pd.DataFrame:
+        """
+        ``trigger`` and ``signal`` of every bar of a frame holding the indicators
+        and features, combined over the pair's strategies like :meth:`decide`.
+        """
+        n_bars = len(frame)
+        signal = np.zeros(n_bars, dtype=int)
+        first_trigger = np.zeros(n_bars, dtype=int)
+        for strategy in self.get_strategies(state.pair_config):
+            result = strategy.signals(frame, state)
+            signal = np.where(signal == 0, result["signal"].to_numpy(), signal)
+            first_trigger = np.where(first_trigger == 0, result["trigger"].to_numpy(), first_trigger)
+        trigger = np.where(signal != 0, signal, first_trigger)
+        return pd.DataFrame({"trigger": trigger, "signal": signal}, index=frame.index)
 
-    def check_and_get_trade_qty(
-        self, 
-        candles: pd.DataFrame, 
-        trigger: int, 
-        instrument: InstrumentData,
-        pair_logger: Callable[[str], None], 
-        rejected_logger: Callable[[str], None], 
-        pair_config: PairConfig,
-        heikin_ashi: pd.DataFrame, 
-        sma_trend_30: int, 
-        rsi: float
-    ) -> Tuple[bool, Optional[float], Optional[float]]:
-        revised_signal, sl_price, take_profit = self._check_for_trading_condition(
-            candles, 
-            trigger, 
-            instrument,
-            pair_logger, 
-            rejected_logger, 
-            pair_config=pair_config,
-            heikin_ashi=heikin_ashi, 
-            sma_trend_30=sma_trend_30, 
-            rsi=rsi
-        )
-        if revised_signal != 0:
-            return True, sl_price, take_profit
+    def get_last_row(self, prepared: IndicatorFrame, state: StrategyState) -> pd.Series:
+        """The last bar of a live indicator frame with the Heiken-Ashi state, RSI and strategy features."""
+        candles = self.add_features(prepared.candles, state)
+        last_row = candles.iloc[-1].copy()
+        last_ha_candle = prepared.heikin_ashi.iloc[-1]
+        last_row["ha_streak"] = last_ha_candle.ha_streak
+        last_row["ha_open_at_extreme"] = last_ha_candle.ha_open_at_extreme
+        last_row["rsi"] = prepared.rsi
+        return last_row
 
-        return False, None, None
+    def decide(self, prepared: IndicatorFrame, state: StrategyState,
+               logger: Callable[[str], None]) -> StrategyDecision:
+        """Run the pair's strategies on the last bar and return the decision to act on."""
+        last_row = self.get_last_row(prepared, state)
+        decisions = [strategy.decide(last_row, state) for strategy in self.get_strategies(state.pair_config)]
+        for decision in decisions:
+            logger(f"{decision.strategy} - streak: {last_row['ha_streak']}, trigger: {decision.trigger}, "
+                   f"signal: {decision.signal}")
+        return combine_decisions(decisions)
 
     def check_for_closing_trade(
         self, 
@@ -0,0 +1,272 @@
+import math
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from api.OandaApi import OandaApi
+from models.open_trade import OpenTrade
+from models.position_data import PositionData
+
+HEARTBEAT = "HEARTBEAT"
+ORDER_FILL = "ORDER_FILL"
+ORDER_CANCEL = "ORDER_CANCEL"
+STOP_LOSS_ORDER = "STOP_LOSS_ORDER"
+TRAILING_STOP_LOSS_ORDER = "TRAILING_STOP_LOSS_ORDER"
+# order types as listed in the account details
+STOP_LOSS = "STOP_LOSS"
+TRAILING_STOP_LOSS = "TRAILING_STOP_LOSS"
+
+# the stream heartbeats every 5 seconds; after this long without a message the state is not trusted
+STALE_AFTER_SECONDS = 20
+
+
+class AccountState:
+    """
+    In-memory copy of the open trades of an account, kept current from its transactions.
+
+    :meth:`seed` loads the open trades, their stop loss orders and the balance
+    from the account details once; :meth:`apply` then folds in every transaction
+    in id order: fills opening, reducing and closing trades, stop loss and
+    trailing stop orders being created, replaced or cancelled, and the balance
+    after financing and realized P/L. Reads are dictionary lookups.
+
+    Transactions carry no prices, so unrealized P/L is marked by the caller with
+    :meth:`mark`, from a price in the quote currency and the home to quote
+    exchange rate, as elsewhere in the bot.
+
+    Example:
+        >>> state = AccountState(api_client)
+        >>> state.seed()
+        >>> TransactionStream(api_client, state).start()
+        >>> state.get_position("EUR_USD")
+    """
+
+    def __init__(self, api_client: OandaApi) -> None:
+        self.api = api_client
+        self.balance: float = 0.0
+        self.last_transaction_id: int = 0
+        self.last_message: float = 0.0
+        self.connected: bool = False
+
+        self._lock = threading.Lock()
+        self._trades: Dict[str, OpenTrade] = {}
+        self._trades_by_pair: Dict[str, Dict[str, OpenTrade]] = {}
+        # stop loss / trailing stop order id -> trade id
+        self._stop_orders: Dict[str, str] = {}
+
+    @property
+    def is_current(self) -> bool:
+        """Whether the stream is connected and has been heard from recently."""
+        return self.connected and time.monotonic() - self.last_message < STALE_AFTER_SECONDS
+
+    def seed(self) -> bool:
+        account = self.api.get_account_details()
+        if account is None:
+            return False
+
+        stop_orders = {o["tradeID"]: o for o in account.get("orders", [])
+                       if o.get("type") == STOP_LOSS and "tradeID" in o}
+        trailing_orders = {o["tradeID"]: o for o in account.get("orders", [])
+                           if o.get("type") == TRAILING_STOP_LOSS and "tradeID" in o}
+
+        with self._lock:
+            self._trades.clear()
+            self._trades_by_pair.clear()
+            self._stop_orders.clear()
+            for t in account.get("trades", []):
+                trade = OpenTrade({**t, "state": "OPEN",
+                                   "stopLossOrder": stop_orders.get(t["id"]),
+                                   "trailingStopLossOrder": trailing_orders.get(t["id"])})
+                self._add_trade(trade)
+            self.balance = float(account.get("balance", 0))
+            self.last_transaction_id = int(account["lastTransactionID"])
+        return True
+
+    def apply(self, transaction: Dict[str, Any]) -> None:
+        """Fold one transaction into the state; transactions already applied are ignored."""
+        self.last_message = time.monotonic()
+        kind = transaction.get("type")
+        if kind == HEARTBEAT or "id" not in transaction:
+            return
+
+        with self._lock:
+            transaction_id = int(transaction["id"])
+            if transaction_id <= self.last_transaction_id:
+                return
+            self.last_transaction_id = transaction_id
+
+            if kind == ORDER_FILL:
+                self._apply_fill(transaction)
+            elif kind in (STOP_LOSS_ORDER, TRAILING_STOP_LOSS_ORDER):
+                self._apply_stop_order(transaction)
+            elif kind == ORDER_CANCEL:
+                self._apply_cancel(transaction)
+
+            if "accountBalance" in transaction:
+                self.balance = float(transaction["accountBalance"])
+
+    def _add_trade(self, trade: OpenTrade) -> None:
+        self._trades[trade.id] = trade
+        self._trades_by_pair.setdefault(trade.instrument, {})[trade.id] = trade
+        for order in (trade.stopLossOrder, trade.trailingStopLossOrder):
+            if order is not None and "id" in order:
+                self._stop_orders[order["id"]] = trade.id
+
+    def _remove_trade(self, trade_id: str) -> None:
+        trade = self._trades.pop(trade_id, None)
+        if trade is None:
+            return
+        self._trades_by_pair.get(trade.instrument, {}).pop(trade_id, None)
+        for order in (trade.stopLossOrder, trade.trailingStopLossOrder):
+            if order is not None:
+                self._stop_orders.pop(order.get("id"), None)
+
+    def _apply_fill(self, transaction: Dict[str, Any]) -> None:
+        for closed in transaction.get("tradesClosed", []):
+            self._remove_trade(closed["tradeID"])
+
+        reduced = transaction.get("tradeReduced")
+        if reduced is not None and reduced["tradeID"] in self._trades:
+            trade = self._trades[reduced["tradeID"]]
+            trade.currentUnits = math.copysign(abs(trade.currentUnits) - abs(float(reduced["units"])), trade.currentUnits)
+
+        opened = transaction.get("tradeOpened")
+        if opened is not None:
+            self._add_trade(OpenTrade(dict(
+                id=opened["tradeID"],
+                instrument=transaction["instrument"],
+                state="OPEN",
+                price=opened.get("price", transaction.get("price")),
+                currentUnits=opened["units"],
+            )))
+
+    def _apply_stop_order(self, transaction: Dict[str, Any]) -> None:
+        trade = self._trades.get(transaction.get("tradeID"))
+        if trade is None:
+            return
+        order = dict(id=transaction["id"], tradeID=trade.id)
+        if transaction["type"] == STOP_LOSS_ORDER:
+            order["price"] = transaction["price"]
+            trade.stopLossOrder = order
+        else:
+            order["distance"] = transaction["distance"]
+            trade.trailingStopLossOrder = order
+        self._stop_orders.pop(transaction.get("replacesOrderID"), None)
+        self._stop_orders[order["id"]] = trade.id
+
+    def _apply_cancel(self, transaction: Dict[str, Any]) -> None:
+        trade_id = self._stop_orders.pop(transaction.get("orderID"), None)
+        trade = self._trades.get(trade_id)
+        if trade is None:
+            return
+        if trade.stopLossOrder is not None and trade.stopLossOrder.get("id") == transaction["orderID"]:
+            trade.stopLossOrder = None
+        if trade.trailingStopLossOrder is not None and trade.trailingStopLossOrder.get("id") == transaction["orderID"]:
+            trade.trailingStopLossOrder = None
+
+    def mark(self, pair: str, price: float, ex_rate: float) -> float:
+        """Set the unrealized P/L of the open trades of ``pair`` at ``price``; returns their total in home currency."""
+        with self._lock:
+            total = 0.0
+            for trade in self._trades_by_pair.get(pair, {}).values():
+                trade.unrealizedPL = (price - trade.price) * trade.currentUnits / ex_rate
+                total += trade.unrealizedPL
+            return total
+
+    def mark_all(self) -> Optional[float]:
+        """
+        Mark every open trade to the current mid price, with one pricing request
+        for all pairs; returns the NAV after marking, or None when the prices
+        could not be fetched.
+        """
+        with self._lock:
+            pairs = sorted(pair for pair, trades in self._trades_by_pair.items() if trades)
+        if pairs:
+            response = self.api.fetch_prices(pairs)
+            if response is None:
+                return None
+            # home currency per unit of each currency
+            conversions = {hc["currency"]: float(hc["positionValue"]) for hc in response["homeConversions"]}
+            for price in response["prices"]:
+                pair = price["instrument"]
+                conversion = conversions.get(pair.split("_")[1])
+                if not conversion:
+                    return None
+                mid = (float(price["bids"][0]["price"]) + float(price["asks"][0]["price"])) / 2
+                self.mark(pair, mid, 1.0 / conversion)
+        return self.nav
+
+    def get_trades(self, pair: str) -> List[OpenTrade]:
+        with self._lock:
+            return list(self._trades_by_pair.get(pair, {}).values())
+
+    def get_position(self, pair: str) -> PositionData:
+        with self._lock:
+            trades = self._trades_by_pair.get(pair, {}).values()
+            return PositionData(
+                instrument=pair,
+                units=sum(t.currentUnits for t in trades),
+                unrealized_pl=sum(t.unrealizedPL for t in trades),
+                margin_used=sum(t.marginUsed for t in trades),
+            )
+
+    def get_positions(self) -> Dict[str, PositionData]:
+        """The position of every instrument with open trades."""
+        with self._lock:
+            pairs = [pair for pair, trades in self._trades_by_pair.items() if trades]
+        return {pair: self.get_position(pair) for pair in pairs}
+
+    @property
+    def nav(self) -> float:
+        with self._lock:
+            return self.balance + sum(t.unrealizedPL for t in self._trades.values())
+
+
+class TransactionStream:
+    """
+    Background thread feeding the account transaction stream into an :class:`AccountState`.
+
+    Before every (re)connection, and whenever a heartbeat reports a newer
+    transaction than the last one applied, the missing transactions are fetched
+    over REST, so neither a dropped stream nor the moment between catching up
+    and the stream starting leaves a gap.
+    """
+
+    def __init__(self, api_client: OandaApi, account_state: AccountState, reconnect_delay: float = 5.0) -> None:
+        self.api = api_client
+        self.state = account_state
+        self.reconnect_delay = reconnect_delay
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="transaction-stream", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self.state.connected = False
+
+    def catch_up(self) -> None:
+        transactions, _ = self.api.get_transactions_since(str(self.state.last_transaction_id))
+        if transactions is None:
+            raise ConnectionError("could not fetch missed transactions")
+        for transaction in transactions:
+            self.state.apply(transaction)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.catch_up()
+                for transaction in self.api.stream_transactions():
+                    self.state.connected = True
+                    self.state.apply(transaction)
+                    if (transaction.get("type") == HEARTBEAT
+                            and int(transaction.get("lastTransactionID", 0)) > self.state.last_transaction_id):
+                        self.catch_up()
+                    if self._stop.is_set():
+                        break
+            except Exception as e:
+                print(f"Transaction stream error: {e}")
+            self.state.connected = False
+            self._stop.wait(self.reconnect_delay)
@@ -0,0 +1,293 @@
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from config.constants import ATR_KEY
+from core.StrategyManager import StrategyManager
+from core.bot import get_additional_qty, get_capped_qty, get_ideal_qty, get_updated_sl
+from core.pair_config import PairConfig
+from core.strategy import StrategyState
+from indicators.batch_indicators import HEIKEN_ASHI_BARS, compute_indicator_arrays, heiken_ashi_2d
+from models.TradeSettings import TradeSettings
+from models.open_trade import OpenTrade
+from utils.get_std_dev import get_std_dev_series
+from utils.no_op import no_op
+from utils.resample import get_bucket_starts, resample_candles
+
+MAX_LEVERAGE_RATIO = 10.0
+
+
+@dataclass
+class BacktestResult:
+    trades: pd.DataFrame
+    equity: pd.Series
+    stats: Dict[str, float] = field(default_factory=dict)
+
+
+@dataclass
+class _PendingOrder:
+    units: float
+    stop: Optional[float] = None
+    take_profit: Optional[float] = None
+    limit: Optional[float] = None
+    trade: Optional[OpenTrade] = None
+
+
+def get_leverage_ratio_series(candles: pd.DataFrame, vol_target: float, std_lookback: int) -> np.ndarray:
+    """
+    Leverage ratio for every bar, computed the way ``BaseAPI.calculate_leverage_ratio``
+    does it live: from the volatility of completed daily bars, built with OANDA's
+    17:00 New York alignment.
+    """
+    daily_close = resample_candles(candles, "D", completed_only=False).set_index("time")["mid_c"]
+    st_dev = get_std_dev_series(daily_close, "D", std_lookback)
+    lev = np.minimum(np.round(vol_target / st_dev, 3), MAX_LEVERAGE_RATIO)
+
+    # a bar may only use days that had completed before it
+    lev = lev.shift(1)
+    days = get_bucket_starts(candles["time"], "D")
+    return lev.reindex(days).ffill().to_numpy()
+
+
+class Backtester:
+    """
+    Evaluates the live Heiken-Ashi / strength strategy over a historical candle frame.
+
+    Everything that only depends on the bar itself is computed once for the whole
+    frame with array operations, using the vectorized counterparts of the live code:
+    indicators from ``indicators.batch_indicators``, and triggers, entry filters and
+    stop levels from the pair's strategies (``StrategyManager.add_features`` and
+    ``signals``), the code ``Bot.process_pair`` runs on the last bar. Only the position book,
+    which is path dependent, is walked bar by bar, and it calls the same sizing
+    (``get_ideal_qty``, ``get_capped_qty``, ``get_additional_qty``), stop update
+    (``get_updated_sl``) and profit booking (``StrategyManager.check_for_closing_trade``)
+    code as ``Bot.process_pair``.
+
+    Decisions are taken at a bar's close and filled at the next bar's open. Market
+    entries pay the spread, stops fill at the stop price or the open if it gapped
+    through, and profit-booking limit orders fill if the next bar trades through
+    their price, like the live one-bar GTD orders.
+
+    Differences with live trading:
+    - Heiken-Ashi is computed over the whole frame instead of the last 100 bars;
+      the streak is capped at 100 bars so the trigger is the same.
+    - Entries are always market orders; the spread-dependent limit entry is not modelled.
+    - Profit and loss is in the quote currency converted at a fixed ``ex_rate``.
+
+    Strategy parameters (streak, stop period, RSI thresholds, quantity cap...) come
+    from ``strategy_manager.params``. Live orders are sent without a take profit;
+    ``use_take_profit`` attaches one at ``tp_multiple`` times the stop distance.
+
+    Example:
+        >>> backtester = Backtester(strategy_manager, PairConfig("EUR_USD", {"granularity": "M15"}),
+        ...                         pip_location_precision=-4, trade_settings=trade_settings)
+        >>> result = backtester.run(candles)
+        >>> result.trades.tail()
+        >>> result.equity.plot()
+    """
+
+    def __init__(self, strategy_manager: StrategyManager, pair_config: PairConfig, pip_location_precision: int,
+                 trade_settings: TradeSettings, initial_nav: float = 10_000.0, ex_rate: float = 1.0,
+                 use_take_profit: bool = False) -> None:
+        self.strategy_manager = strategy_manager
+        self.pair_config = pair_config
+        self.pip_location_precision = pip_location_precision
+        self.trade_settings = trade_settings
+        self.initial_nav = initial_nav
+        self.ex_rate = ex_rate
+        self.use_take_profit = use_take_profit
+
+    @staticmethod
+    def compute_indicators(candles: pd.DataFrame) -> pd.DataFrame:
+        """
+        Indicator columns and the Heiken-Ashi state for every bar. None of these
+        depend on the strategy parameters, so a parameter sweep computes them once
+        per instrument.
+        """
+        candles = candles.reset_index(drop=True)
+        mid = {col: candles[col].to_numpy(dtype=float)[None, :] for col in ("mid_o", "mid_h", "mid_l", "mid_c")}
+        arrays = compute_indicator_arrays(mid)
+
+        frame = candles.copy()
+        for col, values in arrays.items():
+            frame[col] = values[0]
+
+        ha = heiken_ashi_2d(mid["mid_o"], mid["mid_h"], mid["mid_l"], mid["mid_c"])
+        frame["ha_open_at_extreme"] = ha["ha_open_at_extreme"][0]
+        frame["ha_streak"] = np.sign(ha["ha_streak"][0]) * np.minimum(np.abs(ha["ha_streak"][0]), HEIKEN_ASHI_BARS)
+        return frame
+
+    def apply_strategy(self, frame: pd.DataFrame) -> pd.DataFrame:
+        """Add the strategy features, triggers, filtered entry signals and leverage to an indicator frame."""
+        state = StrategyState(self.pair_config, self.pip_location_precision)
+        frame = self.strategy_manager.add_features(frame.copy(), state)
+        signals = self.strategy_manager.signals(frame, state)
+        frame["trigger"] = signals["trigger"]
+        frame["signal"] = signals["signal"]
+
+        frame["leverage_ratio"] = get_leverage_ratio_series(
+            frame, self.trade_settings.vol_target, self.trade_settings.std_lookback)
+        return frame
+
+    def prepare(self, candles: pd.DataFrame) -> pd.DataFrame:
+        """Compute every per-bar input of the decision for the whole frame."""
+        return self.apply_strategy(self.compute_indicators(candles))
+
+    def run(self, candles: pd.DataFrame, indicators: Optional[pd.DataFrame] = None) -> BacktestResult:
+        """
+        Run the strategy over ``candles``.
+
+        Args:
+            candles: Frame with ``time`` and mid/bid/ask OHLC columns, as returned by
+                ``OandaApi.get_candles_df``
+            indicators: Output of :meth:`compute_indicators` for ``candles``, when
+                already available
+
+        Returns:
+            BacktestResult with one row per fill and the equity curve at every close
+        """
+        if indicators is None:
+            indicators = self.compute_indicators(candles)
+        frame = self.apply_strategy(indicators)
+        n = len(frame)
+
+        time = frame["time"].to_numpy()
+        mid_c = frame["mid_c"].to_list()
+        bid_o, bid_h, bid_l = (frame[c].to_list() for c in ("bid_o", "bid_h", "bid_l"))
+        ask_o, ask_h, ask_l = (frame[c].to_list() for c in ("ask_o", "ask_h", "ask_l"))
+        atr = frame[ATR_KEY].to_list()
+        trigger = frame["trigger"].to_list()
+        signal = frame["signal"].to_list()
+        sl_long, sl_short = frame["sl_long"].to_list(), frame["sl_short"].to_list()
+        tp_long, tp_short = frame["tp_long"].to_list(), frame["tp_short"].to_list()
+        bullish, bearish = frame["bullish_strength"].to_list(), frame["bearish_strength"].to_list()
+        leverage = frame["leverage_ratio"].to_list()
+
+        ex_rate = self.ex_rate
+        weight = self.pair_config.weight
+        max_qty_ratio = self.strategy_manager.params.max_qty_ratio
+        take_profits: Dict[str, float] = {}
+        cash = self.initial_nav
+        open_trades: List[OpenTrade] = []
+        pending: List[_PendingOrder] = []
+        fills: List[Dict] = []
+        equity = np.empty(n)
+        next_id = 0
+
+        def record(i: int, t: OpenTrade, units: float, price: float, reason: str, pl: float = 0.0) -> None:
+            fills.append(dict(time=time[i], trade_id=t.id, units=units, price=price, reason=reason, pl=pl))
+
+        def new_order(i: int, units: float, direction: int) -> _PendingOrder:
+            stop = sl_long[i] if direction > 0 else sl_short[i]
+            take_profit = (tp_long[i] if direction > 0 else tp_short[i]) if self.use_take_profit else None
+            return _PendingOrder(units=get_capped_qty(base_qty, units, max_qty_ratio), stop=stop,
+                                 take_profit=take_profit)
+
+        def close_units(i: int, t: OpenTrade, units: float, price: float, reason: str) -> float:
+            pl = -units * (price - t.price) / ex_rate
+            t.currentUnits += units
+            record(i, t, units, price, reason, pl)
+            return pl
+
+        for i in range(n):
+            # fills for the orders sent at the previous close
+            for order in pending:
+                if order.trade is None:
+                    price = ask_o[i] if order.units > 0 else bid_o[i]
+                    t = OpenTrade(dict(id=str(next_id), instrument=self.pair_config.pair, state="OPEN",
+                                       price=price, currentUnits=order.units,
+                                       stopLossOrder=dict(price=str(order.stop))))
+                    next_id += 1
+                    open_trades.append(t)
+                    if order.take_profit is not None:
+                        take_profits[t.id] = order.take_profit
+                    record(i, t, order.units, price, "entry")
+                elif order.trade.currentUnits != 0:
+                    touched = bid_h[i] >= order.limit if order.units < 0 else ask_l[i] <= order.limit
+                    if touched:
+                        cash += close_units(i, order.trade, order.units, order.limit, "book_profit")
+            pending = []
+
+            # stops (and take profits, when enabled) hit during this bar; the stop is assumed first
+            for t in open_trades:
+                stop = float(t.stopLossOrder["price"])
+                take_profit = take_profits.get(t.id)
+                if t.currentUnits > 0 and bid_l[i] <= stop:
+                    cash += close_units(i, t, -t.currentUnits, min(bid_o[i], stop), "stop_loss")
+                elif t.currentUnits < 0 and ask_h[i] >= stop:
+                    cash += close_units(i, t, -t.currentUnits, max(ask_o[i], stop), "stop_loss")
+                elif take_profit is not None and t.currentUnits > 0 and bid_h[i] >= take_profit:
+                    cash += close_units(i, t, -t.currentUnits, max(bid_o[i], take_profit), "take_profit")
+                elif take_profit is not None and t.currentUnits < 0 and ask_l[i] <= take_profit:
+                    cash += close_units(i, t, -t.currentUnits, min(ask_o[i], take_profit), "take_profit")
+            open_trades = [t for t in open_trades if t.currentUnits != 0]
+
+            # mark to market at the close
+            price = mid_c[i]
+            current_units = 0.0
+            pl = 0.0
+            for t in open_trades:
+                t.unrealizedPL = t.currentUnits * (price - t.price) / ex_rate
+                current_units += t.currentUnits
+                pl += t.unrealizedPL
+            nav = cash + pl
+            equity[i] = nav
+
+            if i == n - 1 or np.isnan(leverage[i]) or np.isnan(atr[i]):
+                continue
+            if current_units == 0 and signal[i] == 0:
+                continue
+
+            base_qty = nav * weight * leverage[i] * ex_rate / price
+
+            if current_units == 0:
+                ideal_qty = get_ideal_qty(base_qty, bearish[i], bullish[i], signal[i])
+                if ideal_qty != 0:
+                    pending.append(new_order(i, ideal_qty, signal[i]))
+                continue
+
+            # Bot.update_stop_loss
+            new_fixed_sl = sl_long[i] if current_units > 0 else sl_short[i]
+            pl_multiple = np.abs(round(pl * ex_rate / (current_units * atr[i]), 2))
+            if pl > 0 and pl_multiple > 1:
+                for t in open_trades:
+                    current_sl_price, updated_sl = get_updated_sl(new_fixed_sl, t)
+                    if current_sl_price is None or updated_sl != current_sl_price:
+                        t.stopLossOrder = dict(price=str(new_fixed_sl))
+
+            # Bot.check_close_trades, which never books profit without a trigger
+            if trigger[i] != 0:
+                for t in open_trades:
+                    qty_to_close = self.strategy_manager.check_for_closing_trade(t, ex_rate, atr[i], trigger[i], no_op)
+                    if qty_to_close != 0:
+                        pending.append(_PendingOrder(units=qty_to_close, limit=price, trade=t))
+
+            # adding to the position
+            if signal[i] != 0 and np.sign(signal[i]) == np.sign(current_units):
+                ideal_qty = get_ideal_qty(base_qty, bearish[i], bullish[i], signal[i])
+                spare_qty = get_additional_qty(ideal_qty, current_units)
+                if spare_qty != 0:
+                    pending.append(new_order(i, spare_qty, signal[i]))
+
+        trades = pd.DataFrame(fills, columns=["time", "trade_id", "units", "price", "reason", "pl"])
+        equity_series = pd.Series(equity, index=frame["time"].rename(None).to_numpy(), name="equity")
+        equity_series.index.name = "time"
+        return BacktestResult(trades=trades, equity=equity_series, stats=get_backtest_stats(equity_series, trades))
+
+
+def get_backtest_stats(equity: pd.Series, trades: pd.DataFrame) -> Dict[str, float]:
+    """Headline numbers for a backtest run."""
+    if equity.empty:
+        return {}
+    drawdown = equity / equity.cummax() - 1
+    entries = trades[trades["reason"] == "entry"]
+    exits = trades[trades["reason"] != "entry"]
+    return {
+        "total_return": float(equity.iloc[-1] / equity.iloc[0] - 1),
+        "max_drawdown": float(drawdown.min()),
+        "trades": int(len(entries)),
+        "win_rate": float((exits["pl"] > 0).mean()) if len(exits) else 0.0,
+        "net_pl": float(exits["pl"].sum()),
+    }
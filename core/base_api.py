@@ -1,12 +1,17 @@
-from typing import Dict, Optional, Callable
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional, Callable
 
 import numpy as np
 import pandas as pd
 
 from api.OandaApi import OandaApi
 from config.constants import SMA_L_KEY, SMA_PERIOD_LONG, SMA_PERIOD_SHORT, SMA_S_KEY, ATR_KEY
+from core.account_state import AccountState
+from core.metrics import REGISTRY
 from core.pair_config import PairConfig
-from models.TradeSettings import TradeSettings
+from models.TradeSettings import TradeSettings, DEFAULT_INSTRUMENT_CACHE_TTL
 from models.instrument_data import InstrumentData
 from models.open_trade import OpenTrade
 from models.position_data import PositionData
@@ -14,6 +19,14 @@ from utils.atr import compute_atr
 from utils.get_leverage_ratio import get_leverage_ratio
 from utils.net_sma_trend import get_net_trend
 from utils.no_op import no_op
+from utils.resample import resample_candles
+
+INSTRUMENT_CACHE_DIR = "./data"
+# daily candles built locally are used once they span this many volatility lookbacks,
+# beyond which the weight left to older days is negligible
+LOCAL_DAILY_LOOKBACK_MULTIPLE = 4
+
+CACHE_REQUESTS = REGISTRY.counter("cache_requests_total", "Cache lookups by result", ["cache", "result"])
 
 
 class BaseAPI:
@@ -21,23 +34,40 @@ class BaseAPI:
                            'displayPrecision', 'tradeUnitsPrecision', 'marginRate',
                            'minimumTrailingStopDistance', 'maximumTrailingStopDistance']
 
-    def __init__(self, oanda_api: OandaApi):
+    def __init__(self, oanda_api: OandaApi, account_state: Optional[AccountState] = None):
         """
         Initialize the base API client.
+
+        When an ``account_state`` kept current by a transaction stream is given,
+        positions and trades are read from it instead of over REST while the
+        stream is up.
         """
         self.oanda_api = oanda_api
+        self.account_state = account_state
+
+    @property
+    def use_account_state(self) -> bool:
+        return self.account_state is not None and self.account_state.is_current
 
     """Base interface for trading platform API clients."""
 
-    def get_all_instruments(self) -> Dict[str, InstrumentData]:
+    def get_all_instruments(self, cache_path: Optional[str] = None,
+                            cache_ttl: float = DEFAULT_INSTRUMENT_CACHE_TTL) -> Dict[str, InstrumentData]:
         """
         Get all available trading instruments from Oanda.
 
         This method fetches the list of available instruments from Oanda API,
         processes the data to extract required fields, and creates InstrumentData objects.
+        With a ``cache_path`` the response is kept on disk and reused for ``cache_ttl`` seconds.
         """
         try:
-            instrument_list = self.oanda_api.get_account_instruments()
+            instrument_list = self._read_instrument_cache(cache_path, cache_ttl) if cache_path else None
+            if cache_path:
+                CACHE_REQUESTS.inc(cache="instruments", result="hit" if instrument_list is not None else "miss")
+            if instrument_list is None:
+                instrument_list = self.oanda_api.get_account_instruments()
+                if instrument_list and cache_path:
+                    self._write_instrument_cache(cache_path, instrument_list)
             if not instrument_list:
                 return {}
 
@@ -75,16 +105,52 @@ class BaseAPI:
             print(f"Error fetching instruments from API: {e}")
             return {}
 
+    @staticmethod
+    def _read_instrument_cache(cache_path: str, cache_ttl: float) -> Optional[List[Dict[str, Any]]]:
+        try:
+            if time.time() - os.path.getmtime(cache_path) > cache_ttl:
+                return None
+            with open(cache_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _write_instrument_cache(cache_path: str, instrument_list: List[Dict[str, Any]]) -> None:
+        os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(instrument_list, f)
+        os.replace(tmp_path, cache_path)
+
     def get_trades(self, pair) -> list[OpenTrade] | None:
-        trades = self.oanda_api.get_trades_for_instrument(pair)
+        if self.use_account_state:
+            trades = self.account_state.get_trades(pair)
+        else:
+            trades = self.oanda_api.get_trades_for_instrument(pair)
         if trades is not None and len(trades) > 0:
             return trades
         return None
 
-    def calculate_leverage_ratio(self, pair: str, instrument: InstrumentData, trade_settings: TradeSettings) -> float:
-        df_daily: pd.DataFrame = self.oanda_api.get_candles_df(
-            pair, completed_only=True, granularity="D", count=500
-        )
+    def calculate_leverage_ratio(self, pair: str, instrument: InstrumentData, trade_settings: TradeSettings,
+                                 candles: Optional[pd.DataFrame] = None,
+                                 granularity: Optional[str] = None) -> float:
+        """
+        Leverage ratio from the volatility of daily candles.
+
+        The daily candles are built from ``candles``, of ``granularity``, when
+        they span enough days for the volatility estimate; otherwise they are
+        fetched.
+        """
+        df_daily: Optional[pd.DataFrame] = None
+        if candles is not None and granularity is not None and granularity != "D":
+            df_daily = resample_candles(candles, "D", granularity, as_of=pd.Timestamp.now(tz="UTC"))
+            if len(df_daily) < LOCAL_DAILY_LOOKBACK_MULTIPLE * trade_settings.std_lookback:
+                df_daily = None
+        if df_daily is None:
+            df_daily = self.oanda_api.get_candles_df(
+                pair, completed_only=True, granularity="D", count=500
+            )
         return get_leverage_ratio(
             df_daily,
             "D",
@@ -98,6 +164,9 @@ class BaseAPI:
         Get position information for a specific instrument.
         """
         try:
+            if self.use_account_state:
+                return self.account_state.get_position(instrument)
+
             position = self.oanda_api.get_instrument_position(instrument)
             if position is None:
                 return None
@@ -114,11 +183,12 @@ class BaseAPI:
             return None
 
     def place_order(self, pair, use_limit, trade_qty: float, instrument, price, expiry, use_sl=False, stop_loss=None, take_profit=None, logger=no_op):
+        """Place a limit or market order; returns the order or fill transaction id, None when not placed."""
         if use_limit:
-            self.oanda_api.place_limit_order(pair, trade_qty, price, expiry, instrument,
+            return self.oanda_api.place_limit_order(pair, trade_qty, price, expiry, instrument,
                                        logger=logger, use_stop_loss=use_sl, fixed_sl=stop_loss, take_profit=take_profit)
         else:
-            self.oanda_api.place_trade(pair, trade_qty, instrument, logger=logger, use_stop_loss=use_sl,
+            return self.oanda_api.place_trade(pair, trade_qty, instrument, logger=logger, use_stop_loss=use_sl,
                                         fixed_sl=stop_loss, take_profit=take_profit)
 
 
@@ -1,3 +1,5 @@
+import logging
+import os
 import time
 from typing import Any, List, Optional, Dict, Tuple
 import concurrent.futures
@@ -7,19 +9,35 @@ import pandas as pd
 from typing_extensions import Callable
 
 from api.OandaApi import OandaApi
-from config.constants import ATR_KEY, SMA_PERIOD_LONG, SMA_PERIOD_SHORT
+from config.constants import ATR_KEY, SMA_PERIOD_LONG, SMA_PERIOD_SHORT, MAX_QTY_RATIO, GRANULARITY_SECONDS
 from core.StrategyManager import StrategyManager
-from core.base_api import BaseAPI
+from core.account_state import AccountState, TransactionStream
+from core.base_api import BaseAPI, INSTRUMENT_CACHE_DIR
 from core.candle_manager import CandleManager
-from core.log_wrapper import LogManager
+from core.latency_tracker import LatencyTracker, LatencyTrace, DETECTED, PREPARED, DECIDED
+from core.log_wrapper import LogManager, LogWrapper
+from core.memory_monitor import MemoryMonitor
+from core.metrics import REGISTRY, MetricsServer
+from core.order_dispatcher import OrderDispatcher
 from core.pair_config import PairConfig
+from core.settings_watcher import SettingsWatcher
+from core.risk_engine import RiskEngine, RiskSnapshot
+from core.sampling_profiler import SamplingProfiler
+from core.speculative import SpeculativePrecomputer
+from core.startup_timer import StartupTimer
+from core.strategy import StrategyDecision, StrategyState
+from core.tick_aggregator import PriceStream, TickAggregator
+from core.tracing import TRACER, Span, export_chrome_trace, in_context
+from indicators.batch_indicators import compute_batch_indicators
 from indicators.rsi import get_rsi
 from models.TradeSettings import TradeSettings
+from models.indicator_frame import IndicatorFrame
+from models.decision_record import DecisionRecord, REJECTED, OPENED, ADDED, MANAGED, ERROR
 from models.instrument_data import InstrumentData
 from models.open_trade import OpenTrade
 from models.position_data import PositionData
 from utils.get_expiry import get_expiry
-from utils.get_spread_threshold import get_spread_threshold
+from utils.get_spread_threshold import SpreadTracker, get_spread_threshold
 from utils.get_trade_ex_rate import get_trade_ex_rate
 from utils.heiken_ashi import ohlc_to_heiken_ashi
 from utils.net_sma_trend import get_net_trend
@@ -29,6 +47,15 @@ from utils.sma_bands import check_band_position
 from utils.stop_loss import get_current_stop_value, get_probable_stop_loss
 
 
+CYCLE_SECONDS = REGISTRY.histogram("bot_cycle_seconds", "Time to process the pairs with new candles")
+CYCLE_OVERRUNS = REGISTRY.counter("bot_cycle_overruns_total", "Cycles that took longer than cycle_budget")
+PAIRS_PROCESSED = REGISTRY.counter("bot_pairs_processed_total", "Pairs processed", ["granularity"])
+PAIR_ERRORS = REGISTRY.counter("bot_pair_errors_total", "Pairs whose processing raised")
+
+# every cycle logs a one line latency summary; the full table, also on the metrics endpoint, only this often
+LATENCY_REPORT_CYCLES = 100
+
+
 def get_additional_qty(ideal_qty: float, current_position: float) -> float:
     if np.sign(ideal_qty) != np.sign(current_position):
         return 0
@@ -39,6 +66,25 @@ def get_additional_qty(ideal_qty: float, current_position: float) -> float:
 
     return diff
 
+
+def get_ideal_qty(base_qty: float, bearish_strength: float, bullish_strength: float, trigger: int) -> float:
+    return base_qty * bullish_strength if trigger > 0 else -1 * base_qty * bearish_strength
+
+
+def get_capped_qty(base_qty: float, qty: float, max_qty_ratio: float = MAX_QTY_RATIO) -> float:
+    max_qty = base_qty * max_qty_ratio
+    return np.sign(qty) * min(abs(qty), max_qty)
+
+
+def get_updated_sl(new_fixed_sl: float, t: OpenTrade) -> Tuple[Optional[float], float]:
+    current_sl_price = get_current_stop_value(t)
+    if t.currentUnits > 0:
+        updated_sl = max(new_fixed_sl, current_sl_price)
+    else:
+        updated_sl = min(new_fixed_sl, current_sl_price)
+    return current_sl_price, updated_sl
+
+
 class Bot:
     def __init__(
             self,
@@ -46,8 +92,12 @@ class Bot:
             bot_name: str,
             api_client: OandaApi,
             strategy_manager: StrategyManager,
-            base_api: BaseAPI
+            base_api: BaseAPI,
+            log_queue: Optional[Any] = None,
+            settings_path: Optional[str] = None,
+            startup_timer: Optional[StartupTimer] = None
     ) -> None:
+        self.startup_timer: StartupTimer = startup_timer or StartupTimer()
         self.api_client = api_client
         self.base_api: BaseAPI = BaseAPI(self.api_client)
         self.trade_settings: TradeSettings = trade_settings
@@ -61,20 +111,116 @@ class Bot:
         }
         self.polling_period: int = trade_settings.polling_period
 
-        self.instruments: Dict[str, InstrumentData] = self.base_api.get_all_instruments()
-        print(self.instruments)
-
         # Setup logging
-        self.logger: LogManager = LogManager(bot_name, self.trading_pairs)
-
-        # Initialize candle manager with all required parameters
-        self.candle_manager: CandleManager = CandleManager(
-            pairs=self.trading_pairs,
-            api_client=self.api_client,
-            pair_settings={pair: config.get_raw_settings() for pair, config in self.pair_configs.items()},
-            logger=self.logger
-        )
-        self.setup()
+        self.logger: LogManager = LogManager(bot_name, self.trading_pairs,
+                                             queued=trade_settings.queued_logging,
+                                             console_echo=trade_settings.console_echo,
+                                             log_levels=trade_settings.log_levels,
+                                             forward_to=log_queue)
+
+        # orders and stop moves are sent concurrently instead of from inside the pair threads
+        self.order_dispatcher: OrderDispatcher = OrderDispatcher(self.base_api, self.logger,
+                                                                 max_workers=trade_settings.order_workers)
+
+        # time from bar close to each stage of process_pair, per granularity
+        self.latency_tracker: LatencyTracker = LatencyTracker()
+        # cycles processed, the full latency table goes to main.log every LATENCY_REPORT_CYCLES of them
+        self.cycles = 0
+
+        # positions and trades kept in memory from the transaction stream instead of fetched every cycle
+        self.account_state: Optional[AccountState] = None
+        self.transaction_stream: Optional[TransactionStream] = None
+
+        # the startup requests do not depend on each other, so they run concurrently
+        timer = self.startup_timer
+        instrument_cache = os.path.join(INSTRUMENT_CACHE_DIR, f"instruments_{api_client.account_id}.json")
+        with concurrent.futures.ThreadPoolExecutor(thread_name_prefix="startup") as startup:
+            instruments_future = startup.submit(timer.wrap("instruments", self.base_api.get_all_instruments),
+                                                instrument_cache, trade_settings.instrument_cache_ttl)
+            setup_futures = [startup.submit(timer.wrap("setup", self.setup))]
+            if trade_settings.use_transaction_stream:
+                setup_futures.append(startup.submit(timer.wrap("account_state", self.setup_account_state)))
+
+            # Initialize candle manager with all required parameters
+            with timer.stage("candle_timings"):
+                self.candle_manager: CandleManager = CandleManager(
+                    pairs=self.trading_pairs,
+                    api_client=self.api_client,
+                    pair_settings={pair: config.get_raw_settings() for pair, config in self.pair_configs.items()},
+                    logger=self.logger
+                )
+
+            self.instruments: Dict[str, InstrumentData] = instruments_future.result()
+            for future in setup_futures:
+                future.result()
+        self.logger.log_to_main(lambda: f"instruments: {self.instruments}", level=logging.DEBUG)
+
+        # NAV of the account state with every open trade marked at the start of the cycle, None when not marked
+        self.cycle_nav: Optional[float] = None
+
+        # exposure by currency over all positions, built once per cycle when risk_engine is on, see core.risk_engine
+        self.risk_engine: RiskEngine = RiskEngine(self.api_client, self.account_state,
+                                                  max_currency_exposure=trade_settings.max_currency_exposure)
+
+        # per cycle traces under logs/{bot}/{date}/traces, see core.tracing
+        TRACER.enabled = trade_settings.tracing
+
+        # switched on by SIGUSR1 or by creating logs/{bot}/profile.on, see core.sampling_profiler
+        bot_log_dir = os.path.join(LogWrapper.BASE_PATH, bot_name)
+        self.profiler: SamplingProfiler = SamplingProfiler(
+            os.path.join(bot_log_dir, self.logger.current_time, "profiles"),
+            control_file=os.path.join(bot_log_dir, "profile.on"),
+            interval=trade_settings.profiler_interval)
+
+        # RSS, open files and frame sizes logged periodically; tracemalloc while logs/{bot}/tracemalloc.on exists
+        self.memory_monitor: MemoryMonitor = MemoryMonitor(
+            self.logger, interval=trade_settings.memory_check_interval,
+            rss_alert_mb=trade_settings.rss_alert_mb, growth_alert_mb=trade_settings.rss_growth_alert_mb,
+            control_file=os.path.join(bot_log_dir, "tracemalloc.on"))
+
+        # candles built from the pricing stream, so a close is seen and its candles read without REST
+        self.tick_aggregator: Optional[TickAggregator] = None
+        self.price_stream: Optional[PriceStream] = None
+        if trade_settings.tick_candles:
+            self.tick_aggregator = TickAggregator(
+                self.api_client, {pair: [config.granularity] for pair, config in self.pair_configs.items()},
+                reconcile_interval=trade_settings.tick_reconcile_interval)
+            self.candle_manager.tick_aggregator = self.tick_aggregator
+            self.price_stream = PriceStream(self.api_client, self.tick_aggregator)
+            self.price_stream.start()
+
+        # indicators computed on the forming candle before it closes, only its final bar patched in at the close
+        self.speculative: SpeculativePrecomputer = SpeculativePrecomputer(
+            self.api_client, self.prepare_indicators, self.logger, lead=trade_settings.speculative_lead,
+            tick_aggregator=self.tick_aggregator)
+
+        # median spread per pair kept up to date bar by bar rather than recomputed over every frame
+        self.spread_tracker: SpreadTracker = SpreadTracker(by_hour=trade_settings.spread_by_hour)
+
+        # local only Prometheus endpoint, see core.metrics
+        self.metrics_server: Optional[MetricsServer] = None
+        if trade_settings.metrics_port is not None:
+            self.metrics_server = MetricsServer(port=trade_settings.metrics_port)
+            self.metrics_server.start()
+            self.logger.log_to_main(f"Metrics served on http://127.0.0.1:{self.metrics_server.port}/metrics")
+
+        # pairs added or removed in the settings file are picked up between cycles
+        self.settings_watcher: Optional[SettingsWatcher] = SettingsWatcher(settings_path) if settings_path else None
+        self.logger.log_to_main(timer.format_report())
+
+    def setup_account_state(self) -> None:
+        account_state = AccountState(self.api_client)
+        if not account_state.seed():
+            self.logger.log_to_error("Could not seed account state, reading positions over REST")
+            return
+
+        self.account_state = account_state
+        self.base_api.account_state = account_state
+        if isinstance(self.strategy_manager.base_api, BaseAPI):
+            self.strategy_manager.base_api.account_state = account_state
+        self.transaction_stream = TransactionStream(self.api_client, account_state)
+        self.transaction_stream.start()
+        self.logger.log_to_main(f"Account state seeded at transaction {account_state.last_transaction_id}")
 
     def setup(self) -> None:
         """Initialize bot components and load required data."""
@@ -85,8 +231,161 @@ class Bot:
             self.logger.log_to_error(f"Error during setup: {str(e)}")
             raise
 
-    def process_pair(self, pair: str) -> None:
-        """Process a single trading pair."""
+    def apply_settings(self, trade_settings: TradeSettings) -> None:
+        """
+        Switch to new settings without restarting.
+
+        Only the pairs added or removed are set up or torn down; changed pairs
+        get their new config, and their candle timing is re-initialized only
+        when the granularity changed. Unchanged pairs keep their state.
+        """
+        added, removed, changed = self.trade_settings.diff_pairs(trade_settings)
+        retimed = [p for p in changed
+                   if self.pair_configs[p].granularity != PairConfig(p, trade_settings.pair_settings[p]).granularity
+                   or self.pair_configs[p].settings.get("completed_only") !=
+                   trade_settings.pair_settings[p].get("completed_only")]
+
+        missing = [p for p in added if p not in self.instruments]
+        if missing:
+            self.instruments = self.base_api.get_all_instruments() or self.instruments
+        unknown = [p for p in added if p not in self.instruments]
+        if unknown:
+            self.logger.log_to_error(f"Settings reload: unknown instruments {unknown}, not added")
+            added = [p for p in added if p not in unknown]
+            # left out of the adopted settings, so the next reload that lists them adds them again
+            raw_settings = trade_settings.raw_settings
+            trade_settings = TradeSettings({**raw_settings, "pairs": {p: s for p, s in raw_settings["pairs"].items()
+                                                                      if p not in unknown}})
+
+        self.candle_manager.remove_pairs(removed)
+        self.logger.remove_logs(removed)
+        for pair in removed:
+            self.pair_configs.pop(pair)
+            self.trading_pairs.remove(pair)
+            self.memory_monitor.forget(pair)
+            self.speculative.discard(pair)
+            self.spread_tracker.forget(pair)
+
+        for pair in added + changed:
+            self.pair_configs[pair] = PairConfig(pair, trade_settings.pair_settings[pair])
+        if self.tick_aggregator is not None:
+            self.tick_aggregator.remove_pairs(removed)
+            self.tick_aggregator.add_pairs({p: [self.pair_configs[p].granularity] for p in added + retimed})
+        for pair in changed:
+            self.speculative.discard(pair)
+            self.spread_tracker.forget(pair)
+        for pair in added:
+            self.trading_pairs.append(pair)
+        self.logger.add_logs(added)
+        self.candle_manager.add_pairs({p: trade_settings.pair_settings[p] for p in added + retimed})
+
+        restart_only = self.trade_settings.restart_only_changes(trade_settings)
+        self.trade_settings = trade_settings
+        self.strategy_manager.trade_settings = trade_settings
+        self.polling_period = trade_settings.polling_period
+        TRACER.enabled = trade_settings.tracing
+        self.speculative.lead = trade_settings.speculative_lead
+        self.risk_engine.max_currency_exposure = trade_settings.max_currency_exposure
+        self.spread_tracker.by_hour = trade_settings.spread_by_hour
+        if self.tick_aggregator is not None:
+            self.tick_aggregator.reconcile_interval = trade_settings.tick_reconcile_interval
+        self.logger.set_log_levels(trade_settings.log_levels)
+
+        self.logger.log_to_main(f"Settings reloaded: added {added}, removed {removed}, changed {changed}")
+        if restart_only:
+            self.logger.log_to_main(f"Settings reload: {restart_only} only take effect after a restart")
+
+    def check_settings(self) -> None:
+        if self.settings_watcher is None:
+            return
+        try:
+            trade_settings = self.settings_watcher.poll()
+        except Exception as e:
+            self.logger.log_to_error(f"Settings reload failed, keeping current settings: {str(e)}")
+            return
+        if trade_settings is None:
+            return
+        try:
+            self.apply_settings(trade_settings)
+        except Exception as e:
+            self.logger.log_to_error(f"Settings reload failed to apply: {str(e)}")
+
+    def prepare_indicators(self, candles: pd.DataFrame, pair_config: PairConfig,
+                           pair_logger: Callable[[str], None]) -> IndicatorFrame:
+        """Compute the indicator columns, RSI and Heiken-Ashi frame for one pair."""
+        rsi = get_rsi(candles["mid_c"], 14)
+
+        # Calculate indicators
+        candles = self.base_api.calculate_indicators(candles, pair_config, pair_logger)
+
+        candles["sma_200"] = candles["mid_c"].rolling(window=200).mean()
+        candles["sma_100"] = candles["mid_c"].rolling(window=100).mean()
+        candles["sma_50"] = candles["mid_c"].rolling(window=50).mean()
+        candles["sma_30"] = candles["mid_c"].rolling(window=30).mean()
+        candles["sma_10"] = candles["mid_c"].rolling(window=10).mean()
+
+        candles["net_trend_200"] = get_net_trend(candles["mid_c"], 200)
+        candles["net_trend_100"] = get_net_trend(candles["mid_c"], 100)
+        candles["net_trend_50"] = get_net_trend(candles["mid_c"], 50)
+        candles["net_trend_30"] = get_net_trend(candles["mid_c"], 30)
+
+        candles[['bearish_strength', 'bullish_strength']] = candles.apply(_compute_strength, axis=1)
+        # (Optional) inspect the result
+        candles['bearish_strength_s'] = candles['bearish_strength'].ewm(span=10, adjust=False).mean()
+        candles['bullish_strength_s'] = candles['bullish_strength'].ewm(span=10, adjust=False).mean()
+        candles['net_strength'] = candles['bullish_strength'] - candles['bearish_strength']
+        candles['net_strength_s'] = candles['bullish_strength_s'] - candles['bearish_strength_s']
+
+        heikin_ashi: pd.DataFrame = ohlc_to_heiken_ashi(candles.iloc[-100:].copy())
+        return IndicatorFrame(candles=candles, rsi=rsi, heikin_ashi=heikin_ashi)
+
+    def get_candles(self, pair: str, pair_config: PairConfig) -> Optional[pd.DataFrame]:
+        """The pair's last 5000 complete candles, built from ticks while the pricing stream is live, else over REST."""
+        if self.tick_aggregator is not None:
+            candles = self.tick_aggregator.get_live_candles(pair, pair_config.granularity, count=5000)
+            if candles is not None:
+                return candles
+        return self.api_client.get_candles_df(
+            pair,
+            completed_only=True,
+            granularity=pair_config.granularity,
+            count=5000
+        )
+
+    def prepare_batch(self, pairs: List[str]) -> Dict[str, IndicatorFrame]:
+        """
+        Fetch candles for all pairs concurrently and compute their indicators
+        in one batch per granularity.
+        """
+        def fetch(pair: str) -> Tuple[str, Optional[pd.DataFrame]]:
+            return pair, self.get_candles(pair, self.pair_configs[pair])
+
+        with concurrent.futures.ThreadPoolExecutor() as executor:
+            frames: Dict[str, Optional[pd.DataFrame]] = dict(executor.map(in_context(fetch), pairs))
+
+        granularities = {pair: self.pair_configs[pair].granularity for pair in pairs}
+        return compute_batch_indicators(frames, granularities)
+
+    def process_pair(self, pair: str, prepared: Optional[IndicatorFrame] = None) -> None:
+        """
+        Process a single trading pair.
+
+        Args:
+            pair: Pair to process
+            prepared: Candles with indicators already computed (batch mode); fetched
+                and computed here when not given
+        """
+        decision: Optional[DecisionRecord] = None
+        # diagnostics only, run after the orders are handed over in fast path mode
+        deferred: List[Callable[[], None]] = []
+        fast_path: bool = self.trade_settings.fast_path
+
+        def run_or_defer(fn: Callable[[], None]) -> None:
+            if fast_path:
+                deferred.append(fn)
+            else:
+                fn()
+
         try:
             # Get pair config
             pair_config: PairConfig = self.pair_configs[pair]
@@ -96,84 +395,101 @@ class Bot:
             rejected_logger: Callable[[str], None] = self.logger.log_rejected_builder(pair, pair_config.granularity)
             instrument = self.instruments[pair]
 
-            # Get account value and exposure metrics
-            account_info: Dict[str, Any] = self.api_client.get_account_summary()
-            nav: float = float(account_info["NAV"])
+            # account value, position and exchange rate, from the cycle's risk snapshot when there is one
+            snapshot: Optional[RiskSnapshot] = self.risk_engine.snapshot
+            if self.base_api.use_account_state and self.cycle_nav is not None:
+                nav: float = self.cycle_nav
+            elif snapshot is not None:
+                nav: float = snapshot.nav
+            else:
+                account_info: Dict[str, Any] = self.api_client.get_account_summary()
+                nav: float = float(account_info["NAV"])
 
             # Get current position
-            position_data: Optional[PositionData] = self.base_api.get_position(pair)
+            if snapshot is not None and not self.base_api.use_account_state:
+                position_data: Optional[PositionData] = snapshot.get_position(pair)
+            else:
+                position_data: Optional[PositionData] = self.base_api.get_position(pair)
             current_units = position_data.units if position_data else 0
             pl = position_data.unrealized_pl if position_data else 0
-            ex_rate: float = get_trade_ex_rate(pair, self.api_client)
+            ex_rate: Optional[float] = snapshot.ex_rate(pair) if snapshot is not None else None
+            if ex_rate is None:
+                ex_rate = get_trade_ex_rate(pair, self.api_client)
 
-            # Get latest candles
-            candles: Optional[pd.DataFrame] = self.api_client.get_candles_df(
-                pair,
-                completed_only=True,
-                granularity=pair_config.granularity,
-                count=5000
-            )
+            timing = self.candle_manager.get_timing(pair)
+            if prepared is None and timing is not None and timing.completed_only:
+                prepared = self.speculative.patch(pair, pair_config, timing.last_time, pair_logger)
 
-            if candles is None or candles.empty:
-                self.logger.log_to_error(f"No candles found for {pair}")
-                return
+            if prepared is None:
+                # Get latest candles
+                candles: Optional[pd.DataFrame] = self.get_candles(pair, pair_config)
 
-            last_candle = candles.iloc[-1]
-            pair_logger(
-                f"********* {pair_config.granularity} {last_candle["time"]}*********")
+                if candles is None or candles.empty:
+                    self.logger.log_to_error(f"No candles found for {pair}")
+                    return
 
-            rsi = get_rsi(candles["mid_c"], 14)
-            pair_logger(f"rsi: {rsi:.2f}")
+                prepared = self.prepare_indicators(candles, pair_config, pair_logger)
 
-            # Calculate indicators
-            candles = self.base_api.calculate_indicators(candles, pair_config, pair_logger)
+            candles = prepared.candles
+            self.memory_monitor.record_frame(pair, candles)
+            rsi = prepared.rsi
+            heikin_ashi: pd.DataFrame = prepared.heikin_ashi
 
-            candles["sma_200"] = candles["mid_c"].rolling(window=200).mean()
-            candles["sma_100"] = candles["mid_c"].rolling(window=100).mean()
-            candles["sma_50"] = candles["mid_c"].rolling(window=50).mean()
-            candles["sma_30"] = candles["mid_c"].rolling(window=30).mean()
-            candles["sma_10"] = candles["mid_c"].rolling(window=10).mean()
-
-            candles["net_trend_200"] = get_net_trend(candles["mid_c"], 200)
-            candles["net_trend_100"] = get_net_trend(candles["mid_c"], 100)
-            candles["net_trend_50"] = get_net_trend(candles["mid_c"], 50)
-            candles["net_trend_30"] = get_net_trend(candles["mid_c"], 30)
-            net_trend_30: int = candles["net_trend_30"].iloc[-1]
+            last_candle = candles.iloc[-1]
+            trace: LatencyTrace = self.latency_tracker.trace(
+                pair_config.granularity,
+                last_candle['time'].timestamp() + GRANULARITY_SECONDS.get(pair_config.granularity, 0))
+            if timing is not None and timing.detected_at is not None:
+                trace.mark(DETECTED, at=timing.detected_at)
+            trace.mark(PREPARED)
 
-            candles[['bearish_strength', 'bullish_strength']] = candles.apply(_compute_strength, axis=1)
-            # (Optional) inspect the result
-            candles['bearish_strength_s'] = candles['bearish_strength'].ewm(span=10, adjust=False).mean()
-            candles['bullish_strength_s'] = candles['bullish_strength'].ewm(span=10, adjust=False).mean()
-            candles['net_strength'] = candles['bullish_strength'] - candles['bearish_strength']
-            candles['net_strength_s'] = candles['bullish_strength_s'] - candles['bearish_strength_s']
+            pair_logger(
+                f"********* {pair_config.granularity} {last_candle['time']}*********")
+            pair_logger("rsi: %.2f", rsi)
 
+            net_trend_30: int = candles["net_trend_30"].iloc[-1]
             bullish_strength = candles['bullish_strength'].iloc[-1]
             bearish_strength = candles['bearish_strength'].iloc[-1]
             net_strength = bullish_strength - bearish_strength
 
-            pair_logger(f"bearish_strength: {np.array(round(candles['bearish_strength'].tail(10), 2))}")
-            pair_logger(f"bullish_strength: {np.array(round(candles['bullish_strength'].tail(10), 2))}")
-            pair_logger(f"bearish_strength smoothed: {np.array(round(candles['bearish_strength_s'].tail(10), 2))}")
-            pair_logger(f"bullish_strength smoothed: {np.array(round(candles['bullish_strength_s'].tail(10), 2))}")
-            pair_logger(f"net_strength: {np.array(round(candles['net_strength'].tail(10), 2))}")
-            pair_logger(f"net_strength smoothed: {np.array(round(candles['net_strength_s'].tail(10), 2))}")
+            def log_strength_history() -> None:
+                pair_logger(lambda: f"bearish_strength: {np.array(round(candles['bearish_strength'].tail(10), 2))}", level=logging.DEBUG)
+                pair_logger(lambda: f"bullish_strength: {np.array(round(candles['bullish_strength'].tail(10), 2))}", level=logging.DEBUG)
+                pair_logger(lambda: f"bearish_strength smoothed: {np.array(round(candles['bearish_strength_s'].tail(10), 2))}", level=logging.DEBUG)
+                pair_logger(lambda: f"bullish_strength smoothed: {np.array(round(candles['bullish_strength_s'].tail(10), 2))}", level=logging.DEBUG)
+                pair_logger(lambda: f"net_strength: {np.array(round(candles['net_strength'].tail(10), 2))}", level=logging.DEBUG)
+                pair_logger(lambda: f"net_strength smoothed: {np.array(round(candles['net_strength_s'].tail(10), 2))}", level=logging.DEBUG)
+
+            run_or_defer(log_strength_history)
+
+            if self.base_api.use_account_state:
+                # transactions carry no prices: mark the open trades to the last close
+                pl = self.account_state.mark(pair, last_candle["mid_c"], ex_rate)
 
             atr = candles.iloc[-1][ATR_KEY]
             pl_multiple = np.abs(round(pl * ex_rate / (current_units * atr), 2)) if current_units != 0 else 0
-            pair_logger(f"units: {current_units:.2f}, pl: {pl:.2f}, pl_multiple: {pl_multiple:.2f}")
+            pair_logger("units: %.2f, pl: %.2f, pl_multiple: %.2f", current_units, pl, pl_multiple)
 
             # Get current price
             current_price: float = candles.iloc[-1]["mid_c"]
 
             # get upper and lower price bands
-            band_position_200 = check_band_position(candles, current_price, sma_period=SMA_PERIOD_LONG, logger=pair_logger)
-            band_position_50 = check_band_position(candles, current_price, sma_period=SMA_PERIOD_SHORT, logger=pair_logger)
-            pair_logger(f"price within band for periods - 200: {band_position_200:.2f}, 50: {band_position_50:.2f}")
+            band_positions: Dict[int, float] = {}
+
+            def log_band_positions(close_price: float = current_price) -> None:
+                for sma_period in (SMA_PERIOD_LONG, SMA_PERIOD_SHORT):
+                    band_positions[sma_period] = check_band_position(candles, close_price, sma_period=sma_period,
+                                                                     logger=pair_logger)
+                pair_logger("price within band for periods - 200: %.2f, 50: %.2f",
+                            band_positions[SMA_PERIOD_LONG], band_positions[SMA_PERIOD_SHORT])
+
+            run_or_defer(log_band_positions)
             # Calculate position size based on NAV and pair weight
             exposure_at_no_leverage: float = nav * pair_config.weight
 
             # Calculate exposure metrics
-            leverage_ratio: float = self.base_api.calculate_leverage_ratio(pair, instrument, self.trade_settings)
+            leverage_ratio: float = self.base_api.calculate_leverage_ratio(pair, instrument, self.trade_settings,
+                                                                           candles, pair_config.granularity)
             max_gbp_exposure: float = leverage_ratio * exposure_at_no_leverage
 
             max_currency_exposure: float = max_gbp_exposure * ex_rate
@@ -188,7 +504,7 @@ class Bot:
 
             # get spread
             current_spread, spread_threshold, current_price = get_spread_threshold(pair, candles, self.api_client,
-                                                                                   pair_logger)
+                                                                                   pair_logger, self.spread_tracker)
             is_acceptable_spread = current_spread <= spread_threshold
             use_limit_order = not is_acceptable_spread
 
@@ -197,83 +513,116 @@ class Bot:
 
             # qty_at_net_strength = base_qty * net_strength
             pair_logger(f"net_strength: {round(net_strength, 2)}")
-            heikin_ashi: pd.DataFrame = ohlc_to_heiken_ashi(candles.iloc[-100:].copy())
 
-            trigger = self.strategy_manager.check_for_trigger(heikin_ashi, pair_logger)
+            strategy_state = StrategyState(pair_config, instrument.pipLocationPrecision, current_units)
+            strategy_decision: StrategyDecision = self.strategy_manager.decide(prepared, strategy_state, pair_logger)
+            trigger = strategy_decision.trigger
+            decision = DecisionRecord(
+                time=time.time(), pair=pair, granularity=pair_config.granularity,
+                bar_time=last_candle['time'].timestamp(), trigger=int(trigger),
+                bullish_strength=bullish_strength, bearish_strength=bearish_strength, net_strength=net_strength,
+                rsi=rsi, net_trend_30=net_trend_30, leverage_ratio=leverage_ratio, current_units=current_units, pl=pl)
 
             # look for new positions
             if current_units == 0 and trigger != 0:
                 pair_logger(f"checking for trade - trigger: {trigger}")
-                should_trade, sl_price, take_profit = self.strategy_manager.check_and_get_trade_qty(candles=candles, trigger=trigger, instrument=instrument,
-                                                                               pair_logger=pair_logger, rejected_logger=rejected_logger,
-                                                                               pair_config=pair_config, heikin_ashi=heikin_ashi,
-                                                                            sma_trend_30=net_trend_30, rsi=rsi)
+                should_trade, sl_price, take_profit = self.check_entry(strategy_decision, rejected_logger)
                 pair_logger(f"should_trade: {should_trade}, sl_price: {sl_price}, take_profit: {take_profit}")
+                decision.outcome = REJECTED
                 if should_trade:
                     ideal_qty: float = self.get_ideal_qty(base_qty, bearish_strength, bullish_strength, trigger)
                     if ideal_qty!= 0:
-                        qty = self.get_trade_qty(base_qty, ideal_qty, pair_logger)
-                        trade_logger(f"Placed trade: qty: {round(qty, 2)}, ideal_qty: {round(ideal_qty, 2)}, bullish_strength: {round(bullish_strength, 2)}, bearish_strength: {round(bearish_strength, 2)}, net_trend_30: {net_trend_30}, rsi: {rsi:.2f}")
-                        self.base_api.place_order(pair, use_limit_order, qty, instrument, current_price,
-                                                  get_expiry(pair_config.granularity), use_sl=True,
-                                                  stop_loss=sl_price, take_profit=None, logger=self.logger.log_message)
+                        qty = self.get_trade_qty(base_qty, ideal_qty, pair_logger, pair)
+                        if qty == 0:
+                            rejected_logger(f"no currency exposure headroom, not placing trade. ideal_qty: {round(ideal_qty, 2)}, trigger: {trigger}")
+                        else:
+                            decision.qty, decision.outcome = qty, OPENED
+                            trade_logger(f"Placed trade: qty: {round(qty, 2)}, ideal_qty: {round(ideal_qty, 2)}, bullish_strength: {round(bullish_strength, 2)}, bearish_strength: {round(bearish_strength, 2)}, net_trend_30: {net_trend_30}, rsi: {rsi:.2f}")
+                            self.order_dispatcher.place_order(pair, use_limit_order, qty, instrument, current_price,
+                                                              get_expiry(pair_config.granularity), use_sl=True,
+                                                              stop_loss=sl_price, take_profit=None, trace=trace)
                     else:
                         rejected_logger(f"ideal_qty is 0, not placing trade. ideal_qty: {round(ideal_qty, 2)}, bearish_strength: {bearish_strength}, bullish_strength: {bullish_strength}, trigger: {trigger}")
             elif current_units != 0:
+                decision.outcome = MANAGED
                 trades: List[OpenTrade] = self.base_api.get_trades(pair)
                 self.update_stop_loss(trades, current_units, candles, instrument, pair_logger, heikin_ashi, trade_logger, rejected_logger, pl, pl_multiple)
 
                 # check for closing position
                 self.check_close_trades(pair, candles, pair_config, instrument,
-                                        ex_rate, pair_logger, current_price, trigger, trade_logger, trades)
+                                        ex_rate, pair_logger, current_price, trigger, trade_logger, trades, trace)
 
                 # check for adding to position
                 if trigger != 0 and np.sign(trigger) == np.sign(current_units):
-                    should_trade, sl_price, take_profit = self.strategy_manager.check_and_get_trade_qty(candles=candles,
-                                                                                               trigger=trigger,
-                                                                                               instrument=instrument,
-                                                                                               pair_logger=pair_logger,
-                                                                                               rejected_logger=rejected_logger,
-                                                                                               pair_config=pair_config, heikin_ashi=heikin_ashi, sma_trend_30=net_trend_30, rsi=rsi)
+                    should_trade, sl_price, take_profit = self.check_entry(strategy_decision, rejected_logger)
                     if should_trade:
                         ideal_qty = self.get_ideal_qty(base_qty, bearish_strength, bullish_strength, trigger)
                         spare_qty: float = get_additional_qty(ideal_qty, current_units)
                         pair_logger(f"ideal_qty: {round(ideal_qty, 2)}, spare_qty: {round(spare_qty, 2)}, current_units: {round(current_units, 2)}")
-                        if spare_qty != 0:
-                            additional_qty = self.get_trade_qty(base_qty, spare_qty, pair_logger)
+                        additional_qty = self.get_trade_qty(base_qty, spare_qty, pair_logger, pair) if spare_qty != 0 else 0
+                        if additional_qty != 0:
+                            decision.qty, decision.outcome = additional_qty, ADDED
                             pair_logger(
                                 f"additional_qty: {round(additional_qty, 2)}, ideal_qty: {round(ideal_qty, 2)}, spare_qty: {round(spare_qty, 2)}")
 
                             trade_logger(f"Placed additional trade: qty: {round(additional_qty, 2)}, bullish_strength: {round(bullish_strength, 2)}, bearish_strength: {round(bearish_strength, 2)}, net_trend_30: {net_trend_30}, rsi: {rsi:.2f}")
-                            self.base_api.place_order(pair, use_limit_order, additional_qty, instrument, current_price,
-                                                      get_expiry(pair_config.granularity), use_sl=True,
-                                                      stop_loss=sl_price, take_profit=None,
-                                                      logger=self.logger.log_message)
+                            self.order_dispatcher.place_order(pair, use_limit_order, additional_qty, instrument,
+                                                              current_price, get_expiry(pair_config.granularity),
+                                                              use_sl=True, stop_loss=sl_price, take_profit=None,
+                                                              trace=trace)
                         else:
-                            rejected_logger(f"spare_qty is 0, not placing additional trade. ideal_qty: {round(ideal_qty, 2)}, spare_qty: {round(spare_qty, 2)}, current_units: {round(current_units, 2)}, trigger: {trigger}")
+                            rejected_logger(f"spare_qty or its currency exposure headroom is 0, not placing additional trade. ideal_qty: {round(ideal_qty, 2)}, spare_qty: {round(spare_qty, 2)}, current_units: {round(current_units, 2)}, trigger: {trigger}")
             else:
                 pair_logger(f"No check for trade. current_units: {round(current_units, 2)}, trigger: {trigger}")
 
+            trace.mark(DECIDED)
+            for fn in deferred:
+                fn()
+
+            decision.band_position_200 = band_positions.get(SMA_PERIOD_LONG)
+            decision.band_position_50 = band_positions.get(SMA_PERIOD_SHORT)
+            self.logger.log_decision(decision)
+
         except Exception as e:
             self.logger.log_to_error(f"Error processing {pair}: {str(e)}")
+            if decision is not None:
+                decision.outcome = ERROR
+                self.logger.log_decision(decision)
             print(e)
             raise
 
-    def get_trade_qty(self, base_qty, spare_qty, pair_logger):
-        max_qty = base_qty * 0.5
-        pair_logger(f"max_qty: {round(max_qty, 2)}, spare_qty: {round(spare_qty, 2)}")
-        additional_qty = np.sign(spare_qty) * min(abs(spare_qty), max_qty)
-        return additional_qty
+    def get_trade_qty(self, base_qty, spare_qty, pair_logger, pair: Optional[str] = None):
+        max_qty_ratio = self.strategy_manager.params.max_qty_ratio
+        pair_logger(f"max_qty: {round(base_qty * max_qty_ratio, 2)}, spare_qty: {round(spare_qty, 2)}")
+        qty = get_capped_qty(base_qty, spare_qty, max_qty_ratio)
+        if pair is not None:
+            # takes the headroom for this order, so pairs processed concurrently see it
+            allowed = self.risk_engine.take(pair, qty)
+            if allowed != qty:
+                pair_logger(f"currency exposure limit caps qty {round(qty, 2)} -> {round(allowed, 2)}")
+            qty = allowed
+        return qty
+
+    @staticmethod
+    def check_entry(decision: StrategyDecision,
+                    rejected_logger: Callable[[str], None]) -> Tuple[bool, Optional[float], Optional[float]]:
+        """Whether the strategy's trigger survived its entry filters, with its stop and take profit."""
+        if decision.signal == 0:
+            rejected_logger(decision.reason)
+            return False, None, None
+        return True, decision.sl_price, decision.take_profit
 
     def get_ideal_qty(self, base_qty, bearish_strength, bullish_strength, trigger) -> float:
-        qty = base_qty * bullish_strength if trigger > 0 else -1 * base_qty * bearish_strength
-        return qty
+        return get_ideal_qty(base_qty, bearish_strength, bullish_strength, trigger)
 
     def update_stop_loss(self, trades: List[OpenTrade], current_units, candles, instrument, pair_logger, heikin_ashi,
                          trade_logger, rejected_logger, pl, pl_multiple) -> None:
         trade_direction = np.sign(current_units)
+        params = self.strategy_manager.params
         new_fixed_sl, take_profit, sl_gap = get_probable_stop_loss(trade_direction, candles,
-                                                               instrument.pipLocationPrecision, pair_logger, heikin_ashi)
+                                                               instrument.pipLocationPrecision, pair_logger, heikin_ashi,
+                                                               sl_period=params.initial_sl_period,
+                                                               tp_multiple=params.tp_multiple)
         for t in trades:
             # atr = candles.iloc[-1][ATR_KEY]
             # pl = t.unrealizedPL
@@ -285,28 +634,23 @@ class Bot:
                 if pl > 0 and pl_multiple > 1:
                     pair_logger(
                         f"updating stop_loss {current_sl_price} -> {float(updated_sl)}, pl: {pl:.2f}, pl_multiple: {pl_multiple:.2f}")
-                    self.api_client.update_fixed_stop_loss(t.id, new_fixed_sl, True)
+                    self.order_dispatcher.update_stop_loss(t.instrument, t.id, new_fixed_sl)
                 else:
-                    pair_logger(f"not updating stop_loss, pl: {pl:.2f}, pl_multiple: {pl_multiple:.2f}, qty: {t.currentUnits:.2f}")
+                    pair_logger("not updating stop_loss, pl: %.2f, pl_multiple: %.2f, qty: %.2f", pl, pl_multiple, t.currentUnits)
 
     def get_updated_sl(self, new_fixed_sl, t):
-        current_sl_price = get_current_stop_value(t)
-        if t.currentUnits > 0:
-            updated_sl = max(new_fixed_sl, current_sl_price)
-        else:
-            updated_sl = min(new_fixed_sl, current_sl_price)
-        return current_sl_price, updated_sl
+        return get_updated_sl(new_fixed_sl, t)
 
     def check_close_trades(self, pair, candles, pair_config: PairConfig, instrument: InstrumentData,
-                           ex_rate: float, pair_logger, current_price: float, trigger: int, trade_logger, trades: List[OpenTrade]):
+                           ex_rate: float, pair_logger, current_price: float, trigger: int, trade_logger, trades: List[OpenTrade],
+                           trace: Optional[LatencyTrace] = None):
         atr = candles.iloc[-1][ATR_KEY]
         for t in trades:
             qty_to_close = self.strategy_manager.check_for_closing_trade(t, ex_rate, atr, trigger, pair_logger)
 
             if qty_to_close != 0:
-                self.base_api.place_order(pair, True, qty_to_close, instrument, current_price,
-                                          get_expiry(pair_config.granularity), use_sl=False,
-                                          logger=self.logger.log_message)
+                self.order_dispatcher.place_order(pair, True, qty_to_close, instrument, current_price,
+                                                  get_expiry(pair_config.granularity), use_sl=False, trace=trace)
                 trade_logger(f"book profit - trigger: {trigger}, qty_to_trade: {qty_to_close}")
 
     def process_pairs(self, pairs: List[str]) -> None:
@@ -314,18 +658,115 @@ class Bot:
         # for p in pairs:
         #     self.logger.log_to_main(f"Processing pair: {p}")
         #     self.process_pair(pair=p)
-
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            futures: List[concurrent.futures.Future] = [executor.submit(self.process_pair, pair) for pair in pairs]
-            for future in concurrent.futures.as_completed(futures):
+        started = time.perf_counter()
+
+        with TRACER.trace("cycle", pairs=",".join(pairs)) as root:
+            self.profiler.set_cycle(time.strftime("%H%M%S") + (f"-{root.trace_id}" if root is not None else ""))
+            self.mark_open_trades()
+            self.refresh_risk()
+            prepared: Dict[str, IndicatorFrame] = {}
+            if self.trade_settings.batch_indicators:
                 try:
-                    future.result()
+                    # pairs with a frame computed before the close only have their last bar patched in
+                    batch_pairs = [p for p in pairs if not self.speculative.has(p)]
+                    with TRACER.span("prepare_batch"):
+                        prepared = self.prepare_batch(batch_pairs) if batch_pairs else {}
                 except Exception as e:
-                    self.logger.log_to_error(f"Error in parallel processing: {str(e)}")
+                    self.logger.log_to_error(f"Error in batch indicators, falling back to per-pair: {str(e)}")
+
+            def run_pair(pair: str) -> None:
+                with TRACER.span(f"process_pair {pair}", pair=pair):
+                    self.process_pair(pair, prepared.get(pair))
+
+            with concurrent.futures.ThreadPoolExecutor() as executor:
+                futures: List[concurrent.futures.Future] = [
+                    executor.submit(in_context(run_pair), pair) for pair in pairs
+                ]
+                for future in concurrent.futures.as_completed(futures):
+                    try:
+                        future.result()
+                    except Exception as e:
+                        PAIR_ERRORS.inc()
+                        self.logger.log_to_error(f"Error in parallel processing: {str(e)}")
+
+            with TRACER.span("wait_orders"):
+                self.order_dispatcher.wait()
+            self.profiler.set_cycle(None)
+
+        elapsed = time.perf_counter() - started
+        CYCLE_SECONDS.observe(elapsed)
+        if elapsed > self.trade_settings.cycle_budget:
+            CYCLE_OVERRUNS.inc()
+            self.logger.log_to_main("Cycle took %.2fs, over the %ss budget", elapsed, self.trade_settings.cycle_budget)
+        for pair in pairs:
+            PAIRS_PROCESSED.inc(granularity=self.pair_configs[pair].granularity)
+        if root is not None:
+            self.export_trace(root)
+        self.cycles += 1
+        self.logger.log_to_main(self.latency_tracker.format_summary)
+        if self.cycles % LATENCY_REPORT_CYCLES == 0:
+            self.logger.log_to_main(self.latency_tracker.format_report)
+
+    def mark_open_trades(self) -> None:
+        """
+        Mark all open trades of the account state at current prices, so the NAV
+        orders are sized from does not hold P/L from each pair's last close;
+        without it the pairs read the NAV from the broker.
+        """
+        self.cycle_nav = None
+        if not self.base_api.use_account_state:
+            return
+        try:
+            with TRACER.span("mark_trades"):
+                self.cycle_nav = self.account_state.mark_all()
+            if self.cycle_nav is None:
+                self.logger.log_to_error("Could not mark open trades, pairs read the NAV from the account summary")
+        except Exception as e:
+            self.logger.log_to_error(f"Error marking open trades: {str(e)}")
+
+    def refresh_risk(self) -> None:
+        """Build the cycle's exposure snapshot over all pairs; without it the pairs fetch their own data."""
+        self.risk_engine.snapshot = None
+        if not self.trade_settings.risk_engine:
+            return
+        try:
+            with TRACER.span("risk_snapshot"):
+                snapshot = self.risk_engine.refresh(self.trading_pairs, nav=self.cycle_nav)
+            if snapshot is None:
+                self.logger.log_to_error("Could not build the risk snapshot, pairs fetch their own account data")
+            else:
+                self.logger.log_to_main(lambda: f"currency exposure: {snapshot.net_exposure()}", level=logging.DEBUG)
+        except Exception as e:
+            self.logger.log_to_error(f"Error building the risk snapshot: {str(e)}")
+
+    def export_trace(self, root: Span) -> None:
+        """Write the spans of a cycle as a Chrome trace next to the day's logs."""
+        path = os.path.join(LogWrapper.BASE_PATH, self.bot_name, self.logger.current_time, "traces",
+                            f"{time.strftime('%H%M%S')}_{root.trace_id}.json")
+        try:
+            export_chrome_trace(TRACER.pop(root.trace_id), path)
+            self.logger.log_to_main(f"Cycle {root.trace_id} trace written to {path}")
+        except Exception as e:
+            self.logger.log_to_error(f"Error writing trace {root.trace_id}: {str(e)}")
+
+    def check_profiler(self) -> None:
+        was_running = self.profiler.running
+        path = self.profiler.poll()
+        if self.profiler.running and not was_running:
+            self.logger.log_to_main("Sampling profiler started")
+        elif path is not None:
+            self.logger.log_to_main(f"Sampling profiler stopped after {self.profiler.sample_count} samples, "
+                                    f"written to {path}; top: {self.profiler.top(5)}")
 
     def run(self) -> None:
         """Run the main bot loop."""
 
+        # a replayed cassette is driven as fast as it can be served, without wall clock pacing
+        cassette = self.api_client.cassette
+        replaying = cassette is not None and cassette.is_replaying
+
+        self.profiler.install_signal()
+
         try:
             self.logger.log_to_main("Starting main loop")
             # self.process_pairs(self.trading_pairs)
@@ -337,7 +778,14 @@ class Bot:
                     tm_min = time.localtime().tm_min
                     tm_sec = time.localtime().tm_sec
 
-                    if tm_sec % 5 < 2:
+                    self.check_settings()
+                    self.check_profiler()
+                    self.memory_monitor.check()
+                    self.speculative.poll(self.candle_manager.timings, self.pair_configs)
+                    # a bar built from ticks closed: check now rather than at the next polling window
+                    tick_closed = self.tick_aggregator is not None and self.tick_aggregator.poll()
+
+                    if replaying or tm_sec % 5 < 2 or tick_closed:
                         print(f"---- {tm_mday} {tm_hour}:{tm_min}:{tm_sec}")
                         # Check for new candles
                         pairs_with_new_candles: List[str] = self.candle_manager.update_timings()
@@ -346,14 +794,35 @@ class Bot:
                             self.logger.log_to_main(f"Processing pairs with new candles: {pairs_with_new_candles}")
                             self.process_pairs(pairs_with_new_candles)
 
+                    if replaying:
+                        if cassette.exhausted:
+                            self.logger.log_to_main("Cassette replay finished")
+                            return
+                        continue
+
                     time.sleep(self.polling_period)
 
                 except Exception as e:
                     self.logger.log_to_error(f"Error in main loop: {str(e)}")
+                    if replaying:
+                        return
                     time.sleep(self.polling_period)
 
         except Exception as e:
             self.logger.log_to_error(f"Fatal error: {str(e)}")
             raise
+        finally:
+            if self.transaction_stream is not None:
+                self.transaction_stream.stop()
+            if self.price_stream is not None:
+                self.price_stream.stop()
+            self.order_dispatcher.shutdown()
+            self.speculative.shutdown()
+            self.profiler.stop()
+            if self.metrics_server is not None:
+                self.metrics_server.stop()
+            if cassette is not None:
+                cassette.close()
+            self.logger.close()
 
 
@@ -0,0 +1,158 @@
+import concurrent.futures
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from api.OandaApi import OandaApi
+from config.constants import GRANULARITY_SECONDS, MAX_CANDLES_PER_REQUEST
+
+
+class CandleStore:
+    """
+    Local candle history, one pickle per instrument and granularity.
+
+    Files live at ``{base_path}/{pair}_{granularity}.pkl`` and hold the
+    frame returned by ``OandaApi.get_candles_df``, sorted by time without
+    duplicates.
+    """
+
+    def __init__(self, base_path: str = "./data") -> None:
+        self.base_path = base_path
+        os.makedirs(base_path, exist_ok=True)
+
+    def get_path(self, pair: str, granularity: str) -> str:
+        return os.path.join(self.base_path, f"{pair}_{granularity}.pkl")
+
+    def load(self, pair: str, granularity: str) -> Optional[pd.DataFrame]:
+        path = self.get_path(pair, granularity)
+        if not os.path.exists(path):
+            return None
+        return pd.read_pickle(path)
+
+    def last_time(self, pair: str, granularity: str) -> Optional[datetime]:
+        df = self.load(pair, granularity)
+        if df is None or df.empty:
+            return None
+        return df["time"].iloc[-1].to_pydatetime()
+
+    def save(self, pair: str, granularity: str, df: pd.DataFrame) -> None:
+        # write to a temporary file first so an interrupted backfill never leaves a truncated store
+        path = self.get_path(pair, granularity)
+        tmp_path = f"{path}.tmp"
+        df.to_pickle(tmp_path)
+        os.replace(tmp_path, path)
+
+    def merge(self, pair: str, granularity: str, frames: List[pd.DataFrame]) -> pd.DataFrame:
+        """Merge new frames into the stored history, dropping bars repeated at window boundaries."""
+        existing = self.load(pair, granularity)
+        frames = [f for f in [existing, *frames] if f is not None and not f.empty]
+        if not frames:
+            return pd.DataFrame()
+        df = pd.concat(frames, ignore_index=True)
+        df = df.drop_duplicates(subset="time", keep="last").sort_values("time", ignore_index=True)
+        self.save(pair, granularity, df)
+        return df
+
+
+def get_windows(date_from: datetime, date_to: datetime, granularity: str,
+                count: int = MAX_CANDLES_PER_REQUEST) -> List[Tuple[datetime, datetime]]:
+    """Split ``[date_from, date_to)`` into ranges holding at most ``count`` candles each."""
+    step = timedelta(seconds=GRANULARITY_SECONDS[granularity] * count)
+    windows = []
+    start = date_from
+    while start < date_to:
+        end = min(start + step, date_to)
+        windows.append((start, end))
+        start = end
+    return windows
+
+
+class CandleDownloader:
+    """
+    Backfills candle history for many instruments concurrently.
+
+    A single candles request returns at most 5000 bars, so a date range is
+    split into request-sized windows per instrument and granularity and all
+    windows are fetched from a shared thread pool. Throughput is bounded by
+    the ``rate_limiter`` of the api client when one is set. Each instrument
+    resumes from the last bar already in the store, and its windows are merged
+    into the store, de-duplicated on time, as soon as they have all arrived.
+
+    Example:
+        >>> api = OandaApi(account_id, api_key, url, rate_limiter=RateLimiter(rate=50))
+        >>> downloader = CandleDownloader(api, CandleStore("./data"))
+        >>> downloader.download(["EUR_USD", "USD_JPY"], "M15", datetime(2014, 1, 1, tzinfo=timezone.utc))
+    """
+
+    def __init__(self, api_client: OandaApi, store: CandleStore, max_workers: int = 16) -> None:
+        self.api = api_client
+        self.store = store
+        self.max_workers = max_workers
+
+    def _fetch_window(self, pair: str, granularity: str, window: Tuple[datetime, datetime]) -> Optional[pd.DataFrame]:
+        date_f, date_t = window
+        return self.api.get_candles_df(pair, completed_only=True, granularity=granularity,
+                                       date_f=date_f, date_t=date_t)
+
+    def download(self, pairs: List[str], granularity: str, date_from: datetime,
+                 date_to: Optional[datetime] = None) -> Dict[str, int]:
+        """
+        Download ``[date_from, date_to)`` for every pair into the store.
+
+        Args:
+            pairs: Instruments to backfill
+            granularity: Candle granularity, e.g. ``"M15"``
+            date_from: Start of the history, used when nothing is stored yet
+            date_to: End of the history, now by default
+
+        Returns:
+            Number of bars stored per pair after the download
+        """
+        date_to = date_to or datetime.now(timezone.utc)
+        date_from, date_to = (d if d.tzinfo else d.replace(tzinfo=timezone.utc) for d in (date_from, date_to))
+
+        tasks: List[Tuple[str, Tuple[datetime, datetime]]] = []
+        for pair in pairs:
+            last_time = self.store.last_time(pair, granularity)
+            start = max(date_from, last_time) if last_time is not None else date_from
+            tasks.extend((pair, window) for window in get_windows(start, date_to, granularity))
+
+        remaining: Dict[str, int] = defaultdict(int)
+        for pair, _ in tasks:
+            remaining[pair] += 1
+
+        results: Dict[str, List[Tuple[datetime, pd.DataFrame]]] = defaultdict(list)
+        first_failure: Dict[str, datetime] = {}
+        stored: Dict[str, int] = {}
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(self._fetch_window, pair, granularity, window): (pair, window)
+                       for pair, window in tasks}
+            for future in concurrent.futures.as_completed(futures):
+                pair, window = futures[future]
+                try:
+                    df = future.result()
+                except Exception as e:
+                    print(f"Error downloading {pair} {granularity} {window[0]} - {window[1]}: {e}")
+                    df = None
+
+                if df is None:
+                    first_failure[pair] = min(window[0], first_failure.get(pair, window[0]))
+                else:
+                    results[pair].append((window[0], df))
+
+                remaining[pair] -= 1
+                if remaining[pair] == 0:
+                    # keep history contiguous: a failed window and everything after it is fetched on the next run
+                    cutoff = first_failure.get(pair)
+                    frames = [df for start, df in results.pop(pair, []) if cutoff is None or start < cutoff]
+                    stored[pair] = len(self.store.merge(pair, granularity, frames))
+
+        for pair in pairs:
+            if pair not in stored:
+                df = self.store.load(pair, granularity)
+                stored[pair] = 0 if df is None else len(df)
+        return stored
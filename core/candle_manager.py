@@ -2,9 +2,19 @@ from typing import Dict, List, Optional, Any
 from datetime import datetime
 from dataclasses import dataclass
 import concurrent.futures
+import time
 
 from api.OandaApi import OandaApi
+from config.constants import GRANULARITY_SECONDS
 from core.log_wrapper import LogManager
+from core.metrics import REGISTRY, LAG_BUCKETS
+from core.tick_aggregator import TickAggregator
+
+POLL_SECONDS = REGISTRY.histogram("candle_poll_seconds", "Time to check every pair for a new candle")
+POLL_SKIPPED = REGISTRY.counter("candle_poll_skipped_total", "Polls skipped because the previous one was still running")
+DETECTION_LAG_SECONDS = REGISTRY.histogram("candle_detection_lag_seconds",
+                                           "Time from a bar closing at the broker to the new candle being seen",
+                                           ["granularity"], buckets=LAG_BUCKETS)
 
 
 @dataclass
@@ -13,17 +23,22 @@ class CandleTiming:
     granularity: str
     is_ready: bool = False
     completed_only: bool = True
+    # wall clock time the latest candle was first seen, for latency tracking
+    detected_at: Optional[float] = None
 
     def __repr__(self):
         return f"last_candle:{self.last_time.strftime('%y-%m-%d %H:%M')} is_ready:{self.is_ready}"
 
 
 class CandleManager:
-    def __init__(self, pairs: List[str], api_client: OandaApi, pair_settings: Dict, logger: Optional[LogManager]):
-        self.pairs = pairs
+    def __init__(self, pairs: List[str], api_client: OandaApi, pair_settings: Dict, logger: Optional[LogManager],
+                 tick_aggregator: Optional[TickAggregator] = None):
+        self.pairs = list(pairs)
         self.api = api_client
         self.pair_settings = pair_settings
         self.logger = logger
+        # candles built from the pricing stream; live pairs are checked locally instead of over REST
+        self.tick_aggregator = tick_aggregator
         
         # Initialize timing information for each pair
         self.timings: Dict[str, CandleTiming] = {}
@@ -32,9 +47,9 @@ class CandleManager:
         # Add flag to track if update is running
         self._is_updating = False
 
-    def _initialize_timings(self) -> None:
-        """Initialize timing information for all pairs."""
-        for pair in self.pairs:
+    def _initialize_timings(self, pairs: Optional[List[str]] = None) -> None:
+        """Initialize timing information for ``pairs``, all pairs by default, probing them concurrently."""
+        def init_pair(pair: str) -> None:
             try:
                 last_time = self.api.last_complete_candle(
                     pair,
@@ -43,8 +58,8 @@ class CandleManager:
                 )
                 if last_time is None:
                     self.logger.log_to_error(f"Could not initialize timing for {pair}")
-                    continue
-                    
+                    return
+
                 self.timings[pair] = CandleTiming(
                     last_time=last_time,
                     granularity=self.pair_settings[pair]["granularity"],
@@ -52,24 +67,27 @@ class CandleManager:
                 )
             except Exception as e:
                 self.logger.log_to_error(f"Error initializing timing for {pair}: {str(e)}")
-                
+
+        pairs = self.pairs if pairs is None else pairs
+        # network bound: one thread per pair, the rate limiter still paces the requests
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(32, len(pairs) or 1)) as executor:
+            list(executor.map(init_pair, pairs))
+
     def update_timings(self) -> list[Any] | None:
         # Return empty list if already updating
         if self._is_updating:
             self.logger.log_message("*** Already updating, skipping update")
+            POLL_SKIPPED.inc()
             return None
 
         triggered_pairs = []
         self._is_updating = True
+        started = time.perf_counter()
         try:
             def process_pair(pair: str) -> Optional[str]:
                 try:
                     timing = self.timings[pair]
-                    current = self.api.last_complete_candle(
-                        pair,
-                        timing.granularity,
-                        timing.completed_only
-                    )
+                    current = self._last_complete(pair, timing)
                     
                     if current is None:
                         self.logger.log_to_error(f"Unable to get candle for {pair}")
@@ -81,6 +99,11 @@ class CandleManager:
                     if not timing.completed_only or current > timing.last_time:
                         timing.is_ready = True
                         timing.last_time = current
+                        timing.detected_at = time.time()
+                        if timing.completed_only:
+                            bar_close = current.timestamp() + GRANULARITY_SECONDS.get(timing.granularity, 0)
+                            DETECTION_LAG_SECONDS.observe(timing.detected_at - bar_close,
+                                                          granularity=timing.granularity)
                         return pair
                         
                 except Exception as e:
@@ -97,11 +120,36 @@ class CandleManager:
                         triggered_pairs.append(pair)
                         self.logger.log_message(f"*** new candle: {triggered_pairs}", pair)
 
+            POLL_SECONDS.observe(time.perf_counter() - started)
             return triggered_pairs
             
         finally:
             self._is_updating = False
 
+    def _last_complete(self, pair: str, timing: CandleTiming) -> Optional[datetime]:
+        aggregator = self.tick_aggregator
+        if aggregator is not None and timing.completed_only and aggregator.is_live(pair):
+            current = aggregator.last_complete(pair, timing.granularity)
+            if current is not None:
+                return current
+        return self.api.last_complete_candle(pair, timing.granularity, timing.completed_only)
+
+    def add_pairs(self, pair_settings: Dict[str, Dict[str, Any]]) -> None:
+        """Start tracking new pairs, or re-initialize pairs whose granularity changed."""
+        for pair, settings in pair_settings.items():
+            self.pair_settings[pair] = settings
+            if pair not in self.pairs:
+                self.pairs.append(pair)
+        self._initialize_timings(list(pair_settings))
+
+    def remove_pairs(self, pairs: List[str]) -> None:
+        """Stop tracking pairs; the timings of the other pairs are kept."""
+        for pair in pairs:
+            if pair in self.pairs:
+                self.pairs.remove(pair)
+            self.pair_settings.pop(pair, None)
+            self.timings.pop(pair, None)
+
     def get_timing(self, pair: str) -> Optional[CandleTiming]:
         """Get timing information for a specific pair."""
         return self.timings.get(pair)
@@ -0,0 +1,137 @@
+import io
+import json
+import os
+import threading
+from datetime import datetime, date, timezone
+from typing import IO, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from models.decision_record import DecisionRecord
+
+
+def _to_json(value):
+    # numpy scalars come straight out of the candle frames
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+class DecisionJournal:
+    """
+    Append-only journal of :class:`DecisionRecord` rows, one file per UTC day.
+
+    Files live at ``{base_path}/{bot_name}/journal/{YYYY-MM-DD}.jsonl``. The
+    first line of a file is the list of column names and every following line
+    is one record as a JSON array in that order, which keeps the files small.
+    :func:`load_decisions` strips the brackets and parses a whole day with
+    ``pd.read_csv``, with only the header going through ``json.loads``. A
+    record goes to the file of its own ``time``, so the journal rotates at UTC
+    midnight however long the bot runs.
+
+    Writes are not flushed individually; call :meth:`flush` once per batch.
+    """
+
+    BASE_PATH = './logs'
+
+    def __init__(self, bot_name: str, base_path: str = BASE_PATH) -> None:
+        self.path = os.path.join(base_path, bot_name, "journal")
+        os.makedirs(self.path, exist_ok=True)
+        self.columns = DecisionRecord.field_names()
+
+        self._lock = threading.Lock()
+        self._day: Optional[date] = None
+        self._file: Optional[IO[str]] = None
+
+    def _open(self, day: date) -> None:
+        if self._file is not None:
+            self._file.close()
+        filename = os.path.join(self.path, f"{day.isoformat()}.jsonl")
+        if os.path.exists(filename):
+            self._drop_partial_line(filename)
+        is_new = not os.path.exists(filename) or os.path.getsize(filename) == 0
+        self._file = open(filename, "a", encoding="utf-8")
+        if is_new:
+            self._file.write(json.dumps(self.columns) + "\n")
+        self._day = day
+
+    @staticmethod
+    def _drop_partial_line(filename: str) -> None:
+        """Cut off a last line left unterminated by a crash so appends start on a fresh line."""
+        with open(filename, "rb+") as f:
+            size = f.seek(0, os.SEEK_END)
+            if size == 0:
+                return
+            f.seek(size - 1)
+            if f.read(1) == b"\n":
+                return
+            f.seek(max(0, size - 4096))
+            tail = f.read()
+            f.truncate(size - len(tail) + tail.rfind(b"\n") + 1)
+
+    def write(self, record: DecisionRecord) -> None:
+        day = datetime.fromtimestamp(record.time, tz=timezone.utc).date()
+        line = json.dumps(record.to_row(), separators=(",", ":"), default=_to_json)
+        with self._lock:
+            if day != self._day:
+                self._open(day)
+            self._file.write(line + "\n")
+
+    def flush(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+                self._day = None
+
+
+def _read_day(filename: str) -> pd.DataFrame:
+    with open(filename, encoding="utf-8") as f:
+        header = f.readline()
+        body = f.read()
+    if not header or not body:
+        return pd.DataFrame()
+    # each line is a flat JSON array of numbers, nulls and plain strings, so once the
+    # brackets are gone pandas' C csv parser reads it far faster than json.loads
+    return pd.read_csv(io.StringIO(body.replace("[", "").replace("]", "")), header=None,
+                       names=json.loads(header), na_values=["null"], escapechar="\\")
+
+
+def load_decisions(bot_name: str, date_from: Optional[Union[str, date]] = None,
+                   date_to: Optional[Union[str, date]] = None,
+                   base_path: str = DecisionJournal.BASE_PATH) -> pd.DataFrame:
+    """
+    Load the journal of a bot into one DataFrame, ``time`` and ``bar_time`` as UTC datetimes.
+
+    Args:
+        bot_name: Bot whose journal to read
+        date_from: First UTC day to load (inclusive), all days by default
+        date_to: Last UTC day to load (inclusive), all days by default
+        base_path: Root of the logs directory
+
+    Example:
+        >>> decisions = load_decisions("my_bot", "2024-05-01", "2024-05-31")
+        >>> decisions.groupby(["pair", "outcome"]).size()
+    """
+    path = os.path.join(base_path, bot_name, "journal")
+    if not os.path.isdir(path):
+        return pd.DataFrame(columns=DecisionRecord.field_names())
+
+    date_from, date_to = (str(d) if d is not None else None for d in (date_from, date_to))
+    days: List[str] = sorted(name[:-len(".jsonl")] for name in os.listdir(path) if name.endswith(".jsonl"))
+    days = [d for d in days if (date_from is None or d >= date_from) and (date_to is None or d <= date_to)]
+
+    frames = [df for df in (_read_day(os.path.join(path, f"{d}.jsonl")) for d in days) if not df.empty]
+    if not frames:
+        return pd.DataFrame(columns=DecisionRecord.field_names())
+
+    df = pd.concat(frames, ignore_index=True)
+    for column in ("time", "bar_time"):
+        df[column] = pd.to_datetime((df[column] * 1000).round(), unit="ms", utc=True)
+    return df
@@ -0,0 +1,109 @@
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Deque, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from core.metrics import REGISTRY, LAG_BUCKETS
+
+# stages of a cycle, each measured from the close of the bar at the broker
+DETECTED = "detected"          # CandleManager saw the new candle
+PREPARED = "prepared"          # candles fetched and indicators computed
+DECIDED = "decided"            # process_pair finished deciding, orders handed to the dispatcher
+ACKNOWLEDGED = "acknowledged"  # the broker acknowledged a market or limit order
+STAGES = [DETECTED, PREPARED, DECIDED, ACKNOWLEDGED]
+
+STAGE_LATENCY_SECONDS = REGISTRY.histogram("bot_stage_latency_seconds", "Time from bar close to each stage of a cycle",
+                                           ["granularity", "stage"], buckets=LAG_BUCKETS)
+
+
+def _stage_order(stage: str) -> int:
+    return STAGES.index(stage) if stage in STAGES else -1
+
+
+class LatencyTrace:
+    """Marks the stages of one pair's cycle on one bar."""
+
+    def __init__(self, tracker: "LatencyTracker", granularity: str, bar_close: float) -> None:
+        self.tracker = tracker
+        self.granularity = granularity
+        self.bar_close = bar_close
+
+    def mark(self, stage: str, at: Optional[float] = None) -> float:
+        """Record that ``stage`` was reached at ``at`` (now by default); returns seconds since the bar closed."""
+        latency = (at if at is not None else time.time()) - self.bar_close
+        self.tracker.record(self.granularity, stage, latency)
+        return latency
+
+
+class LatencyTracker:
+    """
+    Rolling latency samples from bar close to each stage, per granularity.
+
+    The bar close is the candle's open time plus its length, so ``acknowledged``
+    is the time from the bar closing at the broker to our order being
+    acknowledged. The last ``window`` samples are kept per granularity and stage.
+    :meth:`format_summary` is one line for every cycle; :meth:`format_report`
+    is the full table.
+
+    Example:
+        >>> tracker = LatencyTracker()
+        >>> trace = tracker.trace("M5", bar_close=candle_time.timestamp() + 300)
+        >>> trace.mark(DECIDED)
+        >>> tracker.report()
+    """
+
+    def __init__(self, window: int = 1000, percentiles: Sequence[float] = (50, 90, 99)) -> None:
+        self.percentiles = list(percentiles)
+        self._lock = threading.Lock()
+        self._samples: Dict[Tuple[str, str], Deque[float]] = defaultdict(lambda: deque(maxlen=window))
+
+    def trace(self, granularity: str, bar_close: float) -> LatencyTrace:
+        return LatencyTrace(self, granularity, bar_close)
+
+    def record(self, granularity: str, stage: str, latency: float) -> None:
+        with self._lock:
+            self._samples[(granularity, stage)].append(latency)
+        STAGE_LATENCY_SECONDS.observe(latency, granularity=granularity, stage=stage)
+
+    def report(self) -> pd.DataFrame:
+        """Count, percentiles and max in seconds, one row per (granularity, stage)."""
+        with self._lock:
+            samples = {key: np.fromiter(values, dtype=float) for key, values in self._samples.items() if values}
+
+        rows = []
+        for (granularity, stage), values in samples.items():
+            row = dict(granularity=granularity, stage=stage, count=len(values))
+            row.update({f"p{p:g}": v for p, v in zip(self.percentiles, np.percentile(values, self.percentiles))})
+            row["max"] = values.max()
+            rows.append(row)
+        if not rows:
+            return pd.DataFrame()
+
+        df = pd.DataFrame(rows)
+        df["stage"] = pd.Categorical(df["stage"], categories=STAGES + sorted(set(df["stage"]) - set(STAGES)),
+                                     ordered=True)
+        return df.sort_values(["granularity", "stage"]).set_index(["granularity", "stage"])
+
+    def format_summary(self) -> str:
+        """Median and p99 of the last stage reached per granularity, on one line."""
+        with self._lock:
+            last = {}
+            for (granularity, stage), values in self._samples.items():
+                if values and (granularity not in last or _stage_order(stage) > _stage_order(last[granularity][0])):
+                    last[granularity] = (stage, np.fromiter(values, dtype=float))
+        if not last:
+            return "latency: no samples"
+        parts = []
+        for granularity, (stage, values) in sorted(last.items()):
+            p50, p99 = np.percentile(values, [50, 99])
+            parts.append(f"{granularity} {stage} p50 {p50:.3f} p99 {p99:.3f} (n={len(values)})")
+        return "latency (s) from bar close: " + ", ".join(parts)
+
+    def format_report(self) -> str:
+        df = self.report()
+        if df.empty:
+            return "latency: no samples"
+        return "latency (s) from bar close:\n" + df.round(3).to_string()
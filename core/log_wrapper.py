@@ -1,7 +1,35 @@
+import atexit
 import logging
 import os
+import queue
+import sys
+import threading
 from datetime import datetime
-from typing import Dict, Optional, Callable
+from typing import Any, Dict, Optional, Callable, List, Tuple, Union
+
+from core.decision_journal import DecisionJournal
+from core.metrics import REGISTRY
+from core.tracing import current_ids
+from models.decision_record import DecisionRecord
+
+# a log message, or a callable building it, only called when the message is actually logged
+LazyMessage = Union[str, Callable[[], str]]
+
+LOG_RECORDS = REGISTRY.counter("log_records_total", "Log records and decisions submitted")
+LOG_WRITE_SECONDS = REGISTRY.histogram("log_write_batch_seconds", "Time to write and flush one batch of log records")
+QUEUE_DEPTH = REGISTRY.gauge("queue_depth", "Items waiting in a work queue", ["queue"])
+
+
+class BufferedFileHandler(logging.FileHandler):
+    """File handler that leaves flushing to its caller instead of flushing every record."""
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            if self.stream is None:
+                self.stream = self._open()
+            self.stream.write(self.format(record) + self.terminator)
+        except Exception:
+            self.handleError(record)
 
 
 class LogWrapper:
@@ -11,7 +39,7 @@ class LogWrapper:
     LOG_FORMAT = "%(asctime)s %(message)s"
     DEFAULT_LEVEL = logging.DEBUG
     
-    def __init__(self, bot_name: str, log_name: str, current_time: str, mode: str = "a"):
+    def __init__(self, bot_name: str, log_name: str, current_time: str, mode: str = "a", buffered: bool = False):
         """
         Initialize a log wrapper.
         
@@ -20,6 +48,7 @@ class LogWrapper:
             log_name: Name of this specific log
             current_time: Current date in YYYY-MM-DD format
             mode: File mode for the log file ('a' for append, 'w' for write)
+            buffered: Leave flushing to the caller (see :meth:`flush`) instead of flushing every record
         """
         # Create directory structure
         dir_path = os.path.join(self.BASE_PATH, bot_name, current_time)
@@ -31,16 +60,36 @@ class LogWrapper:
         self.logger.setLevel(self.DEFAULT_LEVEL)
         
         # Create and configure file handler
-        file_handler = logging.FileHandler(self.filename, mode=mode)
+        handler_class = BufferedFileHandler if buffered else logging.FileHandler
+        file_handler = handler_class(self.filename, mode=mode)
+        self.handler = file_handler
         formatter = logging.Formatter(self.LOG_FORMAT, datefmt='%Y-%m-%d %H:%M:%S')
         file_handler.setFormatter(formatter)
         
-        # Add handler to logger
+        # Add handler to logger; the logger outlives this wrapper, so drop the handlers
+        # of earlier wrappers with the same name (e.g. a pair removed and re-added)
+        for previous in list(self.logger.handlers):
+            self.logger.removeHandler(previous)
+            previous.close()
         self.logger.addHandler(file_handler)
         
         # Log initialization
         self.logger.info(f"LogWrapper initialized at {datetime.now().strftime('%m/%d/%Y %H:%M:%S')} - {self.filename}")
 
+    def write(self, msg: str, created: float) -> None:
+        """Write a message timestamped at ``created`` rather than at the time it is written."""
+        record = self.logger.makeRecord(self.logger.name, logging.DEBUG, "", 0, msg, None, None)
+        record.created = created
+        record.msecs = (created - int(created)) * 1000
+        self.logger.handle(record)
+
+    def flush(self) -> None:
+        self.handler.flush()
+
+    def close(self) -> None:
+        self.logger.removeHandler(self.handler)
+        self.handler.close()
+
 class LogManager:
     """
     Manages multiple log files for different purposes in the trading system.
@@ -61,6 +110,29 @@ class LogManager:
     3. Log Builders:
        - log_message_builder: Creates pair-specific loggers
        - log_trade_builder: Creates trade-specific loggers
+
+    4. Queued Writing:
+       The logging calls only put a record on a queue. A single background
+       writer thread fans each record out to its log files, writing in batches
+       and flushing once per batch, and echoes it to the console when
+       ``console_echo`` is on. :meth:`close` (also run at exit) drains the queue.
+
+    5. Lazy Messages:
+       Every log has a verbosity level (``log_levels``, DEBUG by default).
+       Messages below it are dropped before they are built: pass a callable
+       or a %-format string with its arguments instead of a finished string,
+       e.g. ``pair_logger("rsi: %.2f", rsi, level=logging.DEBUG)`` or
+       ``pair_logger(lambda: f"closes: {candles.mid_c.tail(10).values}", level=logging.DEBUG)``.
+
+    6. Worker Processes:
+       A LogManager created with ``forward_to`` (a multiprocessing queue)
+       writes nothing itself and sends every record to that queue; the
+       supervisor's LogManager writes them after :meth:`receive` is called on it.
+
+    7. Decision Journal:
+       ``log_decision`` queues a structured :class:`DecisionRecord` for the
+       :class:`DecisionJournal` (``./logs/{bot_name}/journal``), written by the
+       same writer thread and rotated at UTC midnight.
     
     Example:
         >>> # Initialize with bot name and pairs
@@ -76,13 +148,20 @@ class LogManager:
         >>> trade_logger("Entered long position")
     """
     
-    def __init__(self, bot_name: str, pairs: list[str]):
+    WRITER_BATCH_SIZE = 512
+
+    def __init__(self, bot_name: str, pairs: list[str], queued: bool = True, console_echo: bool = True,
+                 log_levels: Optional[Dict[str, Union[int, str]]] = None, forward_to: Optional[Any] = None):
         """
         Initialize the log manager.
         
         Args:
             bot_name (str): Name of the bot instance for log file organization
             pairs (list[str]): List of trading pairs to create logs for
+            queued (bool): Write from a background thread instead of the calling thread
+            console_echo (bool): Also print every message to the console
+            log_levels (dict): Minimum level per log key, e.g. ``{"default": "INFO", "EUR_USD": "DEBUG"}``
+            forward_to: Queue to send records to instead of writing them, from a worker process
         
         The initialization process:
         1. Creates base log files (error, main, trades)
@@ -95,40 +174,190 @@ class LogManager:
         """
         self.bot_name = bot_name
         self.current_time = datetime.now().strftime("%Y-%m-%d")
-        
+        self.queued = queued
+        self.console_echo = console_echo
+        self.set_log_levels(log_levels or {})
+        self.forward_to = forward_to
+        self._queue: "queue.SimpleQueue[Optional[Tuple]]" = queue.SimpleQueue()
+        self._writer: Optional[threading.Thread] = None
+
+        if forward_to is not None:
+            self.logs: Dict[str, LogWrapper] = {}
+            self.journal: Optional[DecisionJournal] = None
+            self.log_to_main(f"Worker started with pairs: {pairs}")
+            return
+
         # Create base logs
         self.logs: Dict[str, LogWrapper] = {
-            "error": LogWrapper(bot_name, "error", self.current_time),
-            "main": LogWrapper(bot_name, "main", self.current_time),
-            "trades": LogWrapper(bot_name, "trades", self.current_time),
-            "rejected": LogWrapper(bot_name, "rejected", self.current_time)
+            "error": LogWrapper(bot_name, "error", self.current_time, buffered=queued),
+            "main": LogWrapper(bot_name, "main", self.current_time, buffered=queued),
+            "trades": LogWrapper(bot_name, "trades", self.current_time, buffered=queued),
+            "rejected": LogWrapper(bot_name, "rejected", self.current_time, buffered=queued)
         }
         
         # Create pair-specific logs
         for pair in pairs:
-            self.logs[pair] = LogWrapper(bot_name, pair, self.current_time)
+            self.logs[pair] = LogWrapper(bot_name, pair, self.current_time, buffered=queued)
+
+        self.journal = DecisionJournal(bot_name)
+
+        # Start the writer
+        if queued:
+            self._writer = threading.Thread(target=self._write_loop, name=f"{bot_name}-log-writer", daemon=True)
+            self._writer.start()
+            QUEUE_DEPTH.set_function(self._queue.qsize, queue="log_writer")
+            atexit.register(self.close)
             
         # Log initialization
         self.log_to_main(f"Bot started with pairs: {pairs}")
         
-    def log_message(self, msg: str, key: str) -> None:
-        """Log a message to both the specific log and main log."""
-        print(f"{key}: {msg}")
-        self.logs[key].logger.debug(f"{key}: {msg}")
-        self.logs["main"].logger.debug(f"{key}: {msg}")
+    def set_log_levels(self, log_levels: Dict[str, Union[int, str]]) -> None:
+        """Set the minimum level per log key; ``"default"`` applies to keys not listed."""
+        levels = {key: self._to_level(level) for key, level in log_levels.items()}
+        self.default_level = levels.pop("default", logging.DEBUG)
+        self.log_levels = levels
+
+    @staticmethod
+    def _to_level(level: Union[int, str]) -> int:
+        if isinstance(level, int):
+            return level
+        value = logging.getLevelName(level.upper())
+        if not isinstance(value, int):
+            raise ValueError(f"Unknown log level: {level}")
+        return value
+
+    def is_enabled(self, key: str, level: int = logging.INFO) -> bool:
+        """Whether a message at ``level`` would be written to the ``key`` log."""
+        return level >= self.log_levels.get(key, self.default_level)
+
+    @staticmethod
+    def _build(msg: LazyMessage, args: Tuple[Any, ...]) -> str:
+        if callable(msg):
+            return msg()
+        return msg % args if args else msg
+
+    def _submit(self, echo: Optional[str], targets: List[Tuple[str, str]],
+                decision: Optional[DecisionRecord] = None) -> None:
+        """Hand a message, the (log key, text) pairs it goes to and/or a decision over to the writer."""
+        LOG_RECORDS.inc()
+        # lines written inside a traced cycle carry its ids, linking them to the requests of the same pair
+        ids = current_ids()
+        if ids is not None:
+            targets = [(key, f"[{ids}] {text}") for key, text in targets]
+        self._enqueue((datetime.now().timestamp(), echo, targets, decision))
+
+    def _enqueue(self, record: Tuple) -> None:
+        if self.forward_to is not None:
+            self.forward_to.put(record)
+        elif self._writer is not None:
+            self._queue.put(record)
+        else:
+            self._write_batch([record])
+
+    def add_logs(self, pairs: List[str]) -> None:
+        """Create the log files of pairs not logged yet."""
+        for pair in pairs:
+            if pair not in self.logs and self.forward_to is None:
+                self.logs[pair] = LogWrapper(self.bot_name, pair, self.current_time, buffered=self.queued)
+
+    def remove_logs(self, pairs: List[str]) -> None:
+        """Close the log files of pairs no longer traded; records still queued for them are dropped."""
+        for pair in pairs:
+            if (wrapper := self.logs.pop(pair, None)) is not None:
+                wrapper.close()
+
+    def receive(self, source: Any) -> threading.Thread:
+        """
+        Write the records forwarded by worker LogManagers to ``source`` until it yields ``None``.
+
+        Returns:
+            The receiving thread
+        """
+        def receive_loop() -> None:
+            while (record := source.get()) is not None:
+                self._enqueue(record)
+
+        receiver = threading.Thread(target=receive_loop, name=f"{self.bot_name}-log-receiver", daemon=True)
+        receiver.start()
+        return receiver
+
+    def _write_batch(self, batch: List[Tuple]) -> None:
+        touched = set()
+        echo_lines = []
+        decisions = False
+        for created, echo, targets, decision in batch:
+            if echo is not None:
+                echo_lines.append(echo)
+            for key, text in targets:
+                # a pair removed by a settings reload may still have records queued
+                if (wrapper := self.logs.get(key)) is None:
+                    continue
+                wrapper.write(text, created)
+                touched.add(wrapper)
+            if decision is not None:
+                self.journal.write(decision)
+                decisions = True
+
+        for wrapper in touched:
+            wrapper.flush()
+        if decisions:
+            self.journal.flush()
+        if self.console_echo and echo_lines:
+            sys.stdout.write("\n".join(echo_lines) + "\n")
+            sys.stdout.flush()
+
+    def _write_loop(self) -> None:
+        stopping = False
+        while not stopping:
+            batch = [self._queue.get()]
+            while len(batch) < self.WRITER_BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            # None is the stop marker put by close()
+            stopping = None in batch
+            try:
+                with LOG_WRITE_SECONDS.time():
+                    self._write_batch([record for record in batch if record is not None])
+            except Exception as e:
+                print(f"Error writing logs: {e}")
+
+    def close(self) -> None:
+        """Stop the writer thread after everything queued so far has been written."""
+        writer, self._writer = self._writer, None
+        if writer is None:
+            return
+        self._queue.put(None)
+        writer.join()
+        for wrapper in self.logs.values():
+            wrapper.flush()
+        if self.journal is not None:
+            self.journal.flush()
+
+    def log_message(self, msg: LazyMessage, key: str, *args: Any, level: int = logging.INFO) -> None:
+        """Log a message to both the specific log and main log, if ``level`` is enabled for ``key``."""
+        if not self.is_enabled(key, level):
+            return
+        text = f"{key}: {self._build(msg, args)}"
+        self._submit(text, [(key, text), ("main", text)])
+
+    def log_decision(self, decision: DecisionRecord) -> None:
+        """Append a decision to the journal."""
+        self._submit(None, [], decision)
 
-    def log_message_builder(self, key: str) -> Callable[[str], None]:
-        def log_message_with_key(msg: str) -> None:
-            self.log_message(msg, key)
+    def log_message_builder(self, key: str) -> Callable[..., None]:
+        def log_message_with_key(msg: LazyMessage, *args: Any, level: int = logging.INFO) -> None:
+            self.log_message(msg, key, *args, level=level)
 
+        log_message_with_key.is_enabled = lambda level=logging.INFO: self.is_enabled(key, level)
         return log_message_with_key
 
     def log_trade(self, msg: str, key: str, granularity: str) -> None:
         """Log a trade message to the specific log, trades log, and main log."""
-        print(f"{key}: {msg}")
-        self.logs[key].logger.debug(f"{key}: {msg}")
-        self.logs["trades"].logger.debug(f"{key} {granularity}: {msg}")
-        self.logs["main"].logger.debug(f"{key}: {msg}")
+        text = f"{key}: {msg}"
+        self._submit(text, [(key, text), ("trades", f"{key} {granularity}: {msg}"), ("main", text)])
 
     def log_trade_builder(self, key: str, granularity) -> Callable[[str], None]:
         def log_trade_with_key(msg: str) -> None:
@@ -138,10 +367,8 @@ class LogManager:
 
     def log_rejected(self, msg: str, key: str, granularity: str) -> None:
         """Log a trade message to the specific log, rejected log, and main log."""
-        print(f"{key}: {msg}")
-        self.logs[key].logger.debug(f"{key}: {msg}")
-        self.logs["rejected"].logger.debug(f"{key} {granularity}: {msg}")
-        self.logs["main"].logger.debug(f"{key}: {msg}")
+        text = f"{key}: {msg}"
+        self._submit(text, [(key, text), ("rejected", f"{key} {granularity}: {msg}"), ("main", text)])
 
     def log_rejected_builder(self, key: str, granularity) -> Callable[[str], None]:
         def log_rejected_with_key(msg: str) -> None:
@@ -149,15 +376,18 @@ class LogManager:
 
         return log_rejected_with_key
 
-    def log_to_main(self, msg: str) -> None:
-        """Log a message only to the main log."""
-        print(msg)
-        self.logs["main"].logger.debug(msg)
+    def log_to_main(self, msg: LazyMessage, *args: Any, level: int = logging.INFO) -> None:
+        """Log a message only to the main log, if ``level`` is enabled for it."""
+        if not self.is_enabled("main", level):
+            return
+        text = self._build(msg, args)
+        self._submit(text, [("main", text)])
 
     def log_to_error(self, msg: str) -> None:
-        """Log an error message."""
-        print(f"error: {msg}")
-        self.log_message(msg, "error")
+        """Log an error message; written whatever ``log_levels`` say, as long as ERROR itself is enabled."""
+        text = f"error: {msg}"
+        self._submit(text, [])
+        self.log_message(msg, "error", level=logging.ERROR)
         
     def get_logger(self, key: str) -> Optional[logging.Logger]:
         """Get the logger for a specific key."""
@@ -0,0 +1,132 @@
+import gc
+import os
+import threading
+import time
+import tracemalloc
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+from core.log_wrapper import LogManager
+from core.metrics import REGISTRY, count_open_files, read_rss
+
+MB = 1024 * 1024
+
+FRAME_BYTES = REGISTRY.gauge("pair_frame_bytes", "Size of the latest candle frame of a pair", ["pair"])
+
+
+class MemoryMonitor:
+    """
+    Periodic memory accounting of the bot process.
+
+    Every ``interval`` seconds :meth:`check` logs the RSS (and its growth since
+    the first check), open file descriptors, threads, garbage collector counts
+    and the size of each pair's latest candle frame, as recorded by
+    :meth:`record_frame`. An RSS above ``rss_alert_mb``, or grown by more than
+    ``growth_alert_mb`` since the first check, is reported to the error log,
+    at most once per ``alert_cooldown`` seconds.
+
+    Allocation sites are traced on demand: while ``control_file`` exists
+    tracemalloc runs, and every check logs the ``top`` sites that grew most
+    since it was switched on. Removing the file stops tracemalloc again.
+
+    Example:
+        >>> monitor = MemoryMonitor(log_manager, rss_alert_mb=1500, control_file="logs/bot/tracemalloc.on")
+        >>> monitor.record_frame("EUR_USD", candles)
+        >>> monitor.check()
+    """
+
+    def __init__(self, logger: LogManager, interval: float = 300, rss_alert_mb: Optional[float] = None,
+                 growth_alert_mb: Optional[float] = None, control_file: Optional[str] = None,
+                 top: int = 10, alert_cooldown: float = 3600) -> None:
+        self.logger = logger
+        self.interval = interval
+        self.rss_alert_mb = rss_alert_mb
+        self.growth_alert_mb = growth_alert_mb
+        self.control_file = control_file
+        self.top = top
+        self.alert_cooldown = alert_cooldown
+
+        self.baseline_rss: Optional[float] = None
+        self.peak_rss = 0.0
+        self._last_check: Optional[float] = None
+        self._last_alert: Optional[float] = None
+        self._lock = threading.Lock()
+        self._frame_bytes: Dict[str, int] = {}
+        self._snapshot: Optional[tracemalloc.Snapshot] = None
+        self._started_tracing = False
+
+    def record_frame(self, pair: str, frame: pd.DataFrame) -> None:
+        # shallow: counts the column buffers, not the Python objects in object columns
+        size = int(frame.memory_usage(index=True, deep=False).sum())
+        with self._lock:
+            self._frame_bytes[pair] = size
+        FRAME_BYTES.set(size, pair=pair)
+
+    def forget(self, pair: str) -> None:
+        with self._lock:
+            self._frame_bytes.pop(pair, None)
+        FRAME_BYTES.remove(pair=pair)
+
+    def check(self, force: bool = False) -> None:
+        """Log the accounting if ``interval`` has passed since the last check."""
+        now = time.monotonic()
+        if not force and self._last_check is not None and now - self._last_check < self.interval:
+            return
+        self._last_check = now
+
+        rss = read_rss() / MB
+        if self.baseline_rss is None:
+            self.baseline_rss = rss
+        self.peak_rss = max(self.peak_rss, rss)
+        with self._lock:
+            frames = dict(self._frame_bytes)
+
+        largest = sorted(frames.items(), key=lambda kv: kv[1], reverse=True)[:3]
+        self.logger.log_to_main(
+            f"memory: rss {rss:.1f}MB (peak {self.peak_rss:.1f}MB, {rss - self.baseline_rss:+.1f}MB since start), "
+            f"open files {count_open_files()}, threads {threading.active_count()}, gc {gc.get_count()}, "
+            f"frames {sum(frames.values()) / MB:.1f}MB over {len(frames)} pairs, largest "
+            f"{[(p, f'{b / MB:.2f}MB') for p, b in largest]}")
+
+        self._check_alerts(rss, now)
+        self._check_tracemalloc()
+
+    def _check_alerts(self, rss: float, now: float) -> None:
+        reasons = []
+        if self.rss_alert_mb is not None and rss > self.rss_alert_mb:
+            reasons.append(f"rss {rss:.1f}MB above {self.rss_alert_mb}MB")
+        if self.growth_alert_mb is not None and rss - self.baseline_rss > self.growth_alert_mb:
+            reasons.append(f"rss grew {rss - self.baseline_rss:.1f}MB since start, more than {self.growth_alert_mb}MB")
+        if not reasons:
+            return
+        if self._last_alert is not None and now - self._last_alert < self.alert_cooldown:
+            return
+        self._last_alert = now
+        self.logger.log_to_error(f"Memory alert: {'; '.join(reasons)}")
+
+    def _check_tracemalloc(self) -> None:
+        wanted = self.control_file is not None and os.path.exists(self.control_file)
+        if wanted and self._snapshot is None:
+            self._started_tracing = not tracemalloc.is_tracing()
+            if self._started_tracing:
+                tracemalloc.start()
+            self._snapshot = tracemalloc.take_snapshot()
+            self.logger.log_to_main("tracemalloc started")
+        elif wanted:
+            self.logger.log_to_main("\n".join(["tracemalloc: top allocation sites since started"] + self.top_sites()))
+        elif self._snapshot is not None:
+            self._snapshot = None
+            if self._started_tracing:
+                tracemalloc.stop()
+            self.logger.log_to_main("tracemalloc stopped")
+
+    def top_sites(self) -> List[str]:
+        """The allocation sites that grew most since tracemalloc was switched on."""
+        if self._snapshot is None:
+            return []
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ])
+        return [str(stat) for stat in snapshot.compare_to(self._snapshot, "lineno")[:self.top]]
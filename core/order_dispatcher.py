@@ -0,0 +1,137 @@
+import concurrent.futures
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from core.base_api import BaseAPI
+from core.latency_tracker import LatencyTrace, ACKNOWLEDGED
+from core.log_wrapper import LogManager
+from core.metrics import REGISTRY
+from core.tracing import TRACER, in_context
+from models.instrument_data import InstrumentData
+
+PLACE_ORDER = "place_order"
+UPDATE_STOP_LOSS = "update_stop_loss"
+
+INTENT_SECONDS = REGISTRY.histogram("order_intent_seconds", "Time from an order intent to the broker's response",
+                                    ["kind"])
+QUEUE_DEPTH = REGISTRY.gauge("queue_depth", "Items waiting in a work queue", ["queue"])
+
+
+@dataclass
+class OrderIntent:
+    """An order or trade modification produced while processing a pair."""
+    pair: str
+    kind: str
+    kwargs: Dict[str, Any]
+    created: float = field(default_factory=time.monotonic)
+    # marks the broker acknowledging an order
+    trace: Optional[LatencyTrace] = None
+
+
+class OrderDispatcher:
+    """
+    Sends the orders and trade modifications of a cycle to the broker concurrently.
+
+    Pair threads hand their intents over as soon as they decide on them and
+    carry on; a shared thread pool sends them straight away, so an exit or a
+    stop move of one pair does not wait behind the requests of the other pairs
+    or of its own other trades. Requests still go through ``OandaApi.make_request``
+    and so through its rate limiter. Every response is logged against the pair
+    that produced the intent, with the time from intent to response.
+
+    Call :meth:`wait` at the end of a cycle so the next one sees the resulting
+    positions and trades.
+
+    Example:
+        >>> dispatcher = OrderDispatcher(base_api, log_manager)
+        >>> dispatcher.update_stop_loss("EUR_USD", trade.id, 1.0825)
+        >>> dispatcher.wait()
+    """
+
+    def __init__(self, base_api: BaseAPI, logger: LogManager, max_workers: int = 8) -> None:
+        self.base_api = base_api
+        self.logger = logger
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers,
+                                                              thread_name_prefix="order-dispatch")
+        self._lock = threading.Lock()
+        self._pending: List[Tuple[OrderIntent, concurrent.futures.Future]] = []
+        QUEUE_DEPTH.set_function(self.executor._work_queue.qsize, queue="order_dispatch")
+
+    def place_order(self, pair: str, use_limit: bool, trade_qty: float, instrument: InstrumentData, price: float,
+                    expiry: float, use_sl: bool = False, stop_loss: float = None,
+                    take_profit: float = None, trace: Optional[LatencyTrace] = None) -> concurrent.futures.Future:
+        """Queue a market or limit order, see ``BaseAPI.place_order``."""
+        return self.submit(OrderIntent(pair, PLACE_ORDER, dict(
+            use_limit=use_limit, trade_qty=trade_qty, instrument=instrument, price=price, expiry=expiry,
+            use_sl=use_sl, stop_loss=stop_loss, take_profit=take_profit), trace=trace))
+
+    def update_stop_loss(self, pair: str, trade_id: str, price: float) -> concurrent.futures.Future:
+        """Queue moving the fixed stop loss of a trade to ``price``."""
+        return self.submit(OrderIntent(pair, UPDATE_STOP_LOSS, dict(trade_id=trade_id, price=price)))
+
+    def submit(self, intent: OrderIntent) -> concurrent.futures.Future:
+        # the request spans stay children of the pair span that decided on the intent
+        future = self.executor.submit(in_context(self._execute), intent)
+        with self._lock:
+            self._pending.append((intent, future))
+        return future
+
+    def _execute(self, intent: OrderIntent) -> Any:
+        with TRACER.span(f"{intent.kind} {intent.pair}", pair=intent.pair,
+                         queued=f"{time.monotonic() - intent.created:.3f}s"):
+            return self._send(intent)
+
+    def _send(self, intent: OrderIntent) -> Any:
+        if intent.kind == PLACE_ORDER:
+            # place_order logs through log_message(msg, pair), which keys every line to the pair
+            result = self.base_api.place_order(intent.pair, logger=self.logger.log_message, **intent.kwargs)
+            if result is not None and intent.trace is not None:
+                intent.trace.mark(ACKNOWLEDGED)
+        elif intent.kind == UPDATE_STOP_LOSS:
+            trade_id, price = intent.kwargs["trade_id"], intent.kwargs["price"]
+            ok, response = self.base_api.oanda_api.update_fixed_stop_loss(trade_id, price, True)
+            if ok:
+                self.logger.log_message(f"stop_loss of trade {trade_id} moved to {price}", intent.pair)
+            else:
+                self.logger.log_message(f"stop_loss of trade {trade_id} not moved to {price}: "
+                                        f"{(response or {}).get('errorMessage')}", intent.pair)
+            result = ok
+        else:
+            raise ValueError(f"Unknown order intent: {intent.kind}")
+
+        elapsed = time.monotonic() - intent.created
+        INTENT_SECONDS.observe(elapsed, kind=intent.kind)
+        self.logger.log_message("%s sent in %.3fs", intent.pair, intent.kind, elapsed)
+        return result
+
+    def wait(self, timeout: Optional[float] = None) -> List[Tuple[OrderIntent, Any]]:
+        """
+        Wait for every intent submitted so far.
+
+        Returns:
+            ``(intent, result)`` per intent; failed intents are logged to their pair and the error log
+        """
+        with self._lock:
+            pending, self._pending = self._pending, []
+
+        results = []
+        done, not_done = concurrent.futures.wait([f for _, f in pending], timeout=timeout)
+        for intent, future in pending:
+            if future in not_done:
+                self.logger.log_message(f"{intent.kind} still in flight after {timeout}s", intent.pair)
+                with self._lock:
+                    self._pending.append((intent, future))
+                continue
+            try:
+                results.append((intent, future.result()))
+            except Exception as e:
+                self.logger.log_message(f"{intent.kind} failed: {e}", intent.pair)
+                self.logger.log_to_error(f"Error dispatching {intent.kind} for {intent.pair}: {e}")
+                results.append((intent, None))
+        return results
+
+    def shutdown(self) -> None:
+        self.wait()
+        self.executor.shutdown(wait=True)
@@ -1,5 +1,5 @@
 from dataclasses import dataclass
-from typing import Dict, Any
+from typing import Dict, Any, Tuple
 
 @dataclass
 class PairConfig:
@@ -22,5 +22,10 @@ class PairConfig:
     def short_only(self) -> bool:
         return self.settings.get("short_only", False)
 
+    @property
+    def strategies(self) -> Tuple[str, ...]:
+        # names in core.strategy.STRATEGIES, in priority order
+        return tuple(self.settings.get("strategies", ("heiken_ashi",)))
+
     def get_raw_settings(self) -> Dict[str, Any]:
         return self.settings
\ No newline at end of file
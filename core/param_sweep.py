@@ -0,0 +1,195 @@
+import concurrent.futures
+import itertools
+import os
+import random
+from dataclasses import dataclass, fields
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from core.StrategyManager import StrategyManager
+from core.backtester import Backtester
+from core.pair_config import PairConfig
+from models.TradeSettings import TradeSettings
+from models.strategy_params import StrategyParams
+
+CANDLE_COLUMNS = ['mid_o', 'mid_h', 'mid_l', 'mid_c',
+                  'bid_o', 'bid_h', 'bid_l', 'bid_c',
+                  'ask_o', 'ask_h', 'ask_l', 'ask_c']
+PARAM_NAMES = [f.name for f in fields(StrategyParams)]
+
+
+@dataclass
+class SweepInstrument:
+    pair_config: PairConfig
+    pip_location_precision: int
+    candles: pd.DataFrame
+    ex_rate: float = 1.0
+
+
+@dataclass(frozen=True)
+class SharedCandles:
+    """Picklable handle on a candle frame stored in shared memory."""
+    prices_name: str
+    times_name: str
+    n_bars: int
+    tz: Optional[str]
+
+
+def grid_search(grid: Dict[str, Sequence[Any]]) -> List[Dict[str, Any]]:
+    """Every combination of the values in ``grid``, keyed by ``StrategyParams`` field."""
+    _check_param_names(grid)
+    keys = list(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+
+
+def random_search(space: Dict[str, Any], n: int, seed: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    ``n`` random parameter sets drawn from ``space``.
+
+    Each entry of ``space`` is either a list of choices or a ``(low, high)`` tuple;
+    integer bounds draw integers, float bounds draw uniformly.
+    """
+    _check_param_names(space)
+    rng = random.Random(seed)
+    combinations = []
+    for _ in range(n):
+        combination = {}
+        for key, values in space.items():
+            if isinstance(values, tuple):
+                low, high = values
+                if isinstance(low, int) and isinstance(high, int):
+                    combination[key] = rng.randint(low, high)
+                else:
+                    combination[key] = rng.uniform(low, high)
+            else:
+                combination[key] = rng.choice(list(values))
+        combinations.append(combination)
+    return combinations
+
+
+def _check_param_names(space: Dict[str, Any]) -> None:
+    unknown = set(space) - set(PARAM_NAMES)
+    if unknown:
+        raise ValueError(f"Unknown strategy parameters: {sorted(unknown)}, expected one of {PARAM_NAMES}")
+
+
+def share_candles(candles: pd.DataFrame) -> Tuple[SharedCandles, List[shared_memory.SharedMemory]]:
+    """Copy a candle frame into shared memory blocks that workers can map without pickling."""
+    prices = np.ascontiguousarray(candles[CANDLE_COLUMNS].to_numpy(dtype=np.float64))
+    times = candles["time"]
+    tz = str(times.dt.tz) if times.dt.tz is not None else None
+    times = times.dt.tz_convert(None) if tz is not None else times
+    times = np.ascontiguousarray(times.to_numpy(dtype="datetime64[ns]").view(np.int64))
+
+    blocks = []
+    for values in (prices, times):
+        block = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+        np.ndarray(values.shape, dtype=values.dtype, buffer=block.buf)[:] = values
+        blocks.append(block)
+
+    return SharedCandles(blocks[0].name, blocks[1].name, len(candles), tz), blocks
+
+
+# per-process cache: the indicator frame only depends on the candles, not the parameters
+_WORKER_CACHE: Dict[str, Tuple[pd.DataFrame, pd.DataFrame, List[shared_memory.SharedMemory]]] = {}
+
+
+def _load_candles(shared: SharedCandles) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    if shared.prices_name not in _WORKER_CACHE:
+        prices_block, times_block = (shared_memory.SharedMemory(name=shared.prices_name),
+                                     shared_memory.SharedMemory(name=shared.times_name))
+        prices = np.ndarray((shared.n_bars, len(CANDLE_COLUMNS)), dtype=np.float64, buffer=prices_block.buf)
+        times = np.ndarray((shared.n_bars,), dtype=np.int64, buffer=times_block.buf)
+
+        candles = pd.DataFrame(prices, columns=CANDLE_COLUMNS, copy=False)
+        time = pd.to_datetime(times.view("datetime64[ns]"))
+        candles.insert(0, "time", time.tz_localize(shared.tz) if shared.tz is not None else time)
+        _WORKER_CACHE[shared.prices_name] = (candles, Backtester.compute_indicators(candles),
+                                             [prices_block, times_block])
+
+    candles, indicators, _ = _WORKER_CACHE[shared.prices_name]
+    return candles, indicators
+
+
+def _run_combination(shared: SharedCandles, pair: str, pair_settings: Dict[str, Any], pip_location_precision: int,
+                     ex_rate: float, raw_trade_settings: Dict[str, Any], overrides: Dict[str, Any],
+                     use_take_profit: bool) -> Dict[str, Any]:
+    candles, indicators = _load_candles(shared)
+    trade_settings = TradeSettings(raw_trade_settings)
+    params = StrategyParams(**overrides)
+    strategy_manager = StrategyManager(None, trade_settings, None, params=params)
+    backtester = Backtester(strategy_manager, PairConfig(pair, pair_settings), pip_location_precision,
+                            trade_settings, ex_rate=ex_rate, use_take_profit=use_take_profit)
+    result = backtester.run(candles, indicators=indicators)
+    return {"pair": pair, **params.to_dict(), **result.stats}
+
+
+def run_sweep(instruments: Dict[str, SweepInstrument], combinations: List[Dict[str, Any]],
+              trade_settings: TradeSettings, metric: str = "total_return",
+              max_workers: Optional[int] = None) -> pd.DataFrame:
+    """
+    Backtest every parameter combination on every instrument over a process pool.
+
+    Candles are placed in shared memory once per instrument and mapped by the
+    workers; only a small handle and the parameter overrides are pickled per run.
+    Each worker computes the parameter independent indicators once per instrument
+    and reuses them for every combination it receives.
+
+    Args:
+        instruments: Candles and settings per pair
+        combinations: ``StrategyParams`` overrides, e.g. from :func:`grid_search` or :func:`random_search`
+        trade_settings: Settings providing ``vol_target`` and ``std_lookback``
+        metric: Result column used to rank the runs, highest first
+        max_workers: Process pool size, all cores by default
+
+    Returns:
+        One row per (pair, combination) with its parameters and backtest stats, ranked by ``metric``
+
+    Example:
+        >>> combinations = grid_search({"heiken_ashi_streak": [3, 5, 100], "initial_sl_period": [5, 10, 20]})
+        >>> table = run_sweep(instruments, combinations, trade_settings, metric="total_return")
+        >>> table.groupby("pair").head(3)
+    """
+    raw_trade_settings = {
+        "pairs": {},
+        "std_lookback": trade_settings.std_lookback,
+        "vol_target": trade_settings.vol_target,
+    }
+    use_take_profit = any("tp_multiple" in c for c in combinations)
+    blocks: List[shared_memory.SharedMemory] = []
+    rows: List[Dict[str, Any]] = []
+
+    try:
+        shared = {}
+        for pair, instrument in instruments.items():
+            shared[pair], pair_blocks = share_candles(instrument.candles)
+            blocks.extend(pair_blocks)
+
+        with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers or os.cpu_count()) as executor:
+            # submit instrument by instrument so each worker keeps hitting its indicator cache
+            futures = [
+                executor.submit(_run_combination, shared[pair], pair, instrument.pair_config.get_raw_settings(),
+                                instrument.pip_location_precision, instrument.ex_rate, raw_trade_settings,
+                                overrides, use_take_profit)
+                for pair, instrument in instruments.items()
+                for overrides in combinations
+            ]
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    rows.append(future.result())
+                except Exception as e:
+                    print(f"Error in parameter sweep: {e}")
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+    table = pd.DataFrame(rows)
+    if table.empty:
+        return table
+    table = table.sort_values(metric, ascending=False, ignore_index=True)
+    table.insert(0, "rank", np.arange(1, len(table) + 1))
+    return table
@@ -0,0 +1,67 @@
+import multiprocessing
+import threading
+import time
+
+
+class RateLimiter:
+    """
+    Token bucket shared by every thread issuing REST requests.
+
+    OANDA allows a sustained rate of requests per second per connection;
+    ``acquire`` blocks until a token is available so bursts of parallel
+    requests (a candle close across many pairs, a history backfill) are
+    smoothed to that rate instead of being rejected.
+    """
+
+    def __init__(self, rate: float, burst: int = None) -> None:
+        """
+        Args:
+            rate: Sustained requests per second
+            burst: Requests that may be sent back to back, defaults to ``rate``
+        """
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(int(rate), 1)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class SharedRateLimiter(RateLimiter):
+    """
+    Token bucket shared by every process of a supervisor as well as their threads.
+
+    The bucket lives in shared memory, so the account-level rate holds however
+    the pairs are spread over worker processes. Hand it to the workers when they
+    are created (as a ``Process`` argument); it cannot be pickled later.
+    """
+
+    def __init__(self, rate: float, burst: int = None, context=multiprocessing) -> None:
+        super().__init__(rate, burst)
+        # [tokens, updated]; time.monotonic is system wide, so comparable across processes
+        self._state = context.RawArray("d", [float(self.capacity), time.monotonic()])
+        self._lock = context.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                tokens = min(self.capacity, self._state[0] + (now - self._state[1]) * self.rate)
+                self._state[1] = now
+                if tokens >= 1:
+                    self._state[0] = tokens - 1
+                    return
+                self._state[0] = tokens
+                wait = (1 - tokens) / self.rate
+            time.sleep(wait)
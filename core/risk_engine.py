@@ -0,0 +1,194 @@
+import concurrent.futures
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from api.OandaApi import OandaApi
+from core.account_state import AccountState
+from core.metrics import REGISTRY
+from models.position_data import PositionData
+
+HOME_CURRENCY = "GBP"
+
+CURRENCY_EXPOSURE = REGISTRY.gauge("currency_exposure_home", "Net exposure per currency in home currency, "
+                                                             "open positions and orders taken this cycle",
+                                   ["currency"])
+
+
+def _scale_to_limit(current: float, delta: float, limit: float) -> float:
+    """Largest fraction of ``delta`` that keeps ``|current + delta|`` within ``limit``, between 0 and 1."""
+    if delta == 0 or np.isnan(delta) or abs(current + delta) <= limit:
+        return 1.0
+    bound = limit if delta > 0 else -limit
+    return float(np.clip((bound - current) / delta, 0.0, 1.0))
+
+
+@dataclass
+class RiskSnapshot:
+    """
+    Positions, prices and conversions of the account at the start of a cycle.
+
+    ``exposure`` has a row per instrument and a column per currency: a position
+    of ``u`` units of ``BASE_QUOTE`` at ``price`` is ``+u`` of the base currency
+    and ``-u * price`` of the quote currency, both converted to the home
+    currency with the ``homeConversions`` position values. ``net`` sums the
+    rows and then grows with the orders taken during the cycle.
+    """
+    nav: float
+    instruments: List[str]
+    currencies: List[str]
+    prices: np.ndarray
+    conversions: np.ndarray
+    units: np.ndarray
+    exposure: np.ndarray
+    net: np.ndarray
+    positions: Dict[str, PositionData]
+    _instrument_index: Dict[str, int] = field(default_factory=dict)
+    _base: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=int))
+    _quote: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=int))
+
+    @classmethod
+    def build(cls, nav: float, positions: Dict[str, PositionData], prices: Dict[str, float],
+              conversions: Dict[str, float]) -> "RiskSnapshot":
+        instruments = sorted(prices)
+        currencies = sorted({c for i in instruments for c in i.split("_")} | {HOME_CURRENCY})
+        currency_index = {c: n for n, c in enumerate(currencies)}
+        base = np.array([currency_index[i.split("_")[0]] for i in instruments], dtype=int)
+        quote = np.array([currency_index[i.split("_")[1]] for i in instruments], dtype=int)
+
+        price = np.array([prices[i] for i in instruments], dtype=float)
+        conversion = np.array([1.0 if c == HOME_CURRENCY else conversions.get(c, np.nan) for c in currencies])
+        units = np.array([positions[i].units if i in positions else 0.0 for i in instruments], dtype=float)
+
+        rows = np.arange(len(instruments))
+        exposure = np.zeros((len(instruments), len(currencies)))
+        exposure[rows, base] += units * conversion[base]
+        exposure[rows, quote] -= units * price * conversion[quote]
+        net = np.nansum(exposure, axis=0)
+
+        return cls(nav=nav, instruments=instruments, currencies=currencies, prices=price, conversions=conversion,
+                   units=units, exposure=exposure, net=net, positions=positions,
+                   _instrument_index={i: n for n, i in enumerate(instruments)}, _base=base, _quote=quote)
+
+    def get_position(self, pair: str) -> PositionData:
+        return self.positions.get(pair, PositionData(instrument=pair, units=0.0, unrealized_pl=0.0, margin_used=0.0))
+
+    def ex_rate(self, pair: str) -> Optional[float]:
+        """Quote currency per unit of home currency, as ``get_trade_ex_rate``; None when not known."""
+        index = self._instrument_index.get(pair)
+        if index is None:
+            return None
+        conversion = self.conversions[self._quote[index]]
+        return None if np.isnan(conversion) or conversion == 0 else 1.0 / conversion
+
+    def net_exposure(self) -> Dict[str, float]:
+        return dict(zip(self.currencies, self.net.tolist()))
+
+    def deltas(self, pair: str, units: float):
+        """Base and quote column indexes of ``pair`` and the home currency change of trading ``units`` of it."""
+        index = self._instrument_index[pair]
+        base, quote = self._base[index], self._quote[index]
+        return (base, units * self.conversions[base]), \
+               (quote, -units * self.prices[index] * self.conversions[quote])
+
+
+class RiskEngine:
+    """
+    Account wide exposure by currency, refreshed once per cycle.
+
+    :meth:`refresh` takes the NAV, every open position and the prices and home
+    conversions of all instruments in a handful of requests (none for positions
+    while the transaction stream is current), and builds a
+    :class:`RiskSnapshot`. Pair threads then read their position, NAV and
+    exchange rate from it, and :meth:`take` caps an order so that no currency's
+    net exposure goes beyond ``max_currency_exposure`` times the NAV. Each
+    check only touches the order's two currencies. Orders taken are added to
+    the snapshot, so pairs processed concurrently share the headroom.
+
+    Example:
+        >>> engine = RiskEngine(api_client, max_currency_exposure=3.0)
+        >>> engine.refresh(["EUR_USD", "GBP_USD"])
+        >>> engine.take("EUR_USD", 10000)  # units allowed, at most 10000
+    """
+
+    def __init__(self, api_client: OandaApi, account_state: Optional[AccountState] = None,
+                 max_currency_exposure: Optional[float] = None) -> None:
+        self.api = api_client
+        self.account_state = account_state
+        self.max_currency_exposure = max_currency_exposure
+        self.snapshot: Optional[RiskSnapshot] = None
+        self._lock = threading.Lock()
+
+    def _fetch_positions(self) -> Optional[Dict[str, PositionData]]:
+        positions = self.api.get_open_positions()
+        if positions is None:
+            return None
+        return {pair: PositionData(instrument=pair, units=units, unrealized_pl=pl, margin_used=0.0)
+                for pair, (units, pl) in positions.items()}
+
+    def _fetch_nav(self) -> Optional[float]:
+        summary = self.api.get_account_summary()
+        return float(summary["NAV"]) if summary is not None else None
+
+    def refresh(self, pairs: List[str], nav: Optional[float] = None) -> Optional[RiskSnapshot]:
+        """
+        Build the snapshot of the cycle; on a failed request the snapshot is
+        cleared, and the pairs fetch what they need themselves.
+
+        ``nav``, when given, is the NAV of an account state marked to current
+        prices this cycle; otherwise it is read from the account summary.
+        """
+        self.snapshot = None
+        if self.account_state is not None and self.account_state.is_current:
+            positions: Optional[Dict[str, PositionData]] = self.account_state.get_positions()
+            if nav is None:
+                nav = self._fetch_nav()
+        else:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=2, thread_name_prefix="risk") as executor:
+                positions_future = executor.submit(self._fetch_positions)
+                nav_future = executor.submit(self._fetch_nav)
+                positions, nav = positions_future.result(), nav_future.result()
+        if positions is None or nav is None:
+            return None
+
+        instruments = sorted(set(pairs) | {p for p, position in positions.items() if position.units != 0})
+        response = self.api.fetch_prices(instruments) if instruments else dict(prices=[], homeConversions=[])
+        if response is None:
+            return None
+        prices = {p["instrument"]: (float(p["bids"][0]["price"]) + float(p["asks"][0]["price"])) / 2
+                  for p in response["prices"]}
+        conversions = {hc["currency"]: float(hc["positionValue"]) for hc in response["homeConversions"]}
+
+        snapshot = RiskSnapshot.build(nav, positions, prices, conversions)
+        for currency, value in snapshot.net_exposure().items():
+            CURRENCY_EXPOSURE.set(value, currency=currency)
+        self.snapshot = snapshot
+        return snapshot
+
+    @property
+    def limit(self) -> Optional[float]:
+        """Maximum net exposure per currency, in home currency."""
+        if self.max_currency_exposure is None or self.snapshot is None:
+            return None
+        return self.max_currency_exposure * self.snapshot.nav
+
+    def take(self, pair: str, units: float) -> float:
+        """
+        ``units`` scaled down to the headroom of the pair's currencies, and
+        recorded as exposure for the rest of the cycle.
+        """
+        snapshot = self.snapshot
+        if snapshot is None or pair not in snapshot.instruments or units == 0:
+            return units
+        limit = self.limit
+        with self._lock:
+            changes = snapshot.deltas(pair, units)
+            scale = 1.0
+            if limit is not None:
+                scale = min(_scale_to_limit(snapshot.net[column], delta, limit) for column, delta in changes)
+            for column, delta in changes:
+                if not np.isnan(delta):
+                    snapshot.net[column] += delta * scale
+        return units * scale
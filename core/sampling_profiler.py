@@ -0,0 +1,145 @@
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional, Tuple
+
+IDLE = "idle"
+
+
+class SamplingProfiler:
+    """
+    Samples the stacks of every thread at a fixed interval while switched on.
+
+    Meant to stay available in the live bot: nothing runs while it is off, and
+    while it is on a daemon thread reads ``sys._current_frames()`` every
+    ``interval`` seconds, which costs the other threads a few microseconds per
+    sample. Each sample is tagged with the cycle set by :meth:`set_cycle`
+    (``idle`` between cycles) and counted as a collapsed stack; on
+    :meth:`stop` the counts are written as ``cycle=<tag>;<thread>;<frames> <count>``
+    lines, the input of flamegraph.pl and speedscope.
+
+    It is switched from outside the process, without restarting:
+
+    - ``kill -USR1 <pid>`` toggles it, see :meth:`install_signal`;
+    - creating ``control_file`` switches it on and removing it switches it off.
+
+    Both only request the switch; :meth:`poll`, called from the main loop, acts on it.
+
+    Example:
+        >>> profiler = SamplingProfiler("logs/bot/profiles", control_file="logs/bot/profile.on")
+        >>> profiler.install_signal()
+        >>> while True:
+        ...     profiler.poll()
+        ...     profiler.set_cycle("cycle-12")
+    """
+
+    def __init__(self, output_dir: str, control_file: Optional[str] = None, interval: float = 0.005) -> None:
+        self.output_dir = output_dir
+        self.control_file = control_file
+        self.interval = interval
+        self.cycle = IDLE
+        self.samples: Counter = Counter()
+        self.sample_count = 0
+
+        self._signal_on = False
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._started_at: Optional[float] = None
+        self._labels: Dict[object, str] = {}
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def set_cycle(self, cycle: Optional[str]) -> None:
+        """Tag the samples taken from now on; None goes back to ``idle``."""
+        self.cycle = cycle or IDLE
+
+    def install_signal(self, signum: int = getattr(signal, "SIGUSR1", 0)) -> bool:
+        """Toggle on ``signum``; only possible from the main thread on POSIX."""
+        if not signum or threading.current_thread() is not threading.main_thread():
+            return False
+        signal.signal(signum, self._on_signal)
+        return True
+
+    def _on_signal(self, signum, frame) -> None:
+        # only flip a flag: the handler interrupts the main thread, which may hold the log locks
+        self._signal_on = not self._signal_on
+
+    def poll(self) -> Optional[str]:
+        """
+        Start or stop as requested by the signal or the control file.
+
+        Returns:
+            The path of the profile written, when this call stopped the profiler
+        """
+        wanted = self._signal_on or (self.control_file is not None and os.path.exists(self.control_file))
+        if wanted and not self.running:
+            self.start()
+        elif not wanted and self.running:
+            return self.stop()
+        return None
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self.samples = Counter()
+        self.sample_count = 0
+        self._started_at = time.time()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample_loop, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> Optional[str]:
+        """Stop sampling and write the collapsed stacks; returns the file written."""
+        thread, self._thread = self._thread, None
+        if thread is None:
+            return None
+        self._stop.set()
+        thread.join()
+        self._signal_on = False
+        return self.write()
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            label = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+            self._labels[code] = label
+        return label
+
+    def _sample_loop(self) -> None:
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            cycle = self.cycle
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(self._label(frame.f_code))
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                stack.append(f"cycle={cycle}")
+                self.samples[";".join(reversed(stack))] += 1
+            self.sample_count += 1
+
+    def write(self) -> Optional[str]:
+        if not self.samples:
+            return None
+        os.makedirs(self.output_dir, exist_ok=True)
+        path = os.path.join(self.output_dir, f"{time.strftime('%H%M%S', time.localtime(self._started_at))}.folded")
+        with open(path, "w") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+        return path
+
+    def top(self, n: int = 10) -> Tuple[Tuple[str, int], ...]:
+        """The ``n`` functions seen most often at the top of a stack."""
+        leaves: Counter = Counter()
+        for stack, count in self.samples.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        return tuple(leaves.most_common(n))
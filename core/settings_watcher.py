@@ -0,0 +1,54 @@
+import os
+import runpy
+from typing import Optional, Tuple
+
+from models.TradeSettings import TradeSettings
+
+
+class SettingsWatcher:
+    """
+    Watches a settings module such as ``test_settings_2.py`` for changes.
+
+    The file is executed in a fresh namespace and its ``SETTINGS`` dict turned
+    into a new ``TradeSettings``; nothing is handed to the bot unless that
+    whole step succeeds, so a half-saved or broken file leaves the running
+    settings untouched and is retried on its next change.
+
+    Example:
+        >>> watcher = SettingsWatcher("test_settings_2.py")
+        >>> if (trade_settings := watcher.poll()) is not None:
+        ...     bot.apply_settings(trade_settings)
+    """
+
+    def __init__(self, path: str, variable: str = "SETTINGS") -> None:
+        self.path = path
+        self.variable = variable
+        self._signature = self._stat()
+
+    def _stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def load(self) -> TradeSettings:
+        raw_settings = runpy.run_path(self.path)[self.variable]
+        for pair, settings in raw_settings["pairs"].items():
+            if "granularity" not in settings:
+                raise ValueError(f"{pair} has no granularity")
+        return TradeSettings(raw_settings)
+
+    def poll(self) -> Optional[TradeSettings]:
+        """
+        Returns:
+            The new settings if the file changed since the last poll, else None
+
+        Raises:
+            Any error from executing or validating the changed file
+        """
+        signature = self._stat()
+        if signature is None or signature == self._signature:
+            return None
+        self._signature = signature
+        return self.load()
@@ -0,0 +1,183 @@
+import concurrent.futures
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_numeric_dtype
+
+from api.OandaApi import OandaApi
+from config.constants import GRANULARITY_SECONDS, MAX_CANDLES_PER_REQUEST
+from core.candle_manager import CandleTiming
+from core.log_wrapper import LogManager
+from core.metrics import REGISTRY
+from core.pair_config import PairConfig
+from core.tick_aggregator import TickAggregator
+from models.indicator_frame import IndicatorFrame
+from utils.no_op import no_op
+
+# bars the indicators are recomputed over when the final bar is patched in; the
+# longest window is 200 bars and the exponential averages forget a bar within a few hundred
+PATCH_TAIL = 1000
+# candles fetched at the close to read the final bar
+PATCH_COUNT = 2
+
+# patched: only the last bar recomputed; recomputed: the whole frame recomputed
+# on the patched candles; missed: no usable frame, the pair went the normal way
+SPECULATIVE_FRAMES = REGISTRY.counter("speculative_frames_total",
+                                      "Pairs at a candle close by use of the frame computed before it", ["result"])
+
+Prepare = Callable[[pd.DataFrame, PairConfig, Callable[[str], None]], IndicatorFrame]
+
+
+@dataclass
+class SpeculativeFrame:
+    # start of the candle that was still forming when the frame was computed
+    bar_time: datetime
+    candles: pd.DataFrame
+    prepared: IndicatorFrame
+    computed_at: float
+
+
+class SpeculativePrecomputer:
+    """
+    Computes a pair's indicator frame on the forming candle shortly before it closes.
+
+    :meth:`poll`, called from the main loop, starts a background computation for
+    every pair whose candle closes within ``lead`` seconds: it fetches the
+    candles including the forming one and runs ``prepare`` on them. When the
+    close is detected, :meth:`patch` fetches only the last two candles, writes
+    the final values of the bar into the frame and recomputes the indicators of
+    that one bar over the last ``tail`` bars. The rest of the frame is
+    unchanged, since earlier bars were already complete. With a
+    ``tick_aggregator``, live pairs read both from the candles built locally
+    from the pricing stream instead.
+
+    The patch checks itself: the recomputed next-to-last bar must match the
+    pre-computed one, otherwise the whole frame is recomputed on the patched
+    candles. A frame computed on another candle than the one that closed is not
+    used, and the pair is processed as without this mode.
+
+    Example:
+        >>> speculative = SpeculativePrecomputer(api, bot.prepare_indicators, log_manager, lead=20)
+        >>> speculative.poll(candle_manager.timings, pair_configs)  # every loop
+        >>> prepared = speculative.patch("EUR_USD", pair_config, timing.last_time, pair_logger)
+    """
+
+    def __init__(self, api_client: OandaApi, prepare: Prepare, logger: LogManager, lead: Optional[float] = None,
+                 tail: int = PATCH_TAIL, max_workers: int = 4,
+                 tick_aggregator: Optional[TickAggregator] = None) -> None:
+        self.api = api_client
+        self.tick_aggregator = tick_aggregator
+        self.prepare = prepare
+        self.logger = logger
+        self.lead = lead
+        self.tail = tail
+
+        self._lock = threading.Lock()
+        self._frames: Dict[str, SpeculativeFrame] = {}
+        self._scheduled: Dict[str, datetime] = {}
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers,
+                                                               thread_name_prefix="speculative")
+
+    def poll(self, timings: Dict[str, CandleTiming], pair_configs: Dict[str, PairConfig],
+             now: Optional[float] = None) -> None:
+        """Start the pre-computation of the pairs whose candle closes within ``lead`` seconds."""
+        if self.lead is None:
+            return
+        now = time.time() if now is None else now
+        for pair, timing in list(timings.items()):
+            pair_config = pair_configs.get(pair)
+            seconds = GRANULARITY_SECONDS.get(timing.granularity)
+            if pair_config is None or not timing.completed_only or not seconds:
+                continue
+            bar_time = timing.last_time + timedelta(seconds=seconds)
+            if not 0 < bar_time.timestamp() + seconds - now <= self.lead:
+                continue
+            with self._lock:
+                # once per candle, also when the fetch showed no forming candle (market closed)
+                if self._scheduled.get(pair) == bar_time:
+                    continue
+                self._scheduled[pair] = bar_time
+            self._executor.submit(self._precompute, pair, pair_config, bar_time)
+
+    def _precompute(self, pair: str, pair_config: PairConfig, bar_time: datetime) -> None:
+        try:
+            candles = self._get_candles(pair, pair_config.granularity, False, MAX_CANDLES_PER_REQUEST)
+            if candles is None or candles.empty or candles["time"].iloc[-1] != bar_time:
+                return
+            raw = candles.copy()
+            prepared = self.prepare(candles, pair_config, no_op)
+            with self._lock:
+                self._frames[pair] = SpeculativeFrame(bar_time, raw, prepared, time.time())
+        except Exception as e:
+            self.logger.log_to_error(f"Error pre-computing {pair}: {str(e)}")
+
+    def _get_candles(self, pair: str, granularity: str, completed_only: bool, count: int) -> Optional[pd.DataFrame]:
+        if self.tick_aggregator is not None:
+            candles = self.tick_aggregator.get_live_candles(pair, granularity, completed_only, count)
+            if candles is not None:
+                return candles
+        return self.api.get_candles_df(pair, completed_only=completed_only, granularity=granularity, count=count)
+
+    def has(self, pair: str, bar_time: Optional[datetime] = None) -> bool:
+        with self._lock:
+            frame = self._frames.get(pair)
+        return frame is not None and (bar_time is None or frame.bar_time == bar_time)
+
+    def discard(self, pair: str) -> None:
+        with self._lock:
+            self._frames.pop(pair, None)
+            self._scheduled.pop(pair, None)
+
+    def patch(self, pair: str, pair_config: PairConfig, bar_time: datetime,
+              pair_logger: Callable[[str], None]) -> Optional[IndicatorFrame]:
+        """
+        The indicator frame of the candle starting at ``bar_time``, which just
+        closed, or None when no frame was pre-computed on it.
+        """
+        with self._lock:
+            frame = self._frames.pop(pair, None)
+        if frame is None or frame.bar_time != bar_time:
+            SPECULATIVE_FRAMES.inc(result="missed")
+            return None
+
+        final = self._get_candles(pair, pair_config.granularity, True, PATCH_COUNT)
+        if final is None or final.empty or final["time"].iloc[-1] != bar_time:
+            SPECULATIVE_FRAMES.inc(result="missed")
+            return None
+
+        raw = frame.candles
+        last_index = raw.index[-1]
+        for col in final.columns:
+            if col != "time" and col in raw.columns:
+                raw.at[last_index, col] = final[col].iloc[-1]
+
+        patched = self.prepare(raw.iloc[-self.tail:].copy(), pair_config, pair_logger)
+        candles = frame.prepared.candles
+        if not self._matches(patched.candles, candles):
+            SPECULATIVE_FRAMES.inc(result="recomputed")
+            pair_logger(f"speculative frame of {bar_time} did not match its recomputed tail, recomputing it")
+            return self.prepare(raw.copy(), pair_config, pair_logger)
+
+        last = patched.candles.iloc[-1]
+        for col in patched.candles.columns:
+            candles.at[last_index, col] = last[col]
+        SPECULATIVE_FRAMES.inc(result="patched")
+        pair_logger(f"speculative frame computed {time.time() - frame.computed_at:.1f}s before the patch")
+        return IndicatorFrame(candles=candles, rsi=patched.rsi, heikin_ashi=patched.heikin_ashi)
+
+    @staticmethod
+    def _matches(tail: pd.DataFrame, full: pd.DataFrame) -> bool:
+        """Whether the indicators of the next-to-last bar agree, i.e. ``tail`` was long enough."""
+        if len(tail) < 2:
+            return False
+        columns = [col for col in tail.columns if col in full.columns and is_numeric_dtype(tail[col])]
+        return np.allclose(tail[columns].iloc[-2].to_numpy(dtype=float), full[columns].iloc[-2].to_numpy(dtype=float),
+                           rtol=1e-9, atol=1e-12, equal_nan=True)
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
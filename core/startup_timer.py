@@ -0,0 +1,57 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+
+
+class StartupTimer:
+    """
+    Wall clock time of each startup stage.
+
+    Stages may overlap (they run on separate threads), so the total is the time
+    since ``started`` rather than the sum of the stages. Create it before the
+    heavy imports to include them:
+
+    Example:
+        >>> timer = StartupTimer()
+        >>> import pandas
+        >>> timer.mark("imports")
+        >>> with timer.stage("instruments"):
+        ...     instruments = base_api.get_all_instruments()
+        >>> print(timer.format_report())
+    """
+
+    def __init__(self, started: Optional[float] = None) -> None:
+        self.started = time.perf_counter() if started is None else started
+        self.stages: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def mark(self, name: str) -> None:
+        """Record a stage that started with the timer and ends now."""
+        with self._lock:
+            self.stages[name] = time.perf_counter() - self.started
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.stages[name] = time.perf_counter() - start
+
+    def wrap(self, name: str, fn: Callable[..., Any]) -> Callable[..., Any]:
+        """``fn`` timed as stage ``name``, e.g. to submit to an executor."""
+        def timed(*args: Any, **kwargs: Any) -> Any:
+            with self.stage(name):
+                return fn(*args, **kwargs)
+        return timed
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def format_report(self) -> str:
+        with self._lock:
+            stages = ", ".join(f"{name} {seconds:.3f}s" for name, seconds in self.stages.items())
+        return f"Startup took {self.elapsed:.3f}s ({stages})"
@@ -0,0 +1,182 @@
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, Protocol, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from config.constants import ATR_KEY
+from core.pair_config import PairConfig
+from models.strategy_params import StrategyParams
+from utils.stop_loss import get_stop_loss_series
+
+# rejection codes of HeikenAshiStrategy, in the order the filters are checked
+ACCEPTED, SHORT_ONLY, LONG_ONLY, TREND, RSI_HIGH, RSI_LOW, ATR_RISK = range(7)
+
+
+@dataclass
+class StrategyState:
+    """What a strategy knows about a pair besides its bars."""
+    pair_config: PairConfig
+    pip_location_precision: int
+    current_units: float = 0.0
+
+
+@dataclass
+class StrategyDecision:
+    """
+    The outcome of a strategy on the last bar.
+
+    ``trigger`` is the raw entry trigger, also used to book profit on an
+    opposite position; ``signal`` is the trigger left after the entry filters,
+    0 when one of them rejected it, with ``reason`` saying which.
+    """
+    strategy: str
+    trigger: int = 0
+    signal: int = 0
+    sl_price: Optional[float] = None
+    take_profit: Optional[float] = None
+    reason: Optional[str] = None
+
+
+class Strategy(Protocol):
+    """
+    A trading strategy evaluated the same way live and over history.
+
+    ``inputs`` are the indicator columns the strategy reads; they are computed
+    once per pair and shared by every strategy registered on it. Columns only
+    this strategy needs, such as its stop levels, come from :meth:`features`.
+    :meth:`signals` evaluates every bar of a frame holding both, and
+    :meth:`decide` the last bar in the live loop, with the same code.
+    """
+    name: str
+    inputs: Tuple[str, ...]
+
+    def features(self, frame: pd.DataFrame, state: StrategyState) -> pd.DataFrame:
+        """Strategy specific columns for every bar of ``frame``."""
+        ...
+
+    def signals(self, frame: pd.DataFrame, state: StrategyState) -> pd.DataFrame:
+        """``trigger`` and ``signal`` columns for every bar of a frame holding the inputs and features."""
+        ...
+
+    def decide(self, last_row: pd.Series, state: StrategyState) -> StrategyDecision:
+        ...
+
+
+class HeikenAshiStrategy:
+    """
+    Enter on a fresh Heiken-Ashi streak whose candle opened at its extreme, in
+    the direction of the 30 bar trend and away from RSI extremes, with the stop
+    at the Donchian channel of ``initial_sl_period`` bars.
+
+    ``atr_risk_filter``, when set, also rejects entries whose stop is further
+    than that many ATRs away.
+    """
+
+    name = "heiken_ashi"
+    inputs = ("ha_streak", "ha_open_at_extreme", "net_trend_30", "rsi", ATR_KEY,
+              "mid_c", "mid_h", "mid_l", "ask_c", "bid_c")
+    # what the trigger and the filters read, out of the inputs and features
+    _columns = ("ha_streak", "ha_open_at_extreme", "net_trend_30", "rsi", ATR_KEY, "sl_gap_long", "sl_gap_short")
+
+    def __init__(self, params: StrategyParams) -> None:
+        self.params = params
+
+    def features(self, frame: pd.DataFrame, state: StrategyState) -> pd.DataFrame:
+        columns: Dict[str, np.ndarray] = {}
+        for direction, suffix in ((1, "long"), (-1, "short")):
+            sl_price, take_profit, sl_gap = get_stop_loss_series(
+                np.full(len(frame), direction), frame, state.pip_location_precision,
+                sl_period=self.params.initial_sl_period, tp_multiple=self.params.tp_multiple)
+            columns[f"sl_{suffix}"] = sl_price
+            columns[f"tp_{suffix}"] = take_profit
+            columns[f"sl_gap_{suffix}"] = sl_gap
+        return pd.DataFrame(columns, index=frame.index)
+
+    def _evaluate(self, columns: Dict[str, np.ndarray],
+                  pair_config: PairConfig) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Trigger, filtered signal and rejection code of every bar."""
+        params = self.params
+        streak = columns["ha_streak"]
+        fired = (np.abs(streak) <= params.heiken_ashi_streak) & (columns["ha_open_at_extreme"] == 1)
+        trigger = np.where(fired, np.sign(streak), 0).astype(int)
+
+        rsi = columns["rsi"]
+        rejections = [
+            (trigger == 1) & pair_config.short_only,
+            (trigger == -1) & pair_config.long_only,
+            np.sign(trigger) != np.sign(columns["net_trend_30"]),
+            (trigger > 0) & (rsi > params.rsi_overbought),
+            (trigger < 0) & (rsi < params.rsi_oversold),
+        ]
+        if params.atr_risk_filter is not None:
+            sl_gap = np.where(trigger > 0, columns["sl_gap_long"], columns["sl_gap_short"])
+            rejections.append(~(sl_gap <= params.atr_risk_filter * columns[ATR_KEY]))
+        else:
+            rejections.append(np.zeros(len(trigger), dtype=bool))
+
+        code = np.select(rejections, [SHORT_ONLY, LONG_ONLY, TREND, RSI_HIGH, RSI_LOW, ATR_RISK], ACCEPTED)
+        signal = np.where(code == ACCEPTED, trigger, 0).astype(int)
+        return trigger, signal, code
+
+    def signals(self, frame: pd.DataFrame, state: StrategyState) -> pd.DataFrame:
+        columns = {col: frame[col].to_numpy() for col in self._columns}
+        trigger, signal, _ = self._evaluate(columns, state.pair_config)
+        return pd.DataFrame({"trigger": trigger, "signal": signal}, index=frame.index)
+
+    def decide(self, last_row: pd.Series, state: StrategyState) -> StrategyDecision:
+        columns = {col: np.array([last_row[col]]) for col in self._columns}
+        trigger, signal, code = (int(values[0]) for values in self._evaluate(columns, state.pair_config))
+        decision = StrategyDecision(self.name, trigger=trigger, signal=signal)
+        if trigger == 0:
+            return decision
+        if code == ACCEPTED:
+            suffix = "long" if trigger > 0 else "short"
+            decision.sl_price = float(last_row[f"sl_{suffix}"])
+            decision.take_profit = float(last_row[f"tp_{suffix}"])
+        else:
+            decision.reason = self._reason(code, trigger, last_row, state.pair_config)
+        return decision
+
+    def _reason(self, code: int, trigger: int, row: pd.Series, pair_config: PairConfig) -> str:
+        if code == SHORT_ONLY:
+            return f"short_only: {pair_config.short_only}, skipping trade"
+        if code == LONG_ONLY:
+            return f"long_only: {pair_config.long_only}, skipping trade"
+        if code == TREND:
+            return f"sma_trend_30: {row['net_trend_30']} does not match signal: {trigger}, skipping trade"
+        if code == RSI_HIGH:
+            return f"rsi: {row['rsi']} is too high, skipping trade"
+        if code == RSI_LOW:
+            return f"rsi: {row['rsi']} is too low, skipping trade"
+        sl_gap = row["sl_gap_long"] if trigger > 0 else row["sl_gap_short"]
+        return f"sl_gap: {sl_gap} is more than {self.params.atr_risk_filter} ATR ({row[ATR_KEY]}), skipping trade"
+
+
+StrategyFactory = Callable[[StrategyParams], Strategy]
+
+STRATEGIES: Dict[str, StrategyFactory] = {
+    HeikenAshiStrategy.name: HeikenAshiStrategy,
+}
+DEFAULT_STRATEGIES: Tuple[str, ...] = (HeikenAshiStrategy.name,)
+
+
+def register_strategy(name: str, factory: StrategyFactory) -> None:
+    """Make a strategy available to pairs listing ``name`` in their ``strategies`` setting."""
+    STRATEGIES[name] = factory
+
+
+def combine_decisions(decisions: Sequence[StrategyDecision]) -> StrategyDecision:
+    """
+    The decision acted on when several strategies run on a pair: the first one,
+    in the pair's order, whose signal survived its filters, otherwise the first
+    one that triggered, so its rejection reason is logged and its trigger can
+    still book profit.
+    """
+    for decision in decisions:
+        if decision.signal != 0:
+            return decision
+    for decision in decisions:
+        if decision.trigger != 0:
+            return decision
+    return decisions[0]
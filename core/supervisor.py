@@ -0,0 +1,201 @@
+import hashlib
+import multiprocessing
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from api.OandaApi import OandaApi
+from core.StrategyManager import StrategyManager
+from core.base_api import BaseAPI
+from core.bot import Bot
+from core.candle_manager import CandleManager
+from core.log_wrapper import LogManager
+from core.metrics import MetricsServer
+from core.rate_limiter import SharedRateLimiter
+from models.TradeSettings import TradeSettings
+from models.strategy_params import StrategyParams
+
+
+@dataclass
+class WorkerSpec:
+    """Everything a worker process needs to build its own Bot; must stay picklable."""
+    account_id: str
+    api_key: str
+    url: str
+    bot_name: str
+    raw_settings: Dict[str, Any]
+    params: Optional[StrategyParams] = None
+
+
+def _stable_hash(pair: str) -> int:
+    # unlike hash(), the same in every process and run
+    return int.from_bytes(hashlib.blake2b(pair.encode(), digest_size=8).digest(), "big")
+
+
+def assign_shards(pair_settings: Dict[str, Dict[str, Any]], n_workers: int,
+                  granularity_workers: Optional[Dict[str, int]] = None) -> List[List[str]]:
+    """
+    Split pairs over ``n_workers`` shards.
+
+    A pair goes to the shard given by a stable hash of its name, which does not
+    depend on the other pairs or on the process, so adding a pair never moves
+    the others.
+    ``granularity_workers`` pins every pair of a granularity to one shard,
+    e.g. ``{"M5": 0}`` to keep the fast pairs away from the hourly ones.
+    """
+    granularity_workers = granularity_workers or {}
+    shards: List[List[str]] = [[] for _ in range(n_workers)]
+    for pair, settings in pair_settings.items():
+        pinned = granularity_workers.get(settings["granularity"])
+        index = pinned % n_workers if pinned is not None else _stable_hash(pair) % n_workers
+        shards[index].append(pair)
+    return shards
+
+
+def _run_worker(index: int, spec: WorkerSpec, pairs: List[str], tasks: Any, log_queue: Any,
+                rate_limiter: SharedRateLimiter) -> None:
+    raw_settings = {**spec.raw_settings, "pairs": {p: spec.raw_settings["pairs"][p] for p in pairs}}
+    if raw_settings.get("metrics_port") is not None:
+        # the supervisor serves metrics_port, each worker the ports after it
+        raw_settings["metrics_port"] += 1 + index
+    api_client = OandaApi(spec.account_id, spec.api_key, spec.url, rate_limiter=rate_limiter)
+    trade_settings = TradeSettings(raw_settings)
+    base_api = BaseAPI(api_client)
+    strategy_manager = StrategyManager(api_client, trade_settings, base_api=base_api, params=spec.params)
+    bot = Bot(trade_settings=trade_settings, bot_name=spec.bot_name, api_client=api_client,
+              strategy_manager=strategy_manager, base_api=base_api, log_queue=log_queue)
+
+    try:
+        while (task := tasks.get()) is not None:
+            ready, detected_at = task
+            for pair in ready:
+                # candles are detected by the supervisor; keep its timestamps for latency tracking
+                timing = bot.candle_manager.get_timing(pair)
+                if timing is not None:
+                    timing.detected_at = detected_at.get(pair)
+            bot.process_pairs(ready)
+    finally:
+        bot.order_dispatcher.shutdown()
+        if bot.transaction_stream is not None:
+            bot.transaction_stream.stop()
+
+
+class Supervisor:
+    """
+    Runs the pairs of one bot across worker processes.
+
+    The pairs are sharded with :func:`assign_shards` and every shard runs in its
+    own process with its own ``Bot``, so indicator work of pairs closing together
+    runs on separate cores instead of queueing on one interpreter lock.
+    The supervisor owns what must stay shared:
+
+    - scheduling: one ``CandleManager`` polls for new candles and sends each
+      worker the ready pairs of its shard;
+    - the account-level request rate: a :class:`SharedRateLimiter` used by every
+      worker's ``OandaApi``;
+    - logging: workers forward their log records and decisions to the
+      supervisor's ``LogManager``, the only writer of the log files.
+
+    A worker that dies is restarted on its own shard; the others carry on.
+
+    Example:
+        >>> spec = WorkerSpec(ACCOUNT_ID, API_KEY, OANDA_URL, "live_db_sm_v2", SETTINGS)
+        >>> Supervisor(spec).run()
+    """
+
+    def __init__(self, spec: WorkerSpec, n_workers: Optional[int] = None) -> None:
+        self.spec = spec
+        self.trade_settings = TradeSettings(spec.raw_settings)
+        self.polling_period = self.trade_settings.polling_period
+
+        # spawned, not forked: the supervisor already runs log and polling threads
+        self.context = multiprocessing.get_context("spawn")
+        n_workers = n_workers or self.trade_settings.workers or os.cpu_count()
+        self.shards = [s for s in assign_shards(self.trade_settings.pair_settings, n_workers,
+                                                self.trade_settings.granularity_workers) if s]
+        self.shard_of: Dict[str, int] = {pair: i for i, shard in enumerate(self.shards) for pair in shard}
+
+        self.rate_limiter = SharedRateLimiter(self.trade_settings.request_rate, context=self.context)
+        self.api_client = OandaApi(spec.account_id, spec.api_key, spec.url, rate_limiter=self.rate_limiter)
+
+        pairs = list(self.trade_settings.pairs)
+        self.logger = LogManager(spec.bot_name, pairs, queued=self.trade_settings.queued_logging,
+                                 console_echo=self.trade_settings.console_echo,
+                                 log_levels=self.trade_settings.log_levels)
+        self.log_queue = self.context.Queue()
+        self.log_receiver = self.logger.receive(self.log_queue)
+
+        self.candle_manager = CandleManager(
+            pairs=pairs,
+            api_client=self.api_client,
+            pair_settings=self.trade_settings.pair_settings,
+            logger=self.logger
+        )
+
+        self.metrics_server: Optional[MetricsServer] = None
+        if self.trade_settings.metrics_port is not None:
+            self.metrics_server = MetricsServer(port=self.trade_settings.metrics_port)
+            self.metrics_server.start()
+
+        self.tasks = [self.context.Queue() for _ in self.shards]
+        self.workers: List[Optional[multiprocessing.Process]] = [None] * len(self.shards)
+
+    def start_worker(self, index: int) -> None:
+        worker = self.context.Process(
+            target=_run_worker, name=f"{self.spec.bot_name}-worker-{index}",
+            args=(index, self.spec, self.shards[index], self.tasks[index], self.log_queue, self.rate_limiter),
+            daemon=True)
+        worker.start()
+        self.workers[index] = worker
+        self.logger.log_to_main(f"Started worker {index} (pid {worker.pid}) with pairs: {self.shards[index]}")
+
+    def check_workers(self) -> None:
+        """Restart the workers that have exited; the others are left alone."""
+        for index, worker in enumerate(self.workers):
+            if worker is not None and not worker.is_alive():
+                self.logger.log_to_error(f"Worker {index} exited with code {worker.exitcode}, restarting")
+                self.start_worker(index)
+
+    def dispatch(self, ready: List[str]) -> None:
+        by_shard: Dict[int, List[str]] = {}
+        for pair in ready:
+            by_shard.setdefault(self.shard_of[pair], []).append(pair)
+        for index, pairs in by_shard.items():
+            detected_at = {p: self.candle_manager.get_timing(p).detected_at for p in pairs}
+            self.tasks[index].put((pairs, detected_at))
+
+    def run(self) -> None:
+        for index in range(len(self.shards)):
+            self.start_worker(index)
+
+        try:
+            self.logger.log_to_main(f"Supervisor running {len(self.shards)} workers")
+            while True:
+                try:
+                    self.check_workers()
+                    if time.localtime().tm_sec % 5 < 2:
+                        ready = self.candle_manager.update_timings()
+                        if ready:
+                            self.logger.log_to_main(f"Processing pairs with new candles: {ready}")
+                            self.dispatch(ready)
+                except Exception as e:
+                    self.logger.log_to_error(f"Error in supervisor loop: {str(e)}")
+                time.sleep(self.polling_period)
+        finally:
+            self.stop()
+
+    def stop(self) -> None:
+        for index, worker in enumerate(self.workers):
+            if worker is not None and worker.is_alive():
+                self.tasks[index].put(None)
+        for worker in self.workers:
+            if worker is not None:
+                worker.join(timeout=30)
+                if worker.is_alive():
+                    worker.terminate()
+        self.log_queue.put(None)
+        self.log_receiver.join(timeout=10)
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+        self.logger.close()
@@ -0,0 +1,416 @@
+import concurrent.futures
+import threading
+import time
+from collections import Counter, deque
+from typing import Any, Deque, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+import pandas as pd
+
+from api.OandaApi import OandaApi
+from config.constants import GRANULARITY_SECONDS, MAX_CANDLES_PER_REQUEST
+from core.account_state import HEARTBEAT, STALE_AFTER_SECONDS
+from core.metrics import REGISTRY
+from utils.resample import PRICE_COLUMNS, get_bucket_starts
+
+PRICE = "PRICE"
+CANDLE_COLUMNS = ["time", "volume"] + PRICE_COLUMNS
+
+# seconds the wall clock must be past a bar's end before it is closed without a tick or heartbeat
+# after the end; covers ticks still on their way
+CLOSE_GRACE = 1.0
+# seconds between checks of the built candles against the REST ones, and candles checked each time
+RECONCILE_INTERVAL = 60
+RECONCILE_COUNT = 10
+
+TICKS = REGISTRY.counter("price_ticks_total", "Prices received on the pricing stream")
+# match: same prices as REST; corrected: prices replaced by the REST ones; added: bar missing locally
+RECONCILED_CANDLES = REGISTRY.counter("tick_candles_reconciled_total",
+                                      "Candles built from ticks checked against the REST candles", ["result"])
+
+
+def _to_utc(time: Any) -> pd.Timestamp:
+    time = pd.Timestamp(time)
+    return time.tz_convert("UTC") if time.tzinfo is not None else time.tz_localize("UTC")
+
+
+def _records(candles: pd.DataFrame) -> List[Dict[str, Any]]:
+    records = candles.to_dict("records")
+    for record in records:
+        record["time"] = _to_utc(record["time"])
+    return records
+
+
+class CandleBuilder:
+    """
+    Candles of one instrument and granularity, built from ticks.
+
+    Each tick extends the forming bar: mid, bid and ask each get open, high,
+    low and close, and the volume counts ticks, as in OANDA's candles. The bar
+    closes at the first tick or :meth:`close_until` time at or after its end.
+    Periods without ticks produce no bar. A tick arriving late for the bar that
+    just closed still updates that bar.
+    """
+
+    def __init__(self, granularity: str, history: int = MAX_CANDLES_PER_REQUEST) -> None:
+        self.granularity = granularity
+        self.step = pd.Timedelta(seconds=GRANULARITY_SECONDS[granularity])
+        self.bars: Deque[Dict[str, Any]] = deque(maxlen=history)
+        self.forming: Optional[Dict[str, Any]] = None
+        self.forming_end: Optional[pd.Timestamp] = None
+        # bars closed so far, read to tell a close happened
+        self.closed = 0
+        self._frame: Optional[pd.DataFrame] = None
+
+    def seed(self, candles: pd.DataFrame, forming: Optional[pd.DataFrame] = None) -> None:
+        """Start from REST candles: ``candles`` complete, ``forming`` the latest one, possibly still forming."""
+        self.bars.clear()
+        self.bars.extend(_records(candles))
+        self.forming = self.forming_end = None
+        self._frame = None
+        if forming is not None and not forming.empty:
+            bar = _records(forming.iloc[-1:])[0]
+            if not self.bars or bar["time"] > self.bars[-1]["time"]:
+                self.forming, self.forming_end = bar, bar["time"] + self.step
+
+    def add_tick(self, time: pd.Timestamp, bid: float, ask: float) -> None:
+        if self.forming is not None and time >= self.forming_end:
+            self._close()
+        if self.forming is not None:
+            self._update(self.forming, bid, ask)
+            return
+
+        if self.bars and time < self.bars[-1]["time"] + self.step:
+            if time >= self.bars[-1]["time"]:
+                self._update(self.bars[-1], bid, ask)
+                self._frame = None
+            return
+        start = get_bucket_starts(pd.Series([time]), self.granularity).iloc[0]
+        mid = (bid + ask) / 2
+        self.forming = dict(time=start, volume=0)
+        for price, value in (("mid", mid), ("bid", bid), ("ask", ask)):
+            for ohlc in ("o", "h", "l", "c"):
+                self.forming[f"{price}_{ohlc}"] = value
+        self.forming_end = start + self.step
+        self._update(self.forming, bid, ask)
+
+    @staticmethod
+    def _update(bar: Dict[str, Any], bid: float, ask: float) -> None:
+        for price, value in (("mid", (bid + ask) / 2), ("bid", bid), ("ask", ask)):
+            bar[f"{price}_h"] = max(bar[f"{price}_h"], value)
+            bar[f"{price}_l"] = min(bar[f"{price}_l"], value)
+            bar[f"{price}_c"] = value
+        bar["volume"] += 1
+
+    def close_until(self, time: pd.Timestamp) -> bool:
+        """Close the forming bar if it ended by ``time``; whether it did."""
+        if self.forming is None or time < self.forming_end:
+            return False
+        self._close()
+        return True
+
+    def _close(self) -> None:
+        self.bars.append(self.forming)
+        self.forming = self.forming_end = None
+        self.closed += 1
+        self._frame = None
+
+    @property
+    def last_complete(self) -> Optional[pd.Timestamp]:
+        return self.bars[-1]["time"] if self.bars else None
+
+    def frame(self, completed_only: bool = True, count: Optional[int] = None) -> pd.DataFrame:
+        """Candles in the columns of ``OandaApi.get_candles_df``, with the forming bar unless ``completed_only``."""
+        if self._frame is None:
+            self._frame = pd.DataFrame.from_records(list(self.bars), columns=CANDLE_COLUMNS)
+        frame = self._frame
+        if not completed_only and self.forming is not None:
+            forming = pd.DataFrame.from_records([dict(self.forming)], columns=CANDLE_COLUMNS)
+            frame = pd.concat([frame, forming], ignore_index=True) if len(frame) else forming
+        if count is not None:
+            frame = frame.iloc[-count:].reset_index(drop=True)
+        return frame.copy()
+
+    def reconcile(self, candles: pd.DataFrame) -> Counter:
+        """Replace the bars at the times of ``candles``, complete REST candles, with them."""
+        results: Counter = Counter()
+        rest = _records(candles)
+        if not rest:
+            return results
+        if self.forming is not None and self.forming["time"] <= rest[-1]["time"]:
+            self._close()
+
+        local = {bar["time"]: bar for bar in self.bars if bar["time"] >= rest[0]["time"]}
+        missing = False
+        for record in rest:
+            bar = local.get(record["time"])
+            if bar is None:
+                if self.bars and record["time"] < self.bars[0]["time"]:
+                    continue
+                results["added"] += 1
+                missing = True
+            elif np.allclose([bar[col] for col in PRICE_COLUMNS], [record[col] for col in PRICE_COLUMNS],
+                             rtol=0, atol=1e-9):
+                results["match"] += 1
+            else:
+                results["corrected"] += 1
+            if bar is not None:
+                bar.update(record)
+            else:
+                local[record["time"]] = record
+
+        if missing:
+            older = [bar for bar in self.bars if bar["time"] < rest[0]["time"]]
+            self.bars = deque(older + sorted(local.values(), key=lambda bar: bar["time"]), maxlen=self.bars.maxlen)
+        # volumes are taken from REST even when the prices match
+        self._frame = None
+        return results
+
+
+class TickAggregator:
+    """
+    Candles of every pair built locally from the pricing stream, available the moment a bar ends.
+
+    Each pair and granularity is seeded with REST candles, including the one
+    still forming, and then extended by :meth:`on_message` with every price and
+    heartbeat of the stream. A heartbeat or tick time past a bar's end closes
+    the bar. :meth:`poll`, called from the main loop, also closes bars once the
+    wall clock is ``CLOSE_GRACE`` past their end. Every ``reconcile_interval``
+    seconds the last ``reconcile_count`` bars are compared with the REST
+    candles and replaced by them, so anything the stream missed or conflated
+    is corrected.
+
+    A pair is only served while the stream is connected, has been heard from
+    recently and the pair is seeded; otherwise callers fetch candles over REST.
+
+    Example:
+        >>> aggregator = TickAggregator(api_client, {"EUR_USD": ["M5"]})
+        >>> PriceStream(api_client, aggregator).start()
+        >>> aggregator.get_candles_df("EUR_USD", "M5", completed_only=False)  # forming bar last
+    """
+
+    def __init__(self, api_client: OandaApi, granularities: Dict[str, Iterable[str]],
+                 history: int = MAX_CANDLES_PER_REQUEST, reconcile_interval: float = RECONCILE_INTERVAL,
+                 reconcile_count: int = RECONCILE_COUNT, close_grace: float = CLOSE_GRACE) -> None:
+        self.api = api_client
+        self.history = history
+        self.reconcile_interval = reconcile_interval
+        self.reconcile_count = reconcile_count
+        self.close_grace = close_grace
+        self.connected: bool = False
+        self.last_message: float = 0.0
+
+        self._lock = threading.Lock()
+        self._builders: Dict[str, Dict[str, CandleBuilder]] = {}
+        self._seeded: Set[str] = set()
+        self._closed_seen = 0
+        self._last_reconcile = time.monotonic()
+        # set when the instruments change, so the stream reconnects with the new list
+        self.resubscribe = threading.Event()
+        self.add_pairs(granularities)
+
+    @property
+    def instruments(self) -> List[str]:
+        with self._lock:
+            return sorted(self._builders)
+
+    def add_pairs(self, granularities: Dict[str, Iterable[str]]) -> None:
+        """Build candles of new pairs, or start over for pairs given other granularities; seeded by :meth:`seed`."""
+        if not granularities:
+            return
+        with self._lock:
+            for pair, pair_granularities in granularities.items():
+                self._builders[pair] = {g: CandleBuilder(g, self.history) for g in pair_granularities}
+                self._seeded.discard(pair)
+        self.resubscribe.set()
+
+    def remove_pairs(self, pairs: Iterable[str]) -> None:
+        with self._lock:
+            removed = [pair for pair in pairs if self._builders.pop(pair, None) is not None]
+            self._seeded.difference_update(removed)
+        if removed:
+            self.resubscribe.set()
+
+    def _fetch_seed(self, pair: str, granularity: str) -> Optional[Tuple[pd.DataFrame, pd.DataFrame]]:
+        # forming candle first: if it closes in between, the complete candles hold it
+        forming = self.api.get_candles_df(pair, completed_only=False, granularity=granularity, count=1)
+        candles = self.api.get_candles_df(pair, completed_only=True, granularity=granularity, count=self.history)
+        if forming is None or candles is None:
+            return None
+        return candles, forming
+
+    def seed(self, pairs: Optional[Iterable[str]] = None) -> List[str]:
+        """Load the REST candles of ``pairs``, all by default; returns the pairs that could not be seeded."""
+        with self._lock:
+            pairs = list(self._builders) if pairs is None else [p for p in pairs if p in self._builders]
+            jobs = [(pair, g) for pair in pairs for g in self._builders[pair]]
+            for pair in pairs:
+                self._seeded.discard(pair)
+        if not jobs:
+            return []
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(32, len(jobs))) as executor:
+            fetched = list(executor.map(lambda job: self._fetch_seed(*job), jobs))
+
+        failed = {pair for (pair, _), result in zip(jobs, fetched) if result is None}
+        with self._lock:
+            for (pair, granularity), result in zip(jobs, fetched):
+                builder = self._builders.get(pair, {}).get(granularity)
+                if result is not None and builder is not None:
+                    builder.seed(*result)
+            self._seeded.update(p for p in pairs if p not in failed and p in self._builders)
+        return sorted(failed)
+
+    @property
+    def unseeded(self) -> List[str]:
+        with self._lock:
+            return sorted(p for p in self._builders if p not in self._seeded)
+
+    def mark_stale(self) -> None:
+        """Forget that the pairs are seeded, after ticks may have been missed."""
+        with self._lock:
+            self._seeded.clear()
+
+    def on_message(self, message: Dict[str, Any]) -> None:
+        """Apply a message of the pricing stream: a price of a pair, or a heartbeat."""
+        self.last_message = time.monotonic()
+        kind = message.get("type")
+        if kind == PRICE:
+            TICKS.inc()
+            bids, asks = message.get("bids"), message.get("asks")
+            if not bids or not asks:
+                return
+            self.on_tick(message["instrument"], _to_utc(message["time"]),
+                         float(bids[0]["price"]), float(asks[0]["price"]))
+        elif kind == HEARTBEAT:
+            self.roll(_to_utc(message["time"]))
+
+    def on_tick(self, pair: str, time: pd.Timestamp, bid: float, ask: float) -> None:
+        with self._lock:
+            for builder in self._builders.get(pair, {}).values():
+                builder.add_tick(time, bid, ask)
+
+    def roll(self, now: pd.Timestamp) -> None:
+        """Close the bars that ended by ``now``."""
+        with self._lock:
+            for builders in self._builders.values():
+                for builder in builders.values():
+                    builder.close_until(now)
+
+    def poll(self, now: Optional[float] = None) -> bool:
+        """
+        Close the bars the wall clock passed, reconcile when due; whether any
+        bar closed since the last poll.
+        """
+        now = time.time() if now is None else now
+        self.roll(pd.Timestamp(now - self.close_grace, unit="s", tz="UTC"))
+        if time.monotonic() - self._last_reconcile >= self.reconcile_interval:
+            self._last_reconcile = time.monotonic()
+            self.reconcile()
+        with self._lock:
+            closed = sum(b.closed for builders in self._builders.values() for b in builders.values())
+            has_closed, self._closed_seen = closed != self._closed_seen, closed
+        return has_closed
+
+    def reconcile(self, pairs: Optional[Iterable[str]] = None) -> Counter:
+        """Check the last ``reconcile_count`` bars of the seeded ``pairs`` (all by default) against REST."""
+        with self._lock:
+            pairs = [p for p in (self._seeded if pairs is None else pairs) if p in self._seeded]
+            jobs = [(pair, g) for pair in pairs for g in self._builders[pair]]
+        if not jobs:
+            return Counter()
+
+        def fetch(job: Tuple[str, str]) -> Optional[pd.DataFrame]:
+            pair, granularity = job
+            return self.api.get_candles_df(pair, completed_only=True, granularity=granularity,
+                                           count=self.reconcile_count)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(32, len(jobs))) as executor:
+            fetched = list(executor.map(fetch, jobs))
+
+        totals: Counter = Counter()
+        with self._lock:
+            for (pair, granularity), candles in zip(jobs, fetched):
+                builder = self._builders.get(pair, {}).get(granularity)
+                if candles is not None and not candles.empty and builder is not None:
+                    totals.update(builder.reconcile(candles))
+        for result, count in totals.items():
+            RECONCILED_CANDLES.inc(count, result=result)
+        return totals
+
+    def is_live(self, pair: str) -> bool:
+        """Whether the candles of ``pair`` are current: seeded, and the stream connected and recently heard from."""
+        return (self.connected and pair in self._seeded
+                and time.monotonic() - self.last_message < STALE_AFTER_SECONDS)
+
+    def last_complete(self, pair: str, granularity: str) -> Optional[pd.Timestamp]:
+        with self._lock:
+            builder = self._builders.get(pair, {}).get(granularity)
+            return builder.last_complete if builder is not None else None
+
+    def get_candles_df(self, pair: str, granularity: str, completed_only: bool = True,
+                       count: Optional[int] = None) -> Optional[pd.DataFrame]:
+        """Candles as ``OandaApi.get_candles_df`` returns them, None when ``pair`` is not built at ``granularity``."""
+        with self._lock:
+            builder = self._builders.get(pair, {}).get(granularity)
+            return builder.frame(completed_only, count) if builder is not None else None
+
+    def get_live_candles(self, pair: str, granularity: str, completed_only: bool = True,
+                         count: Optional[int] = None) -> Optional[pd.DataFrame]:
+        """Candles of ``pair`` while it is live, None when they are to be fetched over REST."""
+        if not self.is_live(pair):
+            return None
+        candles = self.get_candles_df(pair, granularity, completed_only, count)
+        return candles if candles is not None and not candles.empty else None
+
+
+class PriceStream:
+    """
+    Background thread feeding the pricing stream of the aggregator's pairs into a :class:`TickAggregator`.
+
+    Before every (re)connection the pairs not seeded are loaded over REST; a
+    dropped stream marks all of them stale first, since ticks were missed. When
+    pairs are added or removed the stream reconnects with the new list.
+    """
+
+    def __init__(self, api_client: OandaApi, aggregator: TickAggregator, reconnect_delay: float = 5.0) -> None:
+        self.api = api_client
+        self.aggregator = aggregator
+        self.reconnect_delay = reconnect_delay
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="price-stream", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self.aggregator.connected = False
+
+    def _run(self) -> None:
+        aggregator = self.aggregator
+        while not self._stop.is_set():
+            resubscribed = False
+            try:
+                aggregator.resubscribe.clear()
+                instruments = aggregator.instruments
+                if instruments:
+                    failed = aggregator.seed(aggregator.unseeded)
+                    if failed:
+                        print(f"Price stream: could not seed {failed}")
+                    for message in self.api.stream_prices(instruments):
+                        aggregator.connected = True
+                        aggregator.on_message(message)
+                        if self._stop.is_set():
+                            break
+                        if aggregator.resubscribe.is_set():
+                            resubscribed = True
+                            break
+            except Exception as e:
+                print(f"Price stream error: {e}")
+            aggregator.connected = False
+            if resubscribed:
+                continue
+            aggregator.mark_stale()
+            self._stop.wait(self.reconnect_delay)
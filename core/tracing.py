@@ -0,0 +1,151 @@
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    start: float
+    end: Optional[float] = None
+    thread_id: int = field(default_factory=threading.get_native_id)
+    thread_name: str = field(default_factory=lambda: threading.current_thread().name)
+    attrs: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def ids(self) -> str:
+        return f"{self.trace_id}:{self.span_id}"
+
+
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def current_ids() -> Optional[str]:
+    """``trace_id:span_id`` of the active span, for log lines; None outside a trace."""
+    span = _current_span.get()
+    return span.ids if span is not None else None
+
+
+def in_context(fn: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    ``fn`` bound to a copy of the caller's context, to submit to a thread pool.
+
+    Executor threads do not inherit context variables, so spans started in the
+    pool would otherwise not be linked to the span that submitted them.
+    """
+    context = contextvars.copy_context()
+
+    def run(*args: Any, **kwargs: Any) -> Any:
+        # a context can only be entered by one thread at a time, so each call runs in its own copy
+        return context.copy().run(fn, *args, **kwargs)
+    return run
+
+
+class Tracer:
+    """
+    Spans of cycles, pairs and requests, linked by trace and parent ids.
+
+    A trace starts with :meth:`trace`, one per candle-close cycle; every
+    :meth:`span` opened under it, on the same thread or on threads the work
+    was handed to through :func:`in_context`, becomes its child. Spans opened
+    outside a trace are not recorded, so the polling requests between cycles
+    cost nothing. Finished traces are taken with :meth:`pop` and written with
+    :func:`export_chrome_trace` for chrome://tracing or https://ui.perfetto.dev.
+
+    Example:
+        >>> with TRACER.trace("cycle") as root:
+        ...     with TRACER.span("process_pair", pair="EUR_USD"):
+        ...         ...
+        >>> export_chrome_trace(TRACER.pop(root.trace_id), "cycle.json")
+    """
+
+    def __init__(self, enabled: bool = False, max_traces: int = 100) -> None:
+        self.enabled = enabled
+        self.max_traces = max_traces
+        self._lock = threading.Lock()
+        self._spans: Dict[str, List[Span]] = {}
+
+    @staticmethod
+    def _new_id(n_bytes: int) -> str:
+        return os.urandom(n_bytes).hex()
+
+    def _finish(self, span: Span) -> None:
+        span.end = time.time()
+        with self._lock:
+            spans = self._spans.get(span.trace_id)
+            if spans is not None:
+                spans.append(span)
+
+    @contextmanager
+    def trace(self, name: str, **attrs: Any) -> Iterator[Optional[Span]]:
+        """Start a new trace with a root span; yields None when tracing is off."""
+        if not self.enabled:
+            yield None
+            return
+        span = Span(name, self._new_id(8), self._new_id(4), None, time.time(), attrs=attrs)
+        with self._lock:
+            # traces nobody popped, e.g. after an exception, are dropped oldest first
+            while len(self._spans) >= self.max_traces:
+                self._spans.pop(next(iter(self._spans)))
+            self._spans[span.trace_id] = []
+        token = _current_span.set(span)
+        try:
+            yield span
+        finally:
+            _current_span.reset(token)
+            self._finish(span)
+
+    @contextmanager
+    def span(self, name: str, **attrs: Any) -> Iterator[Optional[Span]]:
+        """A child of the active span; yields None, recording nothing, outside a trace."""
+        parent = _current_span.get()
+        if parent is None:
+            yield None
+            return
+        span = Span(name, parent.trace_id, self._new_id(4), parent.span_id, time.time(), attrs=attrs)
+        token = _current_span.set(span)
+        try:
+            yield span
+        finally:
+            _current_span.reset(token)
+            self._finish(span)
+
+    def pop(self, trace_id: str) -> List[Span]:
+        """The finished spans of a trace, which is then forgotten."""
+        with self._lock:
+            return self._spans.pop(trace_id, [])
+
+
+TRACER = Tracer()
+
+
+def export_chrome_trace(spans: List[Span], path: str) -> None:
+    """Write spans in the Chrome trace event format, one row per thread."""
+    pid = os.getpid()
+    events: List[Dict[str, Any]] = []
+    threads: Dict[int, str] = {}
+    for span in spans:
+        threads[span.thread_id] = span.thread_name
+        events.append(dict(
+            name=span.name, cat=span.name.split(" ")[0], ph="X", pid=pid, tid=span.thread_id,
+            ts=span.start * 1e6, dur=((span.end or span.start) - span.start) * 1e6,
+            args=dict(trace_id=span.trace_id, span_id=span.span_id, parent_id=span.parent_id,
+                      **{k: str(v) for k, v in span.attrs.items()})))
+    for tid, thread_name in threads.items():
+        events.append(dict(name="thread_name", ph="M", pid=pid, tid=tid, args=dict(name=thread_name)))
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(dict(traceEvents=events, displayTimeUnit="ms"), f)
@@ -0,0 +1,262 @@
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from config.constants import ATR_KEY
+from models.indicator_frame import IndicatorFrame
+from utils.heiken_ashi import TOL
+from utils.net_strength import INCREMENT
+
+SMA_PERIODS = [200, 100, 50, 30, 10]
+NET_TREND_PERIODS = [200, 100, 50, 30]
+HEIKEN_ASHI_BARS = 100
+
+
+def rolling_mean_2d(values: np.ndarray, window: int) -> np.ndarray:
+    """
+    Rolling mean along the bars axis of a (pairs x bars) array.
+
+    Runs ``DataFrame.rolling`` once over the transposed array, as
+    :func:`ewm_mean_2d` does, so the results are identical to
+    ``pd.Series.rolling(window=window).mean()``; a cumulative sum difference
+    drifts over thousands of bars and turns flat steps into tiny slopes.
+    """
+    frame = pd.DataFrame(values.T)
+    return frame.rolling(window=window).mean().to_numpy().T
+
+
+def ewm_mean_2d(values: np.ndarray, alpha: Optional[float] = None, adjust: bool = True, min_periods: int = 0,
+                span: Optional[float] = None) -> np.ndarray:
+    """
+    Exponentially weighted mean along the bars axis of a (pairs x bars) array.
+
+    Runs ``DataFrame.ewm`` once over the transposed array, so every pair is a
+    column of a single Cython pass and the results are identical to
+    ``pd.Series.ewm(alpha=alpha, span=span, adjust=adjust, min_periods=min_periods).mean()``.
+    Pass ``span`` where the per-pair code does: pandas derives the decay from
+    it differently than from the equivalent ``alpha``, in the last bit.
+    """
+    frame = pd.DataFrame(values.T)
+    return frame.ewm(alpha=alpha, span=span, adjust=adjust, min_periods=min_periods).mean().to_numpy().T
+
+
+def run_length_2d(flags: np.ndarray) -> np.ndarray:
+    """Length of the current run of equal values at every bar of a (pairs x bars) array."""
+    n_bars = flags.shape[1]
+    starts = np.ones(flags.shape, dtype=bool)
+    starts[:, 1:] = flags[:, 1:] != flags[:, :-1]
+    start_idx = np.where(starts, np.arange(n_bars), 0)
+    np.maximum.accumulate(start_idx, axis=1, out=start_idx)
+    return np.arange(n_bars) - start_idx + 1
+
+
+def ffill_2d(values: np.ndarray) -> np.ndarray:
+    """Forward-fill NaNs along the bars axis of a (pairs x bars) array."""
+    mask = np.isnan(values)
+    idx = np.where(~mask, np.arange(values.shape[1]), 0)
+    np.maximum.accumulate(idx, axis=1, out=idx)
+    filled = values[np.arange(values.shape[0])[:, None], idx]
+    # leading NaNs pick column 0, which is NaN itself when it was never set
+    return filled
+
+
+def atr_2d(high: np.ndarray, low: np.ndarray, close: np.ndarray, period: int = 14) -> np.ndarray:
+    """Batched equivalent of :func:`utils.atr.compute_atr`."""
+    prev_c = np.full(close.shape, np.nan)
+    prev_c[:, 1:] = close[:, :-1]
+    tr = np.fmax(np.fmax(high - low, np.abs(high - prev_c)), np.abs(prev_c - low))
+    return ewm_mean_2d(tr, span=period, adjust=True, min_periods=period)
+
+
+def rsi_2d(close: np.ndarray, n: int = 14) -> np.ndarray:
+    """Batched equivalent of :func:`indicators.rsi.get_rsi_series`."""
+    gains = np.zeros(close.shape)
+    gains[:, 1:] = np.diff(close, axis=1)
+    wins = np.where(gains >= 0, gains, 0.0)
+    losses = np.where(gains < 0, -gains, 0.0)
+
+    wins_rma = ewm_mean_2d(wins, alpha=1.0 / n, adjust=True, min_periods=n)
+    losses_rma = ewm_mean_2d(losses, alpha=1.0 / n, adjust=True, min_periods=n)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rs = wins_rma / losses_rma
+        return 100.0 - (100.0 / (1.0 + rs))
+
+
+def net_trend_2d(close: np.ndarray, horizon: int, offset: int = 5) -> np.ndarray:
+    """Batched equivalent of :func:`utils.net_sma_trend.get_net_trend`."""
+    total = np.zeros(close.shape)
+    count = np.zeros(close.shape)
+    for period in range(horizon - offset, horizon + 2):
+        sma = rolling_mean_2d(close, period)
+        sign = np.full(close.shape, np.nan)
+        sign[:, 1:] = np.sign(np.diff(sma, axis=1))
+        valid = ~np.isnan(sign)
+        total += np.where(valid, sign, 0.0)
+        count += valid
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        trend = total / count
+    trend = np.where((trend == 1) | (trend == -1), trend, np.nan)
+    return ffill_2d(trend)
+
+
+def strength_2d(close: np.ndarray, smas: Dict[int, np.ndarray],
+                trends: Dict[int, np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Batched equivalent of :func:`utils.net_strength.get_net_strength_for_row`.
+
+    Increments are accumulated in the same order as the scalar version so the
+    floating point results are identical.
+    """
+    bullish = np.zeros(close.shape)
+    bearish = np.zeros(close.shape)
+
+    def add(weight: float, bull_mask: np.ndarray, bear_mask: np.ndarray) -> None:
+        nonlocal bullish, bearish
+        bullish = np.where(bull_mask, bullish + weight, bullish)
+        bearish = np.where(bear_mask, bearish + weight, bearish)
+
+    sma_10 = smas[10]
+    for period, weight in ((200, 2 * INCREMENT), (100, INCREMENT)):
+        trend, sma = trends[period], smas[period]
+        add(weight, trend > 0, trend < 0)
+        add(weight, sma_10 > sma, sma_10 < sma)
+        add(weight, (close > sma) & (trend > 0), (close < sma) & (trend < 0))
+
+    for period, weight in ((50, 1.25 * INCREMENT), (30, INCREMENT)):
+        trend, sma = trends[period], smas[period]
+        add(weight, trend > 0, trend < 0)
+        add(weight, close > sma, close < sma)
+        add(weight, (close > sma) & (trend > 0), (close < sma) & (trend < 0))
+
+    return bearish, bullish
+
+
+def heiken_ashi_2d(o: np.ndarray, h: np.ndarray, l: np.ndarray, c: np.ndarray) -> Dict[str, np.ndarray]:
+    """Batched equivalent of :func:`utils.heiken_ashi.ohlc_to_heiken_ashi`."""
+    ha_close = (o + h + l + c) / 4
+
+    # ha_open[i] = 0.5 * (ha_open[i - 1] + ha_close[i - 1]), seeded with the first open,
+    # is an EWM with alpha 0.5 over [open_0, close_0, close_1, ...]
+    seeded = np.empty(o.shape)
+    seeded[:, 0] = o[:, 0]
+    seeded[:, 1:] = ha_close[:, :-1]
+    ha_open = ewm_mean_2d(seeded, alpha=0.5, adjust=False)
+
+    ha_high = np.maximum(np.maximum(ha_open, ha_close), h)
+    ha_low = np.minimum(np.minimum(ha_open, ha_close), l)
+    ha_green = ha_close > ha_open
+
+    ha_streak = run_length_2d(ha_green) * np.where(ha_green, 1, -1)
+
+    ha_open_at_extreme = (
+            (ha_green & (np.abs(ha_open - ha_low) < TOL)) |
+            (~ha_green & (np.abs(ha_open - ha_high) < TOL))
+    )
+
+    return {
+        'ha_open': ha_open,
+        'ha_high': ha_high,
+        'ha_low': ha_low,
+        'ha_close': ha_close,
+        'ha_green': ha_green.astype(int),
+        'ha_streak': ha_streak,
+        'ha_open_at_extreme': ha_open_at_extreme.astype(int),
+    }
+
+
+def compute_indicator_arrays(mid: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """
+    Compute every per-bar indicator used by ``Bot.process_pair`` on stacked
+    (pairs x bars) mid prices.
+
+    Args:
+        mid: Mapping of ``mid_o``/``mid_h``/``mid_l``/``mid_c`` to 2D arrays
+
+    Returns:
+        Mapping of candle column name to 2D array, plus ``rsi``
+    """
+    close = mid["mid_c"]
+    out: Dict[str, np.ndarray] = {
+        ATR_KEY: atr_2d(mid["mid_h"], mid["mid_l"], close, period=50),
+    }
+
+    smas = {period: rolling_mean_2d(close, period) for period in SMA_PERIODS}
+    trends = {period: net_trend_2d(close, period) for period in NET_TREND_PERIODS}
+    for period in SMA_PERIODS:
+        out[f"sma_{period}"] = smas[period]
+    for period in NET_TREND_PERIODS:
+        out[f"net_trend_{period}"] = trends[period]
+
+    bearish, bullish = strength_2d(close, smas, trends)
+    out["bearish_strength"] = bearish
+    out["bullish_strength"] = bullish
+    out["bearish_strength_s"] = ewm_mean_2d(bearish, span=10, adjust=False)
+    out["bullish_strength_s"] = ewm_mean_2d(bullish, span=10, adjust=False)
+    out["net_strength"] = bullish - bearish
+    out["net_strength_s"] = out["bullish_strength_s"] - out["bearish_strength_s"]
+    out["rsi"] = rsi_2d(close, 14)
+    return out
+
+
+def _group_frames(frames: Dict[str, pd.DataFrame], granularities: Dict[str, str]) -> Dict[Tuple[str, int], List[str]]:
+    # rows of a 2D batch must share a length; pairs with a short history get their own group
+    groups: Dict[Tuple[str, int], List[str]] = defaultdict(list)
+    for pair, df in frames.items():
+        if df is None or df.empty:
+            continue
+        groups[(granularities.get(pair, ""), len(df))].append(pair)
+    return groups
+
+
+def compute_batch_indicators(frames: Dict[str, pd.DataFrame],
+                             granularities: Dict[str, str]) -> Dict[str, IndicatorFrame]:
+    """
+    Compute indicators for many pairs at once.
+
+    Pairs sharing a granularity (and history length) are stacked into a
+    (pairs x bars) array so that each indicator is a handful of NumPy calls
+    for the whole group instead of one pandas pipeline per pair. Every pair
+    then gets its own row back as candle columns, an RSI value and a
+    Heiken-Ashi frame over the last ``HEIKEN_ASHI_BARS`` bars, exactly as
+    ``Bot.process_pair`` builds them.
+
+    Args:
+        frames: Candle frames keyed by pair, as returned by ``OandaApi.get_candles_df``
+        granularities: Granularity of each pair
+
+    Returns:
+        IndicatorFrame for every pair with a non-empty frame
+    """
+    results: Dict[str, IndicatorFrame] = {}
+
+    for _, pairs in _group_frames(frames, granularities).items():
+        mid = {
+            col: np.vstack([frames[p][col].to_numpy(dtype=float) for p in pairs])
+            for col in ("mid_o", "mid_h", "mid_l", "mid_c")
+        }
+        arrays = compute_indicator_arrays(mid)
+        tail = {col: values[:, -HEIKEN_ASHI_BARS:] for col, values in mid.items()}
+        ha = heiken_ashi_2d(tail["mid_o"], tail["mid_h"], tail["mid_l"], tail["mid_c"])
+
+        for row, pair in enumerate(pairs):
+            candles = frames[pair].copy()
+            for col, values in arrays.items():
+                if col != "rsi":
+                    candles[col] = values[row]
+
+            ha_index = candles.index[-HEIKEN_ASHI_BARS:]
+            heikin_ashi = pd.DataFrame({'time': candles['time'].iloc[-HEIKEN_ASHI_BARS:]}, index=ha_index)
+            for col, values in ha.items():
+                heikin_ashi[col] = values[row]
+
+            results[pair] = IndicatorFrame(
+                candles=candles,
+                rsi=float(arrays["rsi"][row, -1]),
+                heikin_ashi=heikin_ashi,
+            )
+
+    return results
@@ -0,0 +1,11 @@
+from api.OandaApi import OandaApi
+from api.market_data_service import MarketDataService
+from core.rate_limiter import RateLimiter
+import api.constants_test_1 as account_settings
+
+if __name__ == "__main__":
+    # one per host: bots built with api.market_data_client.MarketDataClient share its candle and price requests
+    api_client: OandaApi = OandaApi(api_key=account_settings.API_KEY, account_id=account_settings.ACCOUNT_ID,
+                                    url=account_settings.OANDA_URL, rate_limiter=RateLimiter(rate=50))
+    service = MarketDataService(api_client)
+    service.serve_forever()
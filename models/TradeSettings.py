@@ -1,6 +1,16 @@
 DEFAULT_STD_LOOKBACK = 36
 DEFAULT_VOL_TARGET = 0.2
 DEFAULT_POLLING_PERIOD = 30
+DEFAULT_REQUEST_RATE = 100
+# the main loop polls for candles every 5 seconds; a longer cycle delays the next poll
+DEFAULT_CYCLE_BUDGET = 5
+# instrument metadata (margin rates, precisions) changes rarely
+DEFAULT_INSTRUMENT_CACHE_TTL = 6 * 3600
+
+# read once at startup; changing them in a reloaded settings file needs a restart
+RESTART_ONLY_SETTINGS = ('queued_logging', 'console_echo', 'order_workers', 'use_transaction_stream',
+                         'workers', 'granularity_workers', 'request_rate', 'metrics_port', 'memory_check_interval',
+                         'rss_alert_mb', 'rss_growth_alert_mb', 'tick_candles')
 
 
 class TradeSettings:
@@ -11,7 +21,59 @@ class TradeSettings:
         self.polling_period = raw_settings.get('polling_period', DEFAULT_POLLING_PERIOD)
         self.vol_target = raw_settings.get('vol_target', DEFAULT_VOL_TARGET)
         self.reduce_only = raw_settings.get('reduce_only', False)
+        self.batch_indicators = raw_settings.get('batch_indicators', False)
+        self.queued_logging = raw_settings.get('queued_logging', True)
+        self.console_echo = raw_settings.get('console_echo', True)
+        self.log_levels = raw_settings.get('log_levels', {})
+        self.order_workers = raw_settings.get('order_workers', 8)
+        self.use_transaction_stream = raw_settings.get('use_transaction_stream', False)
+        self.fast_path = raw_settings.get('fast_path', False)
+        # supervisor mode: worker processes, granularity -> worker overrides and the account wide request rate
+        self.workers = raw_settings.get('workers', None)
+        self.granularity_workers = raw_settings.get('granularity_workers', {})
+        self.request_rate = raw_settings.get('request_rate', DEFAULT_REQUEST_RATE)
+        # seconds the instrument list cached on disk is reused at startup, 0 to always fetch it
+        self.instrument_cache_ttl = raw_settings.get('instrument_cache_ttl', DEFAULT_INSTRUMENT_CACHE_TTL)
+        # port of the local metrics endpoint, off when not set
+        self.metrics_port = raw_settings.get('metrics_port', None)
+        self.cycle_budget = raw_settings.get('cycle_budget', DEFAULT_CYCLE_BUDGET)
+        self.tracing = raw_settings.get('tracing', False)
+        # seconds between stack samples while the sampling profiler is on
+        self.profiler_interval = raw_settings.get('profiler_interval', 0.005)
+        # memory accounting: seconds between checks, alert thresholds in MB (off when not set)
+        self.memory_check_interval = raw_settings.get('memory_check_interval', 300)
+        self.rss_alert_mb = raw_settings.get('rss_alert_mb', None)
+        self.rss_growth_alert_mb = raw_settings.get('rss_growth_alert_mb', None)
+        # seconds before a candle close its indicators are pre-computed on the forming candle, off when not set
+        self.speculative_lead = raw_settings.get('speculative_lead', None)
+        # one account, position and price snapshot per cycle, capping each currency's net exposure at
+        # max_currency_exposure times the NAV when set
+        self.risk_engine = raw_settings.get('risk_engine', False)
+        self.max_currency_exposure = raw_settings.get('max_currency_exposure', None)
+        # spread threshold from the median spread of the current hour of the day (New York time) instead of all hours
+        self.spread_by_hour = raw_settings.get('spread_by_hour', False)
+        # candles built locally from the pricing stream, checked against the REST candles every
+        # tick_reconcile_interval seconds
+        self.tick_candles = raw_settings.get('tick_candles', False)
+        self.tick_reconcile_interval = raw_settings.get('tick_reconcile_interval', 60)
+        self.raw_settings = raw_settings
         pass
 
+    def diff_pairs(self, other: "TradeSettings"):
+        """
+        Compare the pairs of these settings with ``other``, the newer ones.
+
+        Returns:
+            ``(added, removed, changed)`` lists of pair names
+        """
+        added = [p for p in other.pair_settings if p not in self.pair_settings]
+        removed = [p for p in self.pair_settings if p not in other.pair_settings]
+        changed = [p for p in other.pair_settings
+                   if p in self.pair_settings and other.pair_settings[p] != self.pair_settings[p]]
+        return added, removed, changed
+
+    def restart_only_changes(self, other: "TradeSettings"):
+        return [k for k in RESTART_ONLY_SETTINGS if self.raw_settings.get(k) != other.raw_settings.get(k)]
+
     def __repr__(self):
         return f"{self.__class__.__name__}(std_lookback: {self.std_lookback}, polling_period: {self.polling_period}, vol_target: {self.vol_target}, pairs: {self.pairs})"
@@ -0,0 +1,38 @@
+from dataclasses import dataclass, astuple, fields
+from typing import Any, List, Optional, Tuple
+
+NO_TRIGGER = "no_trigger"
+REJECTED = "rejected"
+OPENED = "opened"
+ADDED = "added"
+MANAGED = "managed"
+ERROR = "error"
+
+
+@dataclass
+class DecisionRecord:
+    """What the bot saw and did for one pair on one candle; times are epoch seconds (UTC)."""
+    time: float
+    pair: str
+    granularity: str
+    bar_time: float
+    trigger: int = 0
+    bullish_strength: Optional[float] = None
+    bearish_strength: Optional[float] = None
+    net_strength: Optional[float] = None
+    rsi: Optional[float] = None
+    band_position_200: Optional[float] = None
+    band_position_50: Optional[float] = None
+    net_trend_30: Optional[int] = None
+    leverage_ratio: Optional[float] = None
+    current_units: float = 0
+    pl: float = 0
+    qty: float = 0
+    outcome: str = NO_TRIGGER
+
+    @classmethod
+    def field_names(cls) -> List[str]:
+        return [f.name for f in fields(cls)]
+
+    def to_row(self) -> Tuple[Any, ...]:
+        return astuple(self)
@@ -0,0 +1,10 @@
+from dataclasses import dataclass
+
+import pandas as pd
+
+
+@dataclass
+class IndicatorFrame:
+    candles: pd.DataFrame
+    rsi: float
+    heikin_ashi: pd.DataFrame
@@ -0,0 +1,21 @@
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, Optional
+
+from config.constants import HEIKEN_ASHI_STREAK, INITIAL_SL_PERIOD, TP_MULTIPLE, RSI_OVERBOUGHT, RSI_OVERSOLD, \
+    MAX_QTY_RATIO
+
+
+@dataclass(frozen=True)
+class StrategyParams:
+    heiken_ashi_streak: int = HEIKEN_ASHI_STREAK
+    initial_sl_period: int = INITIAL_SL_PERIOD
+    tp_multiple: float = TP_MULTIPLE
+    # off by default; set a multiple to reject entries whose stop is further
+    # than that many ATRs away, live and in backtests alike
+    atr_risk_filter: Optional[float] = None
+    rsi_overbought: float = RSI_OVERBOUGHT
+    rsi_oversold: float = RSI_OVERSOLD
+    max_qty_ratio: float = MAX_QTY_RATIO
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
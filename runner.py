@@ -1,11 +1,17 @@
+from core.startup_timer import StartupTimer
+startup_timer = StartupTimer()
+
 from api.OandaApi import OandaApi
 from core.base_api import BaseAPI
 from core.bot import Bot
+import test_settings_2
 from test_settings_2 import SETTINGS as settings
 from core.StrategyManager import StrategyManager
 import api.constants_test_1 as account_settings
 from models.TradeSettings import TradeSettings
 
+startup_timer.mark("imports")
+
 if __name__ == "__main__":
 
     api_client: OandaApi = OandaApi(api_key=account_settings.API_KEY, account_id=account_settings.ACCOUNT_ID,
@@ -14,5 +20,6 @@ if __name__ == "__main__":
     trade_settings = TradeSettings(settings)
     strategy_manager = StrategyManager(api_client, trade_settings, base_api=base_api)
     bot = Bot(api_client=api_client, trade_settings=trade_settings, bot_name="live_db_sm_v2",
-              strategy_manager=strategy_manager, base_api=base_api)
+              strategy_manager=strategy_manager, base_api=base_api, settings_path=test_settings_2.__file__,
+              startup_timer=startup_timer)
     bot.run()
\ No newline at end of file
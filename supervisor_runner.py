@@ -0,0 +1,9 @@
+from core.supervisor import Supervisor, WorkerSpec
+from test_settings_2 import SETTINGS as settings
+import api.constants_test_1 as account_settings
+
+if __name__ == "__main__":
+    # pairs are split over settings["workers"] processes, default one per core
+    spec = WorkerSpec(account_id=account_settings.ACCOUNT_ID, api_key=account_settings.API_KEY,
+                      url=account_settings.OANDA_URL, bot_name="live_db_sm_v2", raw_settings=settings)
+    Supervisor(spec).run()
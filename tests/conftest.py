@@ -0,0 +1,36 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def make_candles(n: int = 5000, seed: int = 0, start: str = "2024-01-02", freq: str = "15min",
+                 price: float = 1.1) -> pd.DataFrame:
+    """Candles in the columns of ``OandaApi.get_candles_df``, on 5 decimal prices with flat stretches."""
+    rng = np.random.default_rng(seed)
+    steps = rng.normal(0, 0.0004, n)
+    # flat runs, where an SMA step is exactly zero
+    steps[rng.random(n) < 0.3] = 0.0
+    mid_c = np.round(price + np.cumsum(steps), 5)
+    mid_o = np.round(np.concatenate([[price], mid_c[:-1]]), 5)
+    spread = np.round(rng.uniform(0.00005, 0.0003, n), 5)
+    mid_h = np.round(np.maximum(mid_o, mid_c) + np.round(rng.uniform(0, 0.0005, n), 5), 5)
+    mid_l = np.round(np.minimum(mid_o, mid_c) - np.round(rng.uniform(0, 0.0005, n), 5), 5)
+    candles = pd.DataFrame({
+        "time": pd.date_range(start, periods=n, freq=freq, tz="UTC"),
+        "volume": rng.integers(1, 500, n),
+    })
+    for name, values in (("o", mid_o), ("h", mid_h), ("l", mid_l), ("c", mid_c)):
+        candles[f"mid_{name}"] = values
+        candles[f"bid_{name}"] = np.round(values - spread / 2, 6)
+        candles[f"ask_{name}"] = np.round(values + spread / 2, 6)
+    return candles
+
+
+@pytest.fixture
+def candles() -> pd.DataFrame:
+    return make_candles()
@@ -0,0 +1,192 @@
+import time
+
+import pytest
+
+from api.OandaApi import OandaApi
+from api.local_stream_server import LocalStreamServer
+from core.account_state import AccountState, TransactionStream
+
+ACCOUNT_ID = "001-001-1"
+
+
+class StubApi:
+    def __init__(self, prices, conversions):
+        self.prices = prices
+        self.conversions = conversions
+        self.requests = []
+
+    def get_account_details(self):
+        return dict(balance="10000", lastTransactionID="100", orders=[], trades=[
+            dict(id="1", instrument="EUR_USD", price="1.1000", currentUnits="10000"),
+            dict(id="2", instrument="USD_JPY", price="150.00", currentUnits="-5000"),
+        ])
+
+    def fetch_prices(self, instruments):
+        self.requests.append(list(instruments))
+        if self.prices is None:
+            return None
+        return dict(prices=[dict(instrument=i, bids=[dict(price=str(self.prices[i] - 0.0001))],
+                                 asks=[dict(price=str(self.prices[i] + 0.0001))]) for i in instruments],
+                    homeConversions=[dict(currency=c, positionValue=str(v)) for c, v in self.conversions.items()])
+
+
+def test_mark_all_marks_every_pair_in_one_request():
+    api = StubApi({"EUR_USD": 1.1100, "USD_JPY": 149.00}, {"USD": 0.8, "JPY": 0.005, "EUR": 0.85})
+    state = AccountState(api)
+    assert state.seed()
+
+    # only EUR_USD marked by its own pair: USD_JPY still holds the P/L of its last close
+    state.mark("EUR_USD", 1.1050, 1 / 0.8)
+    nav = state.mark_all()
+
+    assert api.requests == [["EUR_USD", "USD_JPY"]]
+    eur_usd = (1.1100 - 1.1000) * 10000 * 0.8
+    usd_jpy = (149.00 - 150.00) * -5000 * 0.005
+    assert nav == pytest.approx(10000 + eur_usd + usd_jpy)
+    assert state.get_position("USD_JPY").unrealized_pl == pytest.approx(usd_jpy)
+
+
+def test_mark_all_without_prices():
+    state = AccountState(StubApi(None, {}))
+    state.seed()
+    assert state.mark_all() is None
+
+
+def wait_for(condition, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def server():
+    server = LocalStreamServer(ACCOUNT_ID, heartbeat_interval=0.2, account=dict(
+        balance="1000", lastTransactionID="2",
+        trades=[dict(id="1", instrument="EUR_USD", price="1.1000", currentUnits="1000")],
+        orders=[dict(id="2", type="STOP_LOSS", tradeID="1", price="1.0900")]))
+    server.start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def streamed(server):
+    api = OandaApi(ACCOUNT_ID, "token", server.url, stream_url=server.url)
+    state = AccountState(api)
+    assert state.seed()
+    stream = TransactionStream(api, state, reconnect_delay=0.5)
+    stream.start()
+    wait_for(lambda: state.connected)
+    yield state
+    stream.stop()
+
+
+def push(server, state, transaction):
+    """Push ``transaction`` and wait for the stream to apply it."""
+    pushed = server.push(transaction)
+    wait_for(lambda: state.last_transaction_id == int(pushed["id"]))
+    return pushed
+
+
+def next_id(server) -> str:
+    return str(server.last_transaction_id + 1)
+
+
+def test_seed(streamed):
+    state = streamed
+    assert state.balance == 1000 and state.last_transaction_id == 2
+    [trade] = state.get_trades("EUR_USD")
+    assert trade.currentUnits == 1000 and trade.stopLossOrder["price"] == "1.0900"
+
+
+def test_fills_open_reduce_and_close_trades(server, streamed):
+    state = streamed
+    opened = next_id(server)
+    push(server, state, dict(type="ORDER_FILL", instrument="EUR_USD", accountBalance="1000",
+                             tradeOpened=dict(tradeID=opened, units="500", price="1.1050")))
+    assert state.get_position("EUR_USD").units == 1500
+    assert sorted(t.id for t in state.get_trades("EUR_USD")) == ["1", opened]
+
+    push(server, state, dict(type="ORDER_FILL", instrument="EUR_USD", accountBalance="1010",
+                             tradeReduced=dict(tradeID="1", units="-400")))
+    assert state.get_position("EUR_USD").units == 1100
+    assert state.balance == 1010
+
+    # closes the rest of trade 1 and opens a short one with the remainder
+    short = next_id(server)
+    push(server, state, dict(type="ORDER_FILL", instrument="EUR_USD", accountBalance="1025",
+                             tradesClosed=[dict(tradeID="1", units="-600")],
+                             tradeOpened=dict(tradeID=short, units="-200", price="1.1100")))
+    assert sorted(t.id for t in state.get_trades("EUR_USD")) == [opened, short]
+    assert state.get_position("EUR_USD").units == 300
+    assert state.balance == 1025
+
+    push(server, state, dict(type="ORDER_FILL", instrument="EUR_USD", accountBalance="1030",
+                             tradesClosed=[dict(tradeID=opened, units="-500"), dict(tradeID=short, units="200")]))
+    assert state.get_trades("EUR_USD") == []
+    assert state.get_position("EUR_USD").units == 0
+    assert state.last_transaction_id == server.last_transaction_id
+
+
+def test_stop_orders_created_replaced_and_cancelled(server, streamed):
+    state = streamed
+    replaced = push(server, state, dict(type="STOP_LOSS_ORDER", tradeID="1", price="1.0950", replacesOrderID="2"))
+    [trade] = state.get_trades("EUR_USD")
+    assert trade.stopLossOrder == dict(id=replaced["id"], tradeID="1", price="1.0950")
+
+    # the replaced order is gone: its cancel does not touch the new one
+    push(server, state, dict(type="ORDER_CANCEL", orderID="2", reason="REPLACED"))
+    assert state.get_trades("EUR_USD")[0].stopLossOrder["id"] == replaced["id"]
+
+    trailing = push(server, state, dict(type="TRAILING_STOP_LOSS_ORDER", tradeID="1", distance="0.0050"))
+    trade = state.get_trades("EUR_USD")[0]
+    assert trade.trailingStopLossOrder == dict(id=trailing["id"], tradeID="1", distance="0.0050")
+
+    push(server, state, dict(type="ORDER_CANCEL", orderID=trailing["id"]))
+    trade = state.get_trades("EUR_USD")[0]
+    assert trade.trailingStopLossOrder is None
+    assert trade.stopLossOrder["id"] == replaced["id"]
+
+    push(server, state, dict(type="ORDER_CANCEL", orderID=replaced["id"]))
+    assert state.get_trades("EUR_USD")[0].stopLossOrder is None
+
+    # orders of unknown trades are ignored
+    push(server, state, dict(type="STOP_LOSS_ORDER", tradeID="99", price="1.2"))
+    assert [t.id for t in state.get_trades("EUR_USD")] == ["1"]
+
+
+def test_balance_from_financing_and_duplicates_skipped(server, streamed):
+    state = streamed
+    financing = push(server, state, dict(type="DAILY_FINANCING", financing="-0.52", accountBalance="999.48"))
+    assert state.balance == pytest.approx(999.48)
+
+    # a transaction already applied, e.g. seen again after catching up, changes nothing
+    state.apply(dict(financing, accountBalance="1"))
+    state.apply(dict(type="ORDER_FILL", id="1", instrument="EUR_USD",
+                     tradeOpened=dict(tradeID="1", units="5", price="1.0")))
+    assert state.balance == pytest.approx(999.48)
+    assert state.get_position("EUR_USD").units == 1000
+    assert state.last_transaction_id == int(financing["id"])
+
+
+def test_catch_up_after_the_stream_drops(server, streamed):
+    state = streamed
+    server.drop_streams()
+    wait_for(lambda: not state.connected)
+
+    # pushed while no stream is open, so only the catch up on reconnecting can deliver it
+    opened = next_id(server)
+    server.push(dict(type="ORDER_FILL", instrument="GBP_USD", accountBalance="1000",
+                     tradeOpened=dict(tradeID=opened, units="-300", price="1.2700")))
+    server.push(dict(type="DAILY_FINANCING", accountBalance="998"))
+
+    wait_for(lambda: state.connected and state.last_transaction_id == server.last_transaction_id)
+    assert state.get_position("GBP_USD").units == -300
+    assert state.balance == 998
+
+    # and the stream works again after reconnecting
+    push(server, state, dict(type="ORDER_FILL", instrument="GBP_USD", accountBalance="1001",
+                             tradesClosed=[dict(tradeID=opened, units="300")]))
+    assert state.get_trades("GBP_USD") == []
+    assert state.balance == 1001
@@ -0,0 +1,43 @@
+from unittest.mock import MagicMock
+
+from core.bot import Bot
+from core.pair_config import PairConfig
+from models.TradeSettings import TradeSettings
+
+
+def make_bot(pairs):
+    bot = Bot.__new__(Bot)
+    bot.trade_settings = TradeSettings(dict(pairs=pairs))
+    bot.pair_configs = {p: PairConfig(p, s) for p, s in pairs.items()}
+    bot.trading_pairs = list(pairs)
+    bot.instruments = {p: None for p in pairs}
+    bot.base_api = MagicMock()
+    bot.base_api.get_all_instruments.return_value = None
+    bot.tick_aggregator = None
+    for name in ("logger", "candle_manager", "memory_monitor", "speculative", "spread_tracker",
+                 "strategy_manager", "risk_engine", "settings_watcher"):
+        setattr(bot, name, MagicMock())
+    return bot
+
+
+def test_unknown_pair_is_added_by_a_later_reload():
+    bot = make_bot({"EUR_USD": dict(granularity="M5")})
+    bot.apply_settings(TradeSettings(dict(pairs={"EUR_USD": dict(granularity="M5"),
+                                                 "FOO_BAR": dict(granularity="M5")})))
+    assert "FOO_BAR" not in bot.trade_settings.pair_settings
+    assert bot.trading_pairs == ["EUR_USD"]
+
+    # listed again with other settings once the broker knows it
+    bot.base_api.get_all_instruments.return_value = {"EUR_USD": None, "FOO_BAR": None}
+    bot.apply_settings(TradeSettings(dict(pairs={"EUR_USD": dict(granularity="M5"),
+                                                 "FOO_BAR": dict(granularity="H1")})))
+    assert bot.trading_pairs == ["EUR_USD", "FOO_BAR"]
+    assert bot.pair_configs["FOO_BAR"].granularity == "H1"
+
+
+def test_check_settings_keeps_running_when_apply_fails():
+    bot = make_bot({"EUR_USD": dict(granularity="M5")})
+    bot.settings_watcher.poll.return_value = TradeSettings(dict(pairs={"GBP_USD": dict(granularity="M5")}))
+    bot.candle_manager.remove_pairs.side_effect = RuntimeError("boom")
+    bot.check_settings()
+    assert "boom" in bot.logger.log_to_error.call_args[0][0]
@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+
+from core.base_api import BaseAPI
+from core.bot import Bot
+from core.pair_config import PairConfig
+from indicators.batch_indicators import compute_batch_indicators, rolling_mean_2d
+from utils.no_op import no_op
+from tests.conftest import make_candles
+
+
+def prepare_per_pair(candles: pd.DataFrame, granularity: str):
+    bot = Bot.__new__(Bot)
+    bot.base_api = BaseAPI(None)
+    return bot.prepare_indicators(candles.copy(), PairConfig("EUR_USD", dict(granularity=granularity)), no_op)
+
+
+def test_rolling_mean_2d_matches_pandas():
+    values = make_candles()["mid_c"].to_numpy()
+    for window in (10, 50, 200):
+        expected = pd.Series(values).rolling(window=window).mean().to_numpy()
+        np.testing.assert_array_equal(rolling_mean_2d(values[None, :], window)[0], expected)
+
+
+def test_batch_matches_prepare_indicators():
+    frames = {"EUR_USD": make_candles(seed=1), "GBP_USD": make_candles(seed=2, price=1.27),
+              "USD_JPY": make_candles(seed=3, n=3000)}
+    batch = compute_batch_indicators(frames, {pair: "M15" for pair in frames})
+
+    for pair, candles in frames.items():
+        expected = prepare_per_pair(candles, "M15")
+        actual = batch[pair]
+        for col in expected.candles.columns:
+            pd.testing.assert_series_equal(actual.candles[col], expected.candles[col], check_dtype=False,
+                                           check_exact=True, obj=f"{pair} {col}")
+        assert actual.rsi == expected.rsi or (np.isnan(actual.rsi) and np.isnan(expected.rsi))
+        for col in expected.heikin_ashi.columns:
+            pd.testing.assert_series_equal(actual.heikin_ashi[col], expected.heikin_ashi[col], check_dtype=False,
+                                           check_exact=True, obj=f"{pair} heikin_ashi {col}")
@@ -0,0 +1,46 @@
+import gzip
+import os
+import subprocess
+import sys
+
+from api.cassette import RECORD, REPLAY, Cassette
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def record(cassette: Cassette, n: int, offset: int = 0) -> None:
+    for i in range(offset, offset + n):
+        cassette.record("GET", "accounts/acc/pricing", dict(instruments="EUR_USD"), None, True, dict(i=i), 0.01)
+
+
+def test_replay_in_recorded_order(tmp_path):
+    path = str(tmp_path / "c.jsonl.gz")
+    cassette = Cassette(path, mode=RECORD)
+    record(cassette, 3)
+    cassette.close()
+
+    replay = Cassette(path, mode=REPLAY)
+    answers = [replay.play("GET", "accounts/acc/pricing", dict(instruments="EUR_USD"), None)[1]["i"] for _ in range(4)]
+    assert answers == [0, 1, 2, 2]
+    assert replay.exhausted
+
+
+def test_killed_recording_is_readable_and_appendable(tmp_path):
+    path = str(tmp_path / "killed.jsonl.gz")
+    # a process that records and dies without closing the cassette
+    script = (f"import sys; sys.path.insert(0, {ROOT!r})\n"
+              f"from api.cassette import Cassette, RECORD\n"
+              f"c = Cassette({path!r}, mode=RECORD)\n"
+              f"for i in range(5):\n"
+              f"    c.record('GET', 'u', None, None, True, dict(i=i), 0.0)\n"
+              f"import os; os._exit(1)\n")
+    subprocess.run([sys.executable, "-c", script], check=False)
+
+    replay = Cassette(path, mode=REPLAY)
+    assert [replay.play("GET", "u", None, None)[1]["i"] for _ in range(5)] == list(range(5))
+
+    cassette = Cassette(path, mode=RECORD)
+    record(cassette, 2)
+    cassette.close()
+    with gzip.open(path, "rt") as f:
+        assert len(f.readlines()) == 7
@@ -0,0 +1,69 @@
+import os
+from datetime import date, datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from core.decision_journal import DecisionJournal, load_decisions
+from models.decision_record import ADDED, NO_TRIGGER, REJECTED, DecisionRecord
+
+DAY_1 = datetime(2024, 5, 1, 23, 59, 58, 250000, tzinfo=timezone.utc).timestamp()
+DAY_2 = datetime(2024, 5, 2, 0, 0, 1, 500000, tzinfo=timezone.utc).timestamp()
+
+
+def make_record(time: float, n: int, **kwargs) -> DecisionRecord:
+    return DecisionRecord(**{**dict(
+        time=time, pair="EUR_USD", granularity="M5", bar_time=time - 300, trigger=n % 3 - 1,
+        # straight from the candle frames: numpy scalars and NaN
+        bullish_strength=np.float64(0.5 + n), bearish_strength=float("nan"), net_strength=None,
+        rsi=np.float32(42.5), band_position_200=0.25, band_position_50=-1e-7, net_trend_30=np.int64(n),
+        leverage_ratio=1.5, current_units=1000.0 * n, pl=-12.5, qty=np.float64(250.0), outcome=NO_TRIGGER),
+        **kwargs})
+
+
+def expected_frame(records) -> pd.DataFrame:
+    rows = [dict(zip(DecisionRecord.field_names(), r.to_row())) for r in records]
+    df = pd.DataFrame(rows, columns=DecisionRecord.field_names())
+    for column in ("time", "bar_time"):
+        df[column] = pd.to_datetime((df[column] * 1000).round(), unit="ms", utc=True)
+    for column in ("bullish_strength", "bearish_strength", "net_strength", "rsi", "band_position_200",
+                   "band_position_50", "leverage_ratio", "current_units", "pl", "qty"):
+        df[column] = df[column].astype(float)
+    df["trigger"] = df["trigger"].astype("int64")
+    # integers, unless a null makes the column float
+    df["net_trend_30"] = df["net_trend_30"].astype(float if df["net_trend_30"].isna().any() else "int64")
+    return df
+
+
+def test_round_trip_across_midnight_and_a_crash(tmp_path):
+    journal = DecisionJournal("bot", base_path=str(tmp_path))
+    # no trend yet while the indicators warm up
+    day_1 = [make_record(DAY_1, 0, net_trend_30=None), make_record(DAY_1 + 1, 1, pair="GBP_USD", outcome=REJECTED)]
+    day_2 = [make_record(DAY_2, 2), make_record(DAY_2 + 60, 3, outcome=ADDED)]
+    for record in day_1 + day_2:
+        journal.write(record)
+    journal.flush()
+    journal.close()
+
+    path = tmp_path / "bot" / "journal"
+    assert sorted(os.listdir(path)) == ["2024-05-01.jsonl", "2024-05-02.jsonl"]
+
+    # a crash in the middle of a write leaves an unterminated line
+    with open(path / "2024-05-02.jsonl", "a", encoding="utf-8") as f:
+        f.write('[1714608061.5,"EUR_U')
+    journal = DecisionJournal("bot", base_path=str(tmp_path))
+    after_crash = make_record(DAY_2 + 120, 4, granularity="H1")
+    journal.write(after_crash)
+    journal.close()
+
+    records = day_1 + day_2 + [after_crash]
+    decisions = load_decisions("bot", base_path=str(tmp_path))
+    pd.testing.assert_frame_equal(decisions, expected_frame(records))
+    assert decisions["time"].iloc[0] == pd.Timestamp("2024-05-01 23:59:58.250", tz="UTC")
+
+    pd.testing.assert_frame_equal(load_decisions("bot", "2024-05-02", base_path=str(tmp_path)),
+                                  expected_frame(day_2 + [after_crash]))
+    pd.testing.assert_frame_equal(load_decisions("bot", date_to=date(2024, 5, 1), base_path=str(tmp_path)),
+                                  expected_frame(day_1))
+    assert load_decisions("bot", "2024-05-03", base_path=str(tmp_path)).empty
+    assert load_decisions("other", base_path=str(tmp_path)).columns.tolist() == DecisionRecord.field_names()
@@ -0,0 +1,18 @@
+from core.latency_tracker import ACKNOWLEDGED, DECIDED, DETECTED, LatencyTracker
+
+
+def test_summary_is_one_line_of_the_last_stage():
+    tracker = LatencyTracker()
+    assert tracker.format_summary() == "latency: no samples"
+    for n in range(1, 101):
+        tracker.record("M5", DETECTED, n / 1000)
+        tracker.record("M5", ACKNOWLEDGED, n / 100)
+        tracker.record("M5", DECIDED, n / 10)
+    tracker.record("H1", DECIDED, 2.0)
+
+    summary = tracker.format_summary()
+    assert "\n" not in summary
+    assert summary == ("latency (s) from bar close: H1 decided p50 2.000 p99 2.000 (n=1), "
+                       "M5 acknowledged p50 0.505 p99 0.990 (n=100)")
+    # title, two header lines and a row per granularity and stage
+    assert len(tracker.format_report().splitlines()) == 7
@@ -0,0 +1,19 @@
+import os
+
+from core.log_wrapper import LogManager, LogWrapper
+
+
+def test_errors_written_above_default_level(tmp_path, monkeypatch):
+    monkeypatch.setattr(LogWrapper, "BASE_PATH", str(tmp_path))
+    for default in ("WARNING", "ERROR"):
+        name = f"bot_{default.lower()}"
+        logger = LogManager(name, ["EUR_USD"], queued=False, console_echo=False, log_levels={"default": default})
+        logger.log_to_error("BOOM")
+        logger.log_message("noise", "EUR_USD")
+        logger.close()
+
+        day_dir = os.path.join(tmp_path, name, logger.current_time)
+        with open(os.path.join(day_dir, "error.log")) as f:
+            assert "BOOM" in f.read()
+        with open(os.path.join(day_dir, "EUR_USD.log")) as f:
+            assert "noise" not in f.read()
@@ -0,0 +1,63 @@
+import socket
+import time
+from datetime import datetime, timedelta
+
+from api.market_data_client import MarketDataClient
+from api.market_data_service import HEAD_COUNT, MarketDataService
+
+
+class StubApi:
+    """Broker with ``bars`` complete M5 candles followed by a forming one."""
+
+    def __init__(self, bars=1000):
+        self.bars = bars
+        self.counts = []
+
+    def candle(self, i, complete):
+        time = datetime(2024, 1, 2) + timedelta(minutes=5 * i)
+        return dict(time=time.strftime("%Y-%m-%dT%H:%M:%S.000000000Z"), complete=complete, volume=i,
+                    mid=dict(o="1.1", h="1.1", l="1.1", c=f"{1.1 + i / 100000:.5f}"))
+
+    def fetch_candles(self, pair_name, count=10, granularity="H1", price="MBA", date_f=None, date_t=None):
+        self.counts.append(count)
+        return [self.candle(i, i < self.bars) for i in range(self.bars + 1 - count, self.bars + 1)]
+
+
+def test_candles_are_shared_across_counts_until_a_new_bar():
+    api = StubApi()
+    service = MarketDataService(api, candle_ttl=0)
+
+    for cycle in range(10):
+        api.bars += 1
+        for count in (100, 200, 50, 200):
+            expected = StubApi(api.bars).fetch_candles("EUR_USD", count=count)
+            assert service.fetch_candles("EUR_USD", count=count, granularity="M5") == expected
+
+    # two full fetches, the others only read the last candles
+    assert sorted(c for c in api.counts if c != HEAD_COUNT) == [100, 200]
+
+
+def test_history_is_fetched_again_after_a_gap():
+    api = StubApi()
+    service = MarketDataService(api, candle_ttl=0)
+    service.fetch_candles("EUR_USD", count=100, granularity="M5")
+
+    api.bars += HEAD_COUNT + 2
+    expected = StubApi(api.bars).fetch_candles("EUR_USD", count=100)
+    assert service.fetch_candles("EUR_USD", count=100, granularity="M5") == expected
+    assert [c for c in api.counts if c != HEAD_COUNT] == [100, 100]
+
+
+def test_client_treats_a_hung_daemon_as_unavailable(tmp_path):
+    path = str(tmp_path / "md.sock")
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    server.listen()
+    try:
+        client = MarketDataClient("account", "key", "https://api-fxpractice.oanda.com/v3", socket_path=path,
+                                  fallback=False, timeout=0.2)
+        started = time.monotonic()
+        assert client.fetch_candles("EUR_USD", count=10) is None
+        assert time.monotonic() - started < 1.0
+    finally:
+        server.close()
@@ -0,0 +1,56 @@
+import pandas as pd
+import pytest
+
+from tests.conftest import make_candles
+from utils.resample import PRICE_COLUMNS, resample_candles
+
+
+def pandas_resample(candles: pd.DataFrame, rule: str, offset: str = "0h") -> pd.DataFrame:
+    aggregations = {col: {"o": "first", "h": "max", "l": "min", "c": "last"}[col[-1]] for col in PRICE_COLUMNS}
+    aggregations["volume"] = "sum"
+    resampled = candles.set_index("time").resample(rule, label="left", closed="left", offset=offset).agg(aggregations)
+    resampled = resampled.dropna(subset=["mid_o"]).reset_index()
+    return resampled[candles.columns]
+
+
+@pytest.mark.parametrize("granularity,rule", [("M30", "30min"), ("H1", "1h"), ("H4", "4h")])
+def test_matches_pandas_resample(candles, granularity, rule):
+    # New York 17:00 is 22:00 UTC in winter, so H4 bars start at 22:00, 02:00, ... UTC
+    offset = "2h" if granularity == "H4" else "0h"
+    resampled = resample_candles(candles, granularity, "M15")
+    expected = pandas_resample(candles, rule, offset)
+    # the first H4 bar opened at 22:00 the day before, so it is dropped as partial
+    if granularity == "H4":
+        expected = expected.iloc[1:].reset_index(drop=True)
+    pd.testing.assert_frame_equal(resampled, expected, check_dtype=False, check_exact=True)
+
+
+def test_daily_bars_follow_daylight_saving():
+    # New York moves to daylight saving on Sunday 2024-03-10, while the market is closed
+    candles = make_candles(n=4 * 24 * 10, start="2024-03-04 22:00")
+    weekend = (candles["time"] >= "2024-03-08 22:00") & (candles["time"] < "2024-03-10 21:00")
+    candles = candles[~weekend].reset_index(drop=True)
+    daily = resample_candles(candles, "D", "M15")
+    assert daily["time"].tolist() == [pd.Timestamp(f"2024-03-{day:02d} 22:00", tz="UTC") for day in range(4, 8)] + \
+        [pd.Timestamp(f"2024-03-{day:02d} 21:00", tz="UTC") for day in range(10, 14)]
+    for _, bar in daily.iterrows():
+        days = candles[(candles["time"] >= bar["time"]) & (candles["time"] < bar["time"] + pd.Timedelta(days=1))]
+        assert bar["volume"] == days["volume"].sum()
+        assert bar["mid_o"] == days["mid_o"].iloc[0] and bar["mid_c"] == days["mid_c"].iloc[-1]
+
+
+def test_partial_and_forming_bars_are_dropped(candles):
+    window = candles.iloc[1:10]  # 00:15 to 02:15
+    resampled = resample_candles(window, "H1", "M15")
+    assert resampled["time"].tolist() == [pd.Timestamp("2024-01-02 01:00", tz="UTC")]
+
+    forming = resample_candles(window, "H1", completed_only=False)
+    assert forming["time"].dt.hour.tolist() == [1, 2]
+
+    as_of = resample_candles(window, "H1", as_of=pd.Timestamp("2024-01-02 03:00", tz="UTC"))
+    assert as_of["time"].dt.hour.tolist() == [1, 2]
+
+
+def test_rejects_a_base_granularity_that_does_not_divide(candles):
+    with pytest.raises(ValueError):
+        resample_candles(candles, "M15", "M30")
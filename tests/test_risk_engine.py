@@ -0,0 +1,73 @@
+import concurrent.futures
+
+import pytest
+
+from core.risk_engine import RiskEngine
+
+PRICES = {"EUR_USD": 1.10, "GBP_USD": 1.27}
+# home (GBP) currency per unit of each currency
+CONVERSIONS = {"EUR": 0.85, "USD": 0.78, "GBP": 1.0}
+
+
+class StubApi:
+    def get_open_positions(self):
+        return {"EUR_USD": (10000.0, 0.0), "GBP_USD": (-5000.0, 0.0)}
+
+    def get_account_summary(self):
+        return dict(NAV="10000")
+
+    def fetch_prices(self, instruments):
+        return dict(prices=[dict(instrument=i, bids=[dict(price=str(PRICES[i] - 0.0001))],
+                                 asks=[dict(price=str(PRICES[i] + 0.0001))]) for i in instruments],
+                    homeConversions=[dict(currency=c, positionValue=str(v)) for c, v in CONVERSIONS.items()])
+
+
+def make_engine(max_currency_exposure):
+    engine = RiskEngine(StubApi(), max_currency_exposure=max_currency_exposure)
+    assert engine.refresh(["EUR_USD", "GBP_USD"]) is not None
+    return engine
+
+
+def test_exposure_of_open_positions():
+    snapshot = make_engine(None).snapshot
+    # base +units * conversion, quote -units * price * conversion
+    eur = 10000 * 0.85
+    usd = -10000 * 1.10 * 0.78 + 5000 * 1.27 * 0.78
+    gbp = -5000 * 1.0
+    assert snapshot.net_exposure() == pytest.approx(dict(EUR=eur, USD=usd, GBP=gbp))
+    assert snapshot.nav == 10000
+    assert snapshot.ex_rate("EUR_USD") == pytest.approx(1 / 0.78)
+
+
+def test_take_scales_down_to_the_limit():
+    engine = make_engine(1.0)
+    # EUR is at 8500 of a 10000 limit, so 1500 / 0.85 units of EUR_USD are left
+    assert engine.take("EUR_USD", 5000) == pytest.approx(1500 / 0.85)
+    assert engine.snapshot.net_exposure()["EUR"] == pytest.approx(10000)
+    assert engine.take("EUR_USD", 1000) == 0
+    # the other side is not limited by EUR
+    assert engine.take("EUR_USD", -1000) == -1000
+
+
+def test_reducing_trades_allowed_over_the_limit():
+    engine = make_engine(0.5)
+    # EUR at 8500 is over the 5000 limit: buying more is refused, selling is not
+    assert engine.take("EUR_USD", 100) == 0
+    assert engine.take("EUR_USD", -2000) == -2000
+    assert engine.snapshot.net_exposure()["EUR"] == pytest.approx(8500 - 1700)
+
+
+def test_headroom_is_shared_within_a_cycle():
+    engine = make_engine(1.0)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+        allowed = list(executor.map(lambda units: engine.take("EUR_USD", units), [1000, 1000]))
+    assert sum(allowed) == pytest.approx(1500 / 0.85)
+    assert max(allowed) == 1000
+
+
+def test_no_limit_leaves_quantities_unchanged():
+    engine = make_engine(None)
+    assert engine.take("EUR_USD", 1e9) == 1e9
+    assert engine.take("GBP_USD", -1e9) == -1e9
+    # nor without a snapshot, after a failed refresh
+    assert RiskEngine(StubApi(), max_currency_exposure=1.0).take("EUR_USD", 5000) == 5000
@@ -0,0 +1,56 @@
+import random
+import statistics
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from tests.conftest import make_candles
+from utils.get_spread_threshold import MIN_HOUR_SAMPLES, SpreadTracker, _local_hours
+from utils.sliding_median import SlidingMedian
+
+
+def test_sliding_median_matches_statistics():
+    rng = random.Random(3)
+    median = SlidingMedian()
+    values = []
+    assert median.median is None
+    for _ in range(5000):
+        if values and rng.random() < 0.45:
+            value = values.pop(rng.randrange(len(values)))
+            median.remove(value)
+        else:
+            # few distinct values, so duplicates are removed lazily
+            value = rng.randint(0, 20) / 10
+            values.append(value)
+            median.add(value)
+        assert len(median) == len(values)
+        assert median.median == (statistics.median(values) if values else None)
+
+
+def test_spread_tracker_matches_the_median_of_the_window():
+    candles = make_candles(n=3000)
+    candles.loc[candles.index[::37], "ask_c"] = np.nan
+    spreads = candles["ask_c"] - candles["bid_c"]
+    tracker = SpreadTracker(window=500)
+    # grows a few bars at a time, as the cycles of a bot do
+    for end in range(1000, len(candles) + 1, 7):
+        tracker.update("EUR_USD", candles.iloc[max(0, end - 1000):end])
+        assert tracker.median("EUR_USD") == spreads.iloc[end - 500:end].median()
+
+
+def test_spread_tracker_by_hour():
+    candles = make_candles(n=3000)
+    window = candles.iloc[-2000:]
+    tracker = SpreadTracker(window=2000, by_hour=True)
+    tracker.update("EUR_USD", candles)
+
+    at = datetime(2030, 1, 1, tzinfo=timezone.utc)
+    hours = _local_hours(window["time"])
+    hour = _local_hours(pd.Series([pd.Timestamp(at)])).iloc[0]
+    spreads = window["ask_c"] - window["bid_c"]
+    assert (hours == hour).sum() >= MIN_HOUR_SAMPLES
+    assert tracker.median("EUR_USD", at=at) == spreads[hours == hour].median()
+
+    tracker.forget("EUR_USD")
+    assert tracker.median("EUR_USD") is None
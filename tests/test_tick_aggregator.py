@@ -0,0 +1,34 @@
+from datetime import datetime, timezone
+
+import pandas as pd
+import pytest
+
+from core.tick_aggregator import CANDLE_COLUMNS, TickAggregator
+from utils.synthetic_ticks import synthetic_ticks
+
+START = datetime(2024, 1, 2, 9, tzinfo=timezone.utc)
+SECONDS = 3 * 3600
+
+
+def expected_candles(messages, freq: str) -> pd.DataFrame:
+    ticks = pd.DataFrame([dict(time=pd.Timestamp(m["time"]), bid=float(m["bids"][0]["price"]),
+                               ask=float(m["asks"][0]["price"])) for m in messages if m["type"] == "PRICE"])
+    ticks["mid"] = (ticks["bid"] + ticks["ask"]) / 2
+    groups = ticks.groupby(ticks["time"].dt.floor(freq))
+    candles = pd.DataFrame(dict(volume=groups.size()))
+    for price in ("mid", "bid", "ask"):
+        for ohlc, how in (("o", "first"), ("h", "max"), ("l", "min"), ("c", "last")):
+            candles[f"{price}_{ohlc}"] = groups[price].agg(how)
+    return candles.rename_axis("time").reset_index()[CANDLE_COLUMNS]
+
+
+@pytest.mark.parametrize("granularity,freq", [("M1", "1min"), ("M5", "5min"), ("H1", "1h")])
+def test_candles_match_a_groupby_of_the_ticks(granularity, freq):
+    messages = list(synthetic_ticks("EUR_USD", START, SECONDS, mean_interval=2.0, seed=7))
+    aggregator = TickAggregator(None, {"EUR_USD": [granularity]})
+    for message in messages:
+        aggregator.on_message(message)
+    aggregator.roll(pd.Timestamp(START) + pd.Timedelta(seconds=SECONDS))
+
+    candles = aggregator.get_candles_df("EUR_USD", granularity)
+    pd.testing.assert_frame_equal(candles, expected_candles(messages, freq), check_dtype=False, check_exact=True)
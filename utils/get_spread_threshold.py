@@ -1,16 +1,118 @@
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
 import pandas as pd
-from typing import Tuple, Callable
 
 from api.OandaApi import OandaApi
+from config.constants import ALIGNMENT_TIMEZONE, MAX_CANDLES_PER_REQUEST
 from models.api_price import ApiPrice
+from utils.sliding_median import SlidingMedian
+
+# bars of an hour of the day below which its median falls back to the one over all hours
+MIN_HOUR_SAMPLES = 20
+
+
+def _local_hours(times: pd.Series) -> pd.Series:
+    """Hour of the day in the alignment timezone, where rollover falls at the same hour all year."""
+    utc = times.dt.tz_convert("UTC") if times.dt.tz is not None else times.dt.tz_localize("UTC")
+    return utc.dt.tz_convert(ALIGNMENT_TIMEZONE).dt.hour
+
+
+class _PairSpreads:
+    def __init__(self) -> None:
+        self.window: Deque[Tuple[int, float]] = deque()
+        self.all_hours = SlidingMedian()
+        self.by_hour: List[SlidingMedian] = [SlidingMedian() for _ in range(24)]
+        self.last_time: Optional[pd.Timestamp] = None
+
+
+class SpreadTracker:
+    """
+    Median bid/ask spread of the last ``window`` bars of each pair, kept up to date as bars arrive.
+
+    :meth:`update` only adds the bars newer than the last one seen, and drops
+    those leaving the window, so a cycle costs O(log n) per new bar instead of
+    a median over the whole frame. The median is kept over all bars and per
+    hour of the day in New York time, since spreads widen around the 17:00
+    rollover; with ``by_hour`` the threshold is the median of the current hour
+    once it has ``MIN_HOUR_SAMPLES`` bars.
+
+    Example:
+        >>> tracker = SpreadTracker(by_hour=True)
+        >>> tracker.update("EUR_USD", candles)
+        >>> tracker.median("EUR_USD")
+    """
+
+    def __init__(self, window: int = MAX_CANDLES_PER_REQUEST, by_hour: bool = False) -> None:
+        self.window = window
+        self.by_hour = by_hour
+        self._pairs: Dict[str, _PairSpreads] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, pair: str) -> _PairSpreads:
+        with self._lock:
+            return self._pairs.setdefault(pair, _PairSpreads())
+
+    def forget(self, pair: str) -> None:
+        with self._lock:
+            self._pairs.pop(pair, None)
+
+    def update(self, pair: str, df: pd.DataFrame) -> None:
+        state = self._get(pair)
+        new = df if state.last_time is None else df[df["time"] > state.last_time]
+        if new.empty:
+            return
+        if len(new) >= self.window or (state.last_time is not None and len(new) == len(df)):
+            # nothing in common with the bars seen: a gap longer than the window or other candles
+            state = _PairSpreads()
+            with self._lock:
+                self._pairs[pair] = state
+            new = new.iloc[-self.window:]
+
+        spreads = (new["ask_c"] - new["bid_c"]).to_numpy(dtype=float)
+        hours = _local_hours(new["time"]).to_numpy()
+        for hour, spread in zip(hours.tolist(), spreads.tolist()):
+            # bars without a spread still take their place in the window
+            state.window.append((hour, spread))
+            if spread == spread:
+                state.all_hours.add(spread)
+                state.by_hour[hour].add(spread)
+            if len(state.window) > self.window:
+                old_hour, old_spread = state.window.popleft()
+                if old_spread == old_spread:
+                    state.all_hours.remove(old_spread)
+                    state.by_hour[old_hour].remove(old_spread)
+        state.last_time = new["time"].iloc[-1]
 
+    def median(self, pair: str, at: Optional[datetime] = None) -> Optional[float]:
+        """Median spread of ``pair``, of the hour of ``at`` (now by default) when ``by_hour`` is on."""
+        state = self._pairs.get(pair)
+        if state is None:
+            return None
+        if self.by_hour:
+            at = pd.Timestamp.now(tz="UTC") if at is None else pd.Timestamp(at)
+            at = at.tz_convert("UTC") if at.tzinfo is not None else at.tz_localize("UTC")
+            hour = state.by_hour[at.tz_convert(ALIGNMENT_TIMEZONE).hour]
+            if len(hour) >= MIN_HOUR_SAMPLES:
+                return hour.median
+        return state.all_hours.median
 
-def get_spread_threshold(pair: str, df: pd.DataFrame, api: OandaApi, logger: Callable[[str], None]) -> Tuple[float, float, float]:
-    spread_series = df["ask_c"] - df["bid_c"]
-    spread_series.dropna(inplace=True)
 
+def get_spread_threshold(pair: str, df: pd.DataFrame, api: OandaApi, logger: Callable[[str], None],
+                         tracker: Optional[SpreadTracker] = None) -> Tuple[float, float, float]:
     current_price: ApiPrice = api.get_price(pair)
-    desc = spread_series.describe(percentiles=[0.05, 0.25, 0.5, 0.75])
+    if tracker is not None:
+        tracker.update(pair, df)
+        spread_median = tracker.median(pair)
+        if spread_median is None:
+            spread_median = float("nan")
+    else:
+        spread_series = df["ask_c"] - df["bid_c"]
+        spread_series.dropna(inplace=True)
+        # only the median is used, so skip computing the full describe() on the decision path
+        spread_median = spread_series.median()
 
     # desc_dict = desc.to_dict()
     # desc_str = ", ".join(
@@ -20,7 +122,7 @@ def get_spread_threshold(pair: str, df: pd.DataFrame, api: OandaApi, logger: Cal
     # )
     # logger(f"spread distribution: {desc_str}")
 
-    spread_threshold = float(desc["50%"].round(5))
+    spread_threshold = float(round(spread_median, 5))
     current_spread = round(current_price.ask - current_price.bid, 5)
 
-    return current_spread, spread_threshold, current_price.price
\ No newline at end of file
+    return current_spread, spread_threshold, current_price.price
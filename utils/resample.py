@@ -0,0 +1,91 @@
+from datetime import datetime
+from typing import Dict, Optional, Union
+
+import pandas as pd
+
+from config.constants import ALIGNMENT_TIMEZONE, DAILY_ALIGNMENT, GRANULARITY_SECONDS
+
+# granularities OANDA aligns on the start of the trading day rather than on the UTC clock
+DAILY_ALIGNED = ("H2", "H3", "H4", "H6", "H8", "H12", "D")
+
+PRICE_COLUMNS = [f"{p}_{o}" for p in ("mid", "bid", "ask") for o in ("o", "h", "l", "c")]
+_AGGREGATIONS = {"o": "first", "h": "max", "l": "min", "c": "last"}
+
+
+def get_bucket_starts(times: pd.Series, granularity: str, daily_alignment: int = DAILY_ALIGNMENT,
+                      alignment_timezone: str = ALIGNMENT_TIMEZONE) -> pd.Series:
+    """
+    Start time, in UTC, of the ``granularity`` candle each time falls in.
+
+    Minute and H1 candles start on multiples of their length on the UTC clock.
+    H4 and daily candles start at ``daily_alignment`` o'clock in
+    ``alignment_timezone`` and every 4 hours from there, so they move by an
+    hour in UTC with daylight saving: a daily candle starts at 21:00 UTC in
+    summer and 22:00 UTC in winter.
+    """
+    step = pd.Timedelta(seconds=GRANULARITY_SECONDS[granularity])
+    utc = times.dt.tz_convert("UTC") if times.dt.tz is not None else times.dt.tz_localize("UTC")
+    if granularity not in DAILY_ALIGNED:
+        return utc.dt.floor(step)
+
+    naive_utc = utc.dt.tz_localize(None)
+    local = utc.dt.tz_convert(alignment_timezone).dt.tz_localize(None)
+    # each time keeps its own UTC offset; clocks only change on Sunday mornings, while the market is closed
+    offset = local - naive_utc
+    anchor = pd.Timedelta(hours=daily_alignment)
+    return ((local - anchor).dt.floor(step) + anchor - offset).dt.tz_localize("UTC")
+
+
+def resample_candles(candles: pd.DataFrame, granularity: str, base_granularity: Optional[str] = None,
+                     as_of: Optional[Union[datetime, pd.Timestamp]] = None,
+                     completed_only: bool = True) -> pd.DataFrame:
+    """
+    Build ``granularity`` candles from a frame of shorter ones.
+
+    Prices are aggregated per column (open first, high max, low min, close
+    last) for each of mid, bid and ask present, and volumes are summed. Bars
+    are labelled by their start time, as OANDA does, and buckets with no base
+    bars, such as weekends, produce no bar.
+
+    Args:
+        candles: Frame of ``get_candles_df``, in time order
+        granularity: Granularity to build, e.g. "H1", "H4" or "D"
+        base_granularity: Granularity of ``candles``; must divide ``granularity``
+        as_of: With ``completed_only``, the time up to which ``candles`` are
+            known to be complete; defaults to the end of the last base bar
+        completed_only: Drop the last bar if it has not closed by ``as_of``
+
+    The first bar is dropped when ``candles`` start after its open, as it
+    would only cover part of its period.
+
+    Returns:
+        pd.DataFrame: Candles with the same columns as ``candles``
+    """
+    if base_granularity is not None and \
+            GRANULARITY_SECONDS[granularity] % GRANULARITY_SECONDS[base_granularity] != 0:
+        raise ValueError(f"Cannot build {granularity} candles from {base_granularity} candles")
+    if candles.empty:
+        return candles.copy()
+
+    aggregations: Dict[str, str] = {col: _AGGREGATIONS[col[-1]] for col in PRICE_COLUMNS if col in candles}
+    if "volume" in candles:
+        aggregations["volume"] = "sum"
+
+    starts = get_bucket_starts(candles["time"], granularity)
+    resampled = candles[list(aggregations)].groupby(starts.rename("time"), sort=True).agg(aggregations)
+    resampled = resampled.reset_index()[[col for col in candles.columns if col == "time" or col in aggregations]]
+
+    # a buffer starting mid-candle holds only the end of its first one
+    if candles["time"].iloc[0] > starts.iloc[0]:
+        resampled = resampled.iloc[1:].reset_index(drop=True)
+
+    if completed_only:
+        if as_of is None:
+            if base_granularity is None:
+                raise ValueError("base_granularity or as_of is needed to tell whether the last candle is complete")
+            as_of = candles["time"].iloc[-1] + pd.Timedelta(seconds=GRANULARITY_SECONDS[base_granularity])
+        as_of = pd.Timestamp(as_of)
+        as_of = as_of.tz_convert("UTC") if as_of.tzinfo is not None else as_of.tz_localize("UTC")
+        ends = resampled["time"] + pd.Timedelta(seconds=GRANULARITY_SECONDS[granularity])
+        resampled = resampled[ends <= as_of].reset_index(drop=True)
+    return resampled
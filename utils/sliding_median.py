@@ -0,0 +1,84 @@
+import heapq
+from collections import Counter
+from typing import List, Optional
+
+
+class SlidingMedian:
+    """
+    Median of a multiset under insertions and removals.
+
+    Two heaps hold the lower and upper halves, so :meth:`add` and
+    :meth:`remove` are O(log n) and :attr:`median` is O(1). Removed values are
+    only dropped from a heap once they reach its top. Removing a value that
+    was never added corrupts the state, so callers remove exactly what they added,
+    e.g. the values leaving a window.
+
+    Example:
+        >>> m = SlidingMedian()
+        >>> for x in (3, 1, 2):
+        ...     m.add(x)
+        >>> m.median
+        2
+        >>> m.remove(3)
+        >>> m.median
+        1.5
+    """
+
+    def __init__(self) -> None:
+        self._low: List[float] = []  # lower half, negated: a max-heap
+        self._high: List[float] = []  # upper half
+        self._removed: Counter = Counter()
+        self._low_size = 0
+        self._high_size = 0
+
+    def __len__(self) -> int:
+        return self._low_size + self._high_size
+
+    @property
+    def median(self) -> Optional[float]:
+        if len(self) == 0:
+            return None
+        if self._low_size > self._high_size:
+            return -self._low[0]
+        return (-self._low[0] + self._high[0]) / 2
+
+    def add(self, value: float) -> None:
+        if not self._low or value <= -self._low[0]:
+            heapq.heappush(self._low, -value)
+            self._low_size += 1
+        else:
+            heapq.heappush(self._high, value)
+            self._high_size += 1
+        self._rebalance()
+
+    def remove(self, value: float) -> None:
+        self._removed[value] += 1
+        if value <= -self._low[0]:
+            self._low_size -= 1
+            if value == -self._low[0]:
+                self._prune(self._low, -1)
+        else:
+            self._high_size -= 1
+            if value == self._high[0]:
+                self._prune(self._high, 1)
+        self._rebalance()
+
+    def _prune(self, heap: List[float], sign: int) -> None:
+        while heap and self._removed[sign * heap[0]] > 0:
+            value = sign * heapq.heappop(heap)
+            self._removed[value] -= 1
+            if self._removed[value] == 0:
+                del self._removed[value]
+
+    def _rebalance(self) -> None:
+        # the lower half holds as many values as the upper one, or one more
+        if self._low_size > self._high_size + 1:
+            heapq.heappush(self._high, -heapq.heappop(self._low))
+            self._low_size -= 1
+            self._high_size += 1
+            self._prune(self._low, -1)
+        elif self._low_size < self._high_size:
+            heapq.heappush(self._low, -heapq.heappop(self._high))
+            self._high_size -= 1
+            self._low_size += 1
+            self._prune(self._high, 1)
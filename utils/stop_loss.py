@@ -1,3 +1,8 @@
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+
 from config.constants import INITIAL_SL_PERIOD, TP_MULTIPLE
 from models.open_trade import OpenTrade
 from utils.get_prev_swing import get_previous_swing
@@ -7,14 +12,15 @@ def get_swing_stop_loss(direction, df) -> float | None:
     x = get_previous_swing(df, direction)
     return x['price'] if x is not None else None
 
-def get_probable_stop_loss(direction, df, pipLocationPrecision, pair_logger, heikin_ashi):
+def get_probable_stop_loss(direction, df, pipLocationPrecision, pair_logger, heikin_ashi,
+                           sl_period=INITIAL_SL_PERIOD, tp_multiple=TP_MULTIPLE):
     # swing_sl = get_swing_stop_loss(direction, heikin_ashi)
 
     spread = (df["ask_c"] - df["bid_c"]).iloc[-1]
     price = df["mid_c"].iloc[-1]
 
-    high = df["mid_h"].rolling(window=INITIAL_SL_PERIOD).max()
-    low = df["mid_l"].rolling(window=INITIAL_SL_PERIOD).min()
+    high = df["mid_h"].rolling(window=sl_period).max()
+    low = df["mid_l"].rolling(window=sl_period).min()
 
     if direction > 0:
         donchian_sl = low.iloc[-1]
@@ -32,11 +38,32 @@ def get_probable_stop_loss(direction, df, pipLocationPrecision, pair_logger, hei
     sl_price = round(sl_price, abs(pipLocationPrecision))
     sl_gap = round(abs(price - sl_price), abs(pipLocationPrecision))
 
-    take_profit = price + sl_gap * TP_MULTIPLE if direction > 0 else price - sl_gap * TP_MULTIPLE
+    take_profit = price + sl_gap * tp_multiple if direction > 0 else price - sl_gap * tp_multiple
     take_profit = round(take_profit, abs(pipLocationPrecision))
 
     return sl_price, take_profit, sl_gap
 
+def get_stop_loss_series(direction: np.ndarray, df: pd.DataFrame, pipLocationPrecision,
+                         sl_period: int = INITIAL_SL_PERIOD,
+                         tp_multiple: float = TP_MULTIPLE) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Vectorized :func:`get_probable_stop_loss` for a trade direction on every bar."""
+    precision = abs(pipLocationPrecision)
+    spread = (df["ask_c"] - df["bid_c"]).to_numpy()
+    price = df["mid_c"].to_numpy()
+
+    high = df["mid_h"].rolling(window=sl_period).max().to_numpy()
+    low = df["mid_l"].rolling(window=sl_period).min().to_numpy()
+
+    sl_price = np.where(direction > 0, low - spread, high + spread)
+    sl_price = np.round(sl_price, precision)
+    sl_gap = np.round(np.abs(price - sl_price), precision)
+
+    take_profit = np.where(direction > 0, price + sl_gap * tp_multiple, price - sl_gap * tp_multiple)
+    take_profit = np.round(take_profit, precision)
+
+    return sl_price, take_profit, sl_gap
+
+
 def get_current_stop_value(trade: OpenTrade | None) -> float | None:
     stop_loss_price: str | None = None
 
@@ -0,0 +1,49 @@
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, Optional
+
+import numpy as np
+import pandas as pd
+
+# seconds between heartbeats of the OANDA streams
+HEARTBEAT_SECONDS = 5
+
+
+def _format_time(time: pd.Timestamp) -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%S.%f000Z")
+
+
+def synthetic_ticks(instrument: str, start: datetime, seconds: float, mean_interval: float = 1.0,
+                    price: float = 1.1, spread: float = 0.0001, volatility: float = 0.00005,
+                    precision: int = 5, seed: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Prices and heartbeats in the format of the OANDA pricing stream, for testing without a connection.
+
+    Ticks arrive at exponentially distributed intervals averaging
+    ``mean_interval`` seconds. The mid price follows a random walk of
+    ``volatility`` per square root second, and the spread is held at ``spread``.
+    A heartbeat comes every 5 seconds, as on the live stream.
+
+    Example:
+        >>> aggregator = TickAggregator(api, {"EUR_USD": ["M1"]})
+        >>> for message in synthetic_ticks("EUR_USD", datetime(2024, 1, 2, tzinfo=timezone.utc), 3600, seed=1):
+        ...     aggregator.on_message(message)
+    """
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp(start)
+    start = start.tz_convert("UTC") if start.tzinfo is not None else start.tz_localize("UTC")
+
+    elapsed, mid = 0.0, price
+    next_heartbeat = float(HEARTBEAT_SECONDS)
+    while True:
+        gap = rng.exponential(mean_interval)
+        while next_heartbeat <= min(elapsed + gap, seconds):
+            yield dict(type="HEARTBEAT", time=_format_time(start + timedelta(seconds=next_heartbeat)))
+            next_heartbeat += HEARTBEAT_SECONDS
+        elapsed += gap
+        if elapsed >= seconds:
+            return
+        mid += rng.normal(0.0, volatility * np.sqrt(gap))
+        bid, ask = round(mid - spread / 2, precision), round(mid + spread / 2, precision)
+        yield dict(type="PRICE", instrument=instrument, time=_format_time(start + timedelta(seconds=elapsed)),
+                   bids=[dict(price=f"{bid:.{precision}f}", liquidity=1000000)],
+                   asks=[dict(price=f"{ask:.{precision}f}", liquidity=1000000)], tradeable=True)